@@ -0,0 +1,379 @@
+"""Benchmarks for the DTW and metric hot paths.
+
+Each benchmark reports throughput in cells per second (where a cell is one
+frame pair, i.e. one element of a cost matrix) and peak memory use.
+Results can be saved as a baseline JSON file and later runs compared against
+it to flag regressions.
+
+Example usage (from the project root directory):
+
+    PYTHONPATH=. python bin/bench.py --save baseline.json
+    PYTHONPATH=. python bin/bench.py --compare baseline.json
+"""
+
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import os
+from os.path import join
+import sys
+import argparse
+import json
+import multiprocessing
+import resource
+import subprocess
+import shutil
+import tempfile
+import time
+import numpy as np
+
+# (FIXME : bit of a hacky way to find base dir)
+import mcd as mcd_temp
+baseDir = os.path.dirname(os.path.dirname(mcd_temp.__file__))
+
+from mcd import dtw
+import mcd.metrics as mt
+import mcd.metrics_fast as mtf
+try:
+    import mcd.dtw_fast as dtw_fast
+except ImportError:
+    dtw_fast = None
+
+def getMaxRssMb(rusage):
+    # (ru_maxrss is in kilobytes on linux)
+    return rusage.ru_maxrss / 1024.0
+
+def timeFn(fn, repeats):
+    """Returns the best time over several calls to fn, in seconds."""
+    times = []
+    for _ in range(repeats):
+        startTime = time.time()
+        fn()
+        times.append(time.time() - startTime)
+    return min(times)
+
+def runInChild(setup, repeats, conn):
+    rssBefore = getMaxRssMb(resource.getrusage(resource.RUSAGE_SELF))
+    fn = setup()
+    seconds = timeFn(fn, repeats)
+    rssAfter = getMaxRssMb(resource.getrusage(resource.RUSAGE_SELF))
+    conn.send((seconds, rssAfter - rssBefore))
+    conn.close()
+
+def runInProcess(setup, repeats):
+    """Runs a benchmark in a fresh child process.
+
+    setup is called in the child and should return the function to time.
+    Using a child process means the peak memory measured is that of this
+    benchmark alone.
+    Returns the best time in seconds and the peak memory increase in MB.
+    """
+    parentConn, childConn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=runInChild,
+                                      args=(setup, repeats, childConn))
+    process.start()
+    seconds, peakMemMb = parentConn.recv()
+    process.join()
+    return seconds, peakMemMb
+
+class MetricBench(object):
+    def __init__(self, costFn, order, numPairs):
+        self.costFn = costFn
+        self.order = order
+        self.numPairs = numPairs
+
+    def __call__(self):
+        xs = np.random.randn(self.numPairs, self.order)
+        ys = np.random.randn(self.numPairs, self.order)
+        costFn = self.costFn
+        def fn():
+            for x, y in zip(xs, ys):
+                costFn(x, y)
+        return fn
+
+class CostMatrixBench(object):
+    def __init__(self, costFn, length, order):
+        self.costFn = costFn
+        self.length = length
+        self.order = order
+
+    def __call__(self):
+        xs = np.random.randn(self.length, self.order)
+        ys = np.random.randn(self.length, self.order)
+        return lambda: dtw.getCostMatrix(xs, ys, self.costFn)
+
+class CumCostMatrixBench(object):
+    def __init__(self, getCumCostMatrix, length):
+        self.getCumCostMatrix = getCumCostMatrix
+        self.length = length
+
+    def __call__(self):
+        costMat = np.abs(np.random.randn(self.length, self.length))
+        return lambda: self.getCumCostMatrix(costMat)
+
+class BestPathBench(object):
+    def __init__(self, getBestPath, length):
+        self.getBestPath = getBestPath
+        self.length = length
+
+    def __call__(self):
+        costMat = np.abs(np.random.randn(self.length, self.length))
+        cumMat = dtw.getCumCostMatrix(costMat)
+        return lambda: self.getBestPath(cumMat)
+
+class DtwBench(object):
+    def __init__(self, dtwFn, length, order):
+        self.dtwFn = dtwFn
+        self.length = length
+        self.order = order
+
+    def __call__(self):
+        xs = np.random.randn(self.length, self.order)
+        ys = np.random.randn(self.length, self.order)
+        return lambda: self.dtwFn(xs, ys, mtf.logSpecDbDist)
+
+def getParamFileFrames(paramFile, paramOrder):
+    return os.path.getsize(paramFile) // (4 * paramOrder)
+
+def getTestDataCells(natDir, synthDir, uttIds, paramOrder=40):
+    return sum([
+        getParamFileFrames(join(natDir, uttId + '.mgc'), paramOrder) *
+        getParamFileFrames(join(synthDir, uttId + '.mgc'), paramOrder)
+        for uttId in uttIds
+    ])
+
+def runCli(args, repeats):
+    """Runs a command-line tool several times.
+
+    Returns the best time in seconds and the peak memory in MB.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [baseDir] + [ path for path in [env.get('PYTHONPATH')] if path ]
+    )
+    times = []
+    peakMemMb = 0.0
+    with open(os.devnull, 'w') as devNull:
+        for _ in range(repeats):
+            startTime = time.time()
+            p = subprocess.Popen([sys.executable] + args, stdout=devNull,
+                                 env=env)
+            _, status, rusage = os.wait4(p.pid, 0)
+            times.append(time.time() - startTime)
+            assert status == 0
+            peakMemMb = max(peakMemMb, getMaxRssMb(rusage))
+    return min(times), peakMemMb
+
+def getBenchmarks(lengths, orders, maxPythonLength, numPairs=10000):
+    """Returns a list of (name, cells, setup) for in-process benchmarks."""
+    benchmarks = []
+    for order in orders:
+        for metricName in ['sqCepDist', 'eucCepDist', 'logSpecDbDist']:
+            for impl, module in [('python', mt), ('cython', mtf)]:
+                benchmarks.append((
+                    'metric.%s[%s] order=%s' % (metricName, impl, order),
+                    numPairs,
+                    MetricBench(getattr(module, metricName), order, numPairs)
+                ))
+        for length in lengths:
+            benchmarks.append((
+                'getCostMatrix[vectorized] length=%s order=%s' %
+                (length, order),
+                length * length,
+                CostMatrixBench(mtf.logSpecDbDist, length, order)
+            ))
+            if length <= maxPythonLength:
+                benchmarks.append((
+                    'getCostMatrix[per-pair] length=%s order=%s' %
+                    (length, order),
+                    length * length,
+                    CostMatrixBench(lambda x, y: mtf.logSpecDbDist(x, y),
+                                    length, order)
+                ))
+
+    impls = [('python', dtw)]
+    if dtw_fast is not None:
+        impls.append(('compiled', dtw_fast))
+    for length in lengths:
+        for impl, module in impls:
+            if impl == 'python' and length > maxPythonLength:
+                continue
+            benchmarks.append((
+                'getCumCostMatrix[%s] length=%s' % (impl, length),
+                length * length,
+                CumCostMatrixBench(module.getCumCostMatrix, length)
+            ))
+            benchmarks.append((
+                'getBestPath[%s] length=%s' % (impl, length),
+                length * length,
+                BestPathBench(module.getBestPath, length)
+            ))
+        for dtwName in ['dtw', 'dtwFused']:
+            benchmarks.append((
+                '%s length=%s order=40' % (dtwName, length),
+                length * length,
+                DtwBench(getattr(dtw, dtwName), length, 40)
+            ))
+
+    return benchmarks
+
+def runBenchmarks(lengths, orders, maxPythonLength, repeats, includeCli,
+                  pattern=None):
+    results = dict()
+
+    def report(name, cells, seconds, peakMemMb):
+        results[name] = dict(
+            cells=cells,
+            seconds=seconds,
+            cellsPerSec=cells / seconds if seconds > 0.0 else float('inf'),
+            peakMemMb=peakMemMb,
+        )
+        print '%-55s %12.4g cells/s %9.1f MB' % (
+            name, results[name]['cellsPerSec'], peakMemMb
+        )
+
+    for name, cells, setup in getBenchmarks(lengths, orders, maxPythonLength):
+        if pattern is None or pattern in name:
+            seconds, peakMemMb = runInProcess(setup, repeats)
+            report(name, cells, seconds, peakMemMb)
+
+    if includeCli:
+        testDataDir = join(baseDir, 'test_data')
+        uttIds = [
+            line.strip() for line in open(join(testDataDir, 'corpus.lst'))
+        ]
+        natDir = join(testDataDir, 'ref-examples')
+        synthDir = join(testDataDir, 'synth-examples')
+        alignedSynthDir = join(testDataDir, 'aligned-synth-examples')
+        tempDir = tempfile.mkdtemp(prefix='mcd.')
+        try:
+            cliBenchmarks = [
+                ('cli.get_mcd_dtw',
+                 getTestDataCells(natDir, synthDir, uttIds),
+                 [join(baseDir, 'bin', 'get_mcd_dtw'), '--no_cache',
+                  natDir, synthDir] + uttIds),
+                ('cli.dtw_synth',
+                 getTestDataCells(natDir, synthDir, uttIds),
+                 [join(baseDir, 'bin', 'dtw_synth'), '--no_cache',
+                  natDir, synthDir, tempDir] + uttIds),
+                ('cli.get_mcd_plain',
+                 sum([
+                     getParamFileFrames(join(natDir, uttId + '.mgc'), 40)
+                     for uttId in uttIds
+                 ]),
+                 [join(baseDir, 'bin', 'get_mcd_plain'),
+                  natDir, alignedSynthDir] + uttIds),
+            ]
+            for name, cells, args in cliBenchmarks:
+                if pattern is None or pattern in name:
+                    seconds, peakMemMb = runCli(args, repeats)
+                    report(name, cells, seconds, peakMemMb)
+        finally:
+            shutil.rmtree(tempDir)
+
+    return results
+
+def compareResults(results, baseline, tolerance):
+    """Compares results to a baseline.
+
+    Returns a list of descriptions of regressions, where a regression is a
+    drop in throughput or an increase in peak memory by more than the given
+    fractional tolerance.
+    Peak memory increases of less than 1 MB are ignored.
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        result, base = results[name], baseline[name]
+        if result['cellsPerSec'] < base['cellsPerSec'] * (1.0 - tolerance):
+            regressions.append(
+                '%s: throughput %.4g -> %.4g cells/s' %
+                (name, base['cellsPerSec'], result['cellsPerSec'])
+            )
+        if (result['peakMemMb'] > base['peakMemMb'] * (1.0 + tolerance) and
+                result['peakMemMb'] > base['peakMemMb'] + 1.0):
+            regressions.append(
+                '%s: peak memory %.1f -> %.1f MB' %
+                (name, base['peakMemMb'], result['peakMemMb'])
+            )
+    return regressions
+
+def main(rawArgs):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the DTW and metric hot paths.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        '--lengths', dest='lengths', default='100,300,1000',
+        metavar='LENGTHLIST',
+        help='sequence lengths (in frames) to benchmark'
+    )
+    parser.add_argument(
+        '--orders', dest='orders', default='13,25,40', metavar='ORDERLIST',
+        help='cepstral orders to benchmark'
+    )
+    parser.add_argument(
+        '--max_python_length', dest='maxPythonLength', default=300, type=int,
+        metavar='LENGTH',
+        help=(
+            'maximum sequence length for which to benchmark the (slow)'
+            ' pure python DTW code'
+        )
+    )
+    parser.add_argument(
+        '--repeats', dest='repeats', default=3, type=int, metavar='N',
+        help='number of times to repeat each benchmark (best time is used)'
+    )
+    parser.add_argument(
+        '--no_cli', dest='includeCli', default=True, action='store_false',
+        help='do not benchmark the command-line tools'
+    )
+    parser.add_argument(
+        '--only', dest='pattern', default=None, metavar='SUBSTRING',
+        help='only run benchmarks whose name contains this substring'
+    )
+    parser.add_argument(
+        '--save', dest='saveFile', default=None, metavar='JSONFILE',
+        help='file to save results to (e.g. as a baseline)'
+    )
+    parser.add_argument(
+        '--compare', dest='compareFile', default=None, metavar='JSONFILE',
+        help='baseline results file to compare against'
+    )
+    parser.add_argument(
+        '--tolerance', dest='tolerance', default=0.2, type=float,
+        metavar='FRACTION',
+        help='fractional change from baseline to flag as a regression'
+    )
+    args = parser.parse_args(rawArgs[1:])
+
+    lengths = [ int(lengthStr) for lengthStr in args.lengths.split(',') ]
+    orders = [ int(orderStr) for orderStr in args.orders.split(',') ]
+
+    results = runBenchmarks(lengths, orders, args.maxPythonLength,
+                            args.repeats, args.includeCli,
+                            pattern=args.pattern)
+
+    if args.saveFile is not None:
+        with open(args.saveFile, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compareFile is not None:
+        with open(args.compareFile) as f:
+            baseline = json.load(f)
+        regressions = compareResults(results, baseline, args.tolerance)
+        if regressions:
+            print
+            print 'REGRESSIONS compared to %s:' % args.compareFile
+            for regression in regressions:
+                print '  %s' % regression
+            sys.exit(1)
+        else:
+            print
+            print 'no regressions compared to %s' % args.compareFile
+
+if __name__ == '__main__':
+    main(sys.argv)
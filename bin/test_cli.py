@@ -18,6 +18,7 @@ import subprocess
 from subprocess import PIPE
 import shutil
 import tempfile
+import json
 from filecmp import cmpfiles
 
 # (FIXME : bit of a hacky way to find base dir)
@@ -51,6 +52,22 @@ def readUttIds(uttIdsFile):
 # FIXME : replace exact equality with allclose in lots of the tests below?
 
 class TestCliTools(unittest.TestCase):
+    def setUp(self):
+        # (tools cache DTW results by default, so give them an empty cache
+        #   directory of their own rather than the user's real cache, which
+        #   could contain results from an earlier version of the code)
+        self.cacheHome = TempDir()
+        self.cacheHome.__enter__()
+        self.cacheHomeBefore = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.cacheHome.location
+
+    def tearDown(self):
+        if self.cacheHomeBefore is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cacheHomeBefore
+        self.cacheHome.remove()
+
     def test_dtw_synth(self):
         """Simple characterization test for dtw_synth."""
         uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
@@ -87,6 +104,127 @@ class TestCliTools(unittest.TestCase):
             self.assertFalse(mismatch)
             self.assertFalse(errors)
 
+    def test_warp_synth(self):
+        """Checks warp_synth reproduces the output of dtw_synth."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        with TempDir() as tempDir:
+            warpingDir = join(tempDir.location, 'warping')
+            synthOutDir = join(tempDir.location, 'out-dtw_synth')
+            rewarpOutDir = join(tempDir.location, 'out-warp_synth')
+            os.makedirs(synthOutDir)
+            os.makedirs(rewarpOutDir)
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'dtw_synth'),
+                '--exts', 'mgc,lf0,bap',
+                '--param_orders', '40,1,5',
+                '--no_cache',
+                '--warping_dir', warpingDir,
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'synth-examples'),
+                synthOutDir,
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            _, stderr = p.communicate()
+            self.assertEqual(stderr, '')
+            self.assertEqual(p.returncode, 0)
+
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'warp_synth'),
+                '--exts', 'lf0,mgc',
+                '--param_orders', '1,40',
+                warpingDir,
+                join(baseDir, 'test_data', 'synth-examples'),
+                rewarpOutDir,
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            stdout, stderr = p.communicate()
+            stdoutGood = (
+                'processing cmu_us_arctic_slt_a0003\n'
+                'warping 683 frames -> 641 frames\n'
+                '\n'
+                'processing cmu_us_arctic_slt_a0044\n'
+                'warping 653 frames -> 613 frames\n'
+                '\n'
+            )
+            self.assertEqual(stderr, '')
+            self.assertEqual(stdout, stdoutGood)
+            filenames = [ '%s.%s' % (uttId, ext)
+                          for uttId in uttIds for ext in ['lf0', 'mgc'] ]
+            match, mismatch, errors = cmpfiles(rewarpOutDir, synthOutDir,
+                                               filenames, shallow = False)
+            self.assertEqual(match, filenames)
+            self.assertFalse(mismatch)
+            self.assertFalse(errors)
+
+    def test_mcd_daemon(self):
+        """Checks tools run using mcd_client give the same output."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        with TempDir() as tempDir:
+            socketPath = join(tempDir.location, 'daemon.sock')
+            daemon = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'mcd_daemon'),
+                '--socket', socketPath,
+            ], stdout=PIPE, stderr=PIPE)
+            try:
+                self.assertEqual(daemon.stdout.readline(),
+                                 'listening on %s\n' % socketPath)
+
+                def runClient(clientArgs):
+                    p = subprocess.Popen([
+                        sys.executable,
+                        join(baseDir, 'bin', 'mcd_client'),
+                        '--socket', socketPath,
+                    ] + clientArgs, stdout=PIPE, stderr=PIPE)
+                    stdout, stderr = p.communicate()
+                    return p.returncode, stdout, stderr
+
+                toolArgs = [
+                    'get_mcd_dtw',
+                    '--ext', 'mgc',
+                    '--param_order', '40',
+                    '--no_cache',
+                    join(baseDir, 'test_data', 'ref-examples'),
+                    join(baseDir, 'test_data', 'synth-examples'),
+                ] + uttIds
+                stdoutGood = (
+                    'processing cmu_us_arctic_slt_a0003\n'
+                    'processing cmu_us_arctic_slt_a0044\n'
+                    'overall MCD = 5.883106 (1254 frames)\n'
+                )
+                # (the second run uses the cached natural speech parameters)
+                for _ in range(2):
+                    returnCode, stdout, stderr = runClient(toolArgs)
+                    self.assertEqual(stderr, '')
+                    self.assertEqual(stdout, stdoutGood)
+                    self.assertEqual(returnCode, 0)
+
+                returnCode, stdout, _ = runClient(['--json'] + toolArgs)
+                self.assertEqual(returnCode, 0)
+                response = json.loads(stdout)
+                self.assertEqual(response['stdout'], stdoutGood)
+                self.assertEqual(response['exitCode'], 0)
+
+                returnCode, stdout, stderr = runClient(['get_mcd_dtw'])
+                self.assertEqual(returnCode, 2)
+                assert 'get_mcd_dtw: error: too few arguments' in stderr
+
+                returnCode, stdout, _ = runClient(['--status'])
+                self.assertEqual(returnCode, 0)
+                fileCache = json.loads(stdout)['fileCache']
+                self.assertEqual(fileCache['misses'], len(uttIds))
+                self.assertEqual(fileCache['hits'], 2 * len(uttIds))
+
+                returnCode, _, _ = runClient(['--shutdown'])
+                self.assertEqual(returnCode, 0)
+                daemon.wait()
+                self.assertEqual(daemon.returncode, 0)
+                assert not os.path.exists(socketPath)
+            finally:
+                if daemon.returncode is None:
+                    daemon.terminate()
+                    daemon.wait()
+
     def test_get_mcd_dtw(self):
         """Simple characterization test for get_mcd_dtw."""
         uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
@@ -107,6 +245,425 @@ class TestCliTools(unittest.TestCase):
         self.assertEqual(stderr, '')
         self.assertEqual(stdout, stdoutGood)
 
+    def test_interleaved_args(self):
+        """Checks options may be given between directories and uttIds."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        for toolName, synthDir, stdoutGood in [
+            ('get_mcd_dtw', 'synth-examples',
+             'overall MCD = 5.883106 (1254 frames)\n'),
+            ('get_mcd_plain', 'aligned-synth-examples',
+             'overall MCD = 5.308880 (1254 frames)\n'),
+        ]:
+            extraArgs = ['--no_cache'] if toolName == 'get_mcd_dtw' else []
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', toolName),
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', synthDir),
+                '--param_order', '40',
+            ] + uttIds[:1] + ['--ext', 'mgc'] + extraArgs + uttIds[1:],
+                stdout=PIPE, stderr=PIPE)
+            stdout, stderr = p.communicate()
+            self.assertEqual(stderr, '')
+            self.assertEqual(stdout, (
+                'processing cmu_us_arctic_slt_a0003\n'
+                'processing cmu_us_arctic_slt_a0044\n'
+            ) + stdoutGood)
+
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', toolName),
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', synthDir),
+                '--no_such_option',
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            _, stderr = p.communicate()
+            self.assertEqual(p.returncode, 2)
+            assert 'unrecognized arguments: --no_such_option' in stderr
+
+    def test_get_mcd_dtw_constrained(self):
+        """Simple characterization test for get_mcd_dtw with constraints."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        p = subprocess.Popen([
+            sys.executable,
+            join(baseDir, 'bin', 'get_mcd_dtw'),
+            '--ext', 'mgc',
+            '--param_order', '40',
+            '--band_width', '50',
+            '--itakura_slope', '1.5',
+            join(baseDir, 'test_data', 'ref-examples'),
+            join(baseDir, 'test_data', 'synth-examples'),
+        ] + uttIds, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = p.communicate()
+        stdoutGood = (
+            'processing cmu_us_arctic_slt_a0003\n'
+            'processing cmu_us_arctic_slt_a0044\n'
+            'overall MCD = 5.967041 (1254 frames)\n'
+        )
+        self.assertEqual(stderr, '')
+        self.assertEqual(stdout, stdoutGood)
+
+    def test_get_mcd_dtw_metric(self):
+        """Simple characterization test for get_mcd_dtw with other metrics."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        for metricArgs, overallGood in [
+            (['--weights', ','.join(['1.0'] * 39)], '5.883106'),
+            (['--coeffs', '0:', '--weights', ','.join(['1.0'] * 40)],
+             '7.022052'),
+            (['--metric', 'eucCepDist', '--coeffs', '0:1'], '0.327122'),
+        ]:
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'get_mcd_dtw'),
+                '--ext', 'mgc',
+                '--param_order', '40',
+                '--no_cache',
+            ] + metricArgs + [
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'synth-examples'),
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            stdout, stderr = p.communicate()
+            stdoutGood = (
+                'processing cmu_us_arctic_slt_a0003\n'
+                'processing cmu_us_arctic_slt_a0044\n'
+                'overall MCD = %s (1254 frames)\n'
+            ) % overallGood
+            self.assertEqual(stderr, '')
+            self.assertEqual(stdout, stdoutGood)
+
+        # (number of weights does not match number of coefficients)
+        p = subprocess.Popen([
+            sys.executable,
+            join(baseDir, 'bin', 'get_mcd_dtw'),
+            '--param_order', '40',
+            '--weights', '1.0,2.0',
+            join(baseDir, 'test_data', 'ref-examples'),
+            join(baseDir, 'test_data', 'synth-examples'),
+        ] + uttIds, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = p.communicate()
+        self.assertEqual(p.returncode, 2)
+        assert '2 weights given for 39 coefficients' in stderr
+
+    def test_get_mcd_dtw_shard(self):
+        """Checks merged results for shards match a single run."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        with TempDir() as tempDir:
+            numShards = 3
+            partialResultsFiles = []
+            for shardNumber in range(1, numShards + 1):
+                partialResultsFile = join(tempDir.location,
+                                          'partial%s.json' % shardNumber)
+                p = subprocess.Popen([
+                    sys.executable,
+                    join(baseDir, 'bin', 'get_mcd_dtw'),
+                    '--ext', 'mgc',
+                    '--param_order', '40',
+                    '--no_cache',
+                    '--shard', '%s/%s' % (shardNumber, numShards),
+                    '--partial_results', partialResultsFile,
+                    join(baseDir, 'test_data', 'ref-examples'),
+                    join(baseDir, 'test_data', 'synth-examples'),
+                ] + uttIds, stdout=PIPE, stderr=PIPE)
+                _, stderr = p.communicate()
+                self.assertEqual(stderr, '')
+                self.assertEqual(p.returncode, 0)
+                partialResultsFiles.append(partialResultsFile)
+
+            def runMerge(partialResultsFiles):
+                p = subprocess.Popen([
+                    sys.executable,
+                    join(baseDir, 'bin', 'merge_results'),
+                ] + partialResultsFiles, stdout=PIPE, stderr=PIPE)
+                stdout, stderr = p.communicate()
+                return p.returncode, stdout, stderr
+
+            returnCode, stdout, stderr = runMerge(partialResultsFiles[::-1])
+            self.assertEqual(stderr, '')
+            self.assertEqual(stdout, 'overall MCD = 5.883106 (1254 frames)\n')
+            self.assertEqual(returnCode, 0)
+
+            # (the utterances are in some non-empty shard)
+            for partialResultsFile in partialResultsFiles:
+                if json.load(open(partialResultsFile))['utts']:
+                    returnCode, _, stderr = runMerge([
+                        otherFile for otherFile in partialResultsFiles
+                        if otherFile != partialResultsFile
+                    ])
+                    self.assertEqual(returnCode, 1)
+                    assert 'missing results' in stderr
+                    break
+
+            returnCode, _, stderr = runMerge(partialResultsFiles +
+                                             partialResultsFiles[:1])
+            self.assertEqual(returnCode, 1)
+            assert 'duplicate results' in stderr
+
+            # (results for a shard computed with a different metric)
+            otherPartialResultsFile = join(tempDir.location, 'other.json')
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'get_mcd_dtw'),
+                '--ext', 'mgc',
+                '--param_order', '40',
+                '--metric', 'eucCepDist',
+                '--no_cache',
+                '--shard', '1/%s' % numShards,
+                '--partial_results', otherPartialResultsFile,
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'synth-examples'),
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            p.communicate()
+            self.assertEqual(p.returncode, 0)
+            returnCode, _, stderr = runMerge([otherPartialResultsFile] +
+                                             partialResultsFiles[1:])
+            self.assertEqual(returnCode, 1)
+            assert 'different settings for metric' in stderr
+
+    def test_get_mcd_dtw_jobs(self):
+        """Checks get_mcd_dtw gives identical output with several jobs."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        p = subprocess.Popen([
+            sys.executable,
+            join(baseDir, 'bin', 'get_mcd_dtw'),
+            '--ext', 'mgc',
+            '--param_order', '40',
+            '--jobs', '2',
+            join(baseDir, 'test_data', 'ref-examples'),
+            join(baseDir, 'test_data', 'synth-examples'),
+        ] + uttIds, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = p.communicate()
+        stdoutGood = (
+            'processing cmu_us_arctic_slt_a0003\n'
+            'processing cmu_us_arctic_slt_a0044\n'
+            'overall MCD = 5.883106 (1254 frames)\n'
+        )
+        self.assertEqual(stderr, '')
+        self.assertEqual(stdout, stdoutGood)
+
+    def test_get_mcd_dtw_batch_size(self):
+        """Checks get_mcd_dtw gives identical output with one utt per batch."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        p = subprocess.Popen([
+            sys.executable,
+            join(baseDir, 'bin', 'get_mcd_dtw'),
+            '--ext', 'mgc',
+            '--param_order', '40',
+            '--batch_size', '1',
+            '--jobs', '2',
+            join(baseDir, 'test_data', 'ref-examples'),
+            join(baseDir, 'test_data', 'synth-examples'),
+        ] + uttIds, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = p.communicate()
+        stdoutGood = (
+            'processing cmu_us_arctic_slt_a0003\n'
+            'processing cmu_us_arctic_slt_a0044\n'
+            'overall MCD = 5.883106 (1254 frames)\n'
+        )
+        self.assertEqual(stderr, '')
+        self.assertEqual(stdout, stdoutGood)
+
+    def test_get_mcd_dtw_corpus_results(self):
+        """Checks get_mcd_dtw with a corpus file and per-utterance results."""
+        with TempDir() as tempDir:
+            resultsFile = join(tempDir.location, 'results.jsonl')
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'get_mcd_dtw'),
+                '--ext', 'mgc',
+                '--param_order', '40',
+                '--corpus', join(baseDir, 'test_data', 'corpus.lst'),
+                '--results', resultsFile,
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'synth-examples'),
+            ], stdout=PIPE, stderr=PIPE)
+            stdout, stderr = p.communicate()
+            stdoutGood = (
+                'processing cmu_us_arctic_slt_a0003\n'
+                'processing cmu_us_arctic_slt_a0044\n'
+                'overall MCD = 5.883106 (1254 frames)\n'
+            )
+            self.assertEqual(stderr, '')
+            self.assertEqual(stdout, stdoutGood)
+            results = [ json.loads(line) for line in open(resultsFile) ]
+            self.assertEqual(
+                [ (result['uttId'], result['frames'], '%f' % result['mcd'])
+                  for result in results ],
+                [
+                    ('cmu_us_arctic_slt_a0003', 641, '6.175330'),
+                    ('cmu_us_arctic_slt_a0044', 613, '5.577534'),
+                ]
+            )
+            for result in results:
+                self.assertEqual(result['cost'] / result['frames'],
+                                 result['mcd'])
+
+    def test_get_mcd_dtw_cache(self):
+        """Checks get_mcd_dtw gives identical output using cached results."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        stdoutGood = (
+            'processing cmu_us_arctic_slt_a0003\n'
+            'processing cmu_us_arctic_slt_a0044\n'
+            'overall MCD = 5.883106 (1254 frames)\n'
+        )
+        with TempDir() as tempDir:
+            cacheDir = tempDir.location
+            for _ in range(2):
+                p = subprocess.Popen([
+                    sys.executable,
+                    join(baseDir, 'bin', 'get_mcd_dtw'),
+                    '--ext', 'mgc',
+                    '--param_order', '40',
+                    '--cache_dir', cacheDir,
+                    join(baseDir, 'test_data', 'ref-examples'),
+                    join(baseDir, 'test_data', 'synth-examples'),
+                ] + uttIds, stdout=PIPE, stderr=PIPE)
+                stdout, stderr = p.communicate()
+                self.assertEqual(stderr, '')
+                self.assertEqual(stdout, stdoutGood)
+                self.assertEqual(len(os.listdir(cacheDir)), len(uttIds))
+
+    def test_shared_cache(self):
+        """Checks dtw_synth does not reuse results cached by get_mcd_dtw."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        with TempDir() as tempDir:
+            cacheDir = join(tempDir.location, 'cache')
+            synthOutDir = join(tempDir.location, 'out-dtw_synth')
+            os.makedirs(synthOutDir)
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'get_mcd_dtw'),
+                '--ext', 'mgc',
+                '--param_order', '40',
+                '--cache_dir', cacheDir,
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'synth-examples'),
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            _, stderr = p.communicate()
+            self.assertEqual(stderr, '')
+            self.assertEqual(len(os.listdir(cacheDir)), len(uttIds))
+
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'dtw_synth'),
+                '--exts', 'mgc',
+                '--param_orders', '40',
+                '--cache_dir', cacheDir,
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'synth-examples'),
+                synthOutDir,
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            _, stderr = p.communicate()
+            self.assertEqual(stderr, '')
+            self.assertEqual(len(os.listdir(cacheDir)), 2 * len(uttIds))
+            synthOutDirGood = join(baseDir, 'test_data', 'out-dtw_synth')
+            filenames = [ '%s.mgc' % uttId for uttId in uttIds ]
+            match, mismatch, errors = cmpfiles(synthOutDir, synthOutDirGood,
+                                               filenames, shallow = False)
+            self.assertEqual(match, filenames)
+
+    def test_get_mcd_dtw_profile(self):
+        """Checks get_mcd_dtw --profile writes a per-stage breakdown."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        with TempDir() as tempDir:
+            profileFile = join(tempDir.location, 'profile.json')
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'get_mcd_dtw'),
+                '--ext', 'mgc',
+                '--param_order', '40',
+                '--no_cache',
+                '--jobs', '2',
+                '--batch_size', '1',
+                '--profile', profileFile,
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'synth-examples'),
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            stdout, stderr = p.communicate()
+            stdoutGood = (
+                'processing cmu_us_arctic_slt_a0003\n'
+                'processing cmu_us_arctic_slt_a0044\n'
+                'overall MCD = 5.883106 (1254 frames)\n'
+            )
+            self.assertEqual(stdout, stdoutGood)
+            self.assertTrue(stderr.startswith('stage'))
+            with open(profileFile) as f:
+                profile = json.load(f)
+            self.assertEqual(profile['calls']['read'], 2)
+            self.assertEqual(profile['counts']['frames'], 1254)
+            self.assertEqual(profile['counts']['matrixCells'],
+                             641 * 683 + 613 * 653)
+
+    def test_get_mcd_plain_segments(self):
+        """Checks per-label results are consistent with segment removal."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        alignmentDir = join(
+            baseDir, 'test_data', 'aligned-synth-examples', 'alignment'
+        )
+        with TempDir() as tempDir:
+            segmentResultsFile = join(tempDir.location, 'segments.jsonl')
+            labelResultsFile = join(tempDir.location, 'labels.jsonl')
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'get_mcd_plain'),
+                '--ext', 'mgc',
+                '--param_order', '40',
+                '--alignment_dir', alignmentDir,
+                '--segment_results', segmentResultsFile,
+                '--label_results', labelResultsFile,
+                '--label_regex=-(.+?)\\+',
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'aligned-synth-examples'),
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            stdout, stderr = p.communicate()
+            self.assertEqual(stderr, '')
+            assert stdout.endswith('overall MCD = 5.308880 (1254 frames)\n')
+
+            segmentResults = [ json.loads(line)
+                               for line in open(segmentResultsFile) ]
+            self.assertEqual(
+                sum([ result['frames'] for result in segmentResults ]), 1254
+            )
+            labelResults = [ json.loads(line)
+                             for line in open(labelResultsFile) ]
+            costNonPau = sum([ result['cost'] for result in labelResults
+                               if result['label'] != 'pau' ])
+            framesNonPau = sum([ result['frames'] for result in labelResults
+                                 if result['label'] != 'pau' ])
+            self.assertEqual('%f (%d frames)' % (costNonPau / framesNonPau,
+                                                 framesNonPau),
+                             '5.389857 (1157 frames)')
+
+    def test_get_mcd_dtw_segments(self):
+        """Checks per-label results are consistent with the overall MCD."""
+        uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
+        alignmentDir = join(
+            baseDir, 'test_data', 'aligned-synth-examples', 'alignment'
+        )
+        with TempDir() as tempDir:
+            labelResultsFile = join(tempDir.location, 'labels.jsonl')
+            p = subprocess.Popen([
+                sys.executable,
+                join(baseDir, 'bin', 'get_mcd_dtw'),
+                '--ext', 'mgc',
+                '--param_order', '40',
+                '--no_cache',
+                '--alignment_dir', alignmentDir,
+                '--label_results', labelResultsFile,
+                join(baseDir, 'test_data', 'ref-examples'),
+                join(baseDir, 'test_data', 'synth-examples'),
+            ] + uttIds, stdout=PIPE, stderr=PIPE)
+            stdout, stderr = p.communicate()
+            self.assertEqual(stderr, '')
+            assert stdout.endswith('overall MCD = 5.883106 (1254 frames)\n')
+
+            labelResults = [ json.loads(line)
+                             for line in open(labelResultsFile) ]
+            costTot = sum([ result['cost'] for result in labelResults ])
+            framesTot = sum([ result['frames'] for result in labelResults ])
+            self.assertEqual('%f (%d frames)' % (costTot / framesTot,
+                                                 framesTot),
+                             '5.883106 (1254 frames)')
+
     def test_get_mcd_plain(self):
         """Simple characterization test for get_mcd_plain."""
         uttIds = readUttIds(join(baseDir, 'test_data', 'corpus.lst'))
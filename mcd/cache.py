@@ -0,0 +1,152 @@
+"""An on-disk cache for per-utterance results."""
+
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import os
+import errno
+import hashlib
+import numpy as np
+
+import mcd
+from mcd import util
+
+# (included in every cache key together with the package version, so that
+#   results cached by older code are not reused; this should be increased
+#   whenever a change to the code may change the results stored in the cache,
+#   such as a change to the DTW or metric code, without a change of version)
+cacheFormatVersion = 1
+
+def getDefaultCacheDir():
+    cacheHome = os.environ.get('XDG_CACHE_HOME',
+                               os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cacheHome, 'mcd')
+
+def hashFile(fileName, blockSize=1 << 20):
+    """Returns the SHA-1 hex digest of the contents of a file."""
+    h = hashlib.sha1()
+    with open(fileName, 'rb') as f:
+        while True:
+            block = f.read(blockSize)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+def hashArray(a):
+    """Returns the SHA-1 hex digest of the raw contents of an array.
+
+    For an array read using paramfile.VecSeqMapIo this is the same as the
+    digest of the file, which allows a file that has already been mapped to
+    be hashed without reading it a second time.
+    """
+    return hashlib.sha1(np.ascontiguousarray(a).data).hexdigest()
+
+def getKeyForHashes(hashes, settings):
+    """Returns a cache key given the digests of the input files.
+
+    The key also depends on the package version and cacheFormatVersion.
+    """
+    h = hashlib.sha1()
+    for fileHash in hashes:
+        h.update(fileHash.encode('ascii'))
+    versions = (mcd.__version__, cacheFormatVersion)
+    h.update(repr(versions + tuple(settings)).encode('utf-8'))
+    return h.hexdigest()
+
+def getKey(fileNames, settings):
+    """Returns a cache key for a computation.
+
+    The key depends on the contents (not the names) of fileNames and on
+    settings, which should be a sequence of simple python values (strings,
+    numbers or None) describing everything else the computation depends on.
+    """
+    return getKeyForHashes([ hashFile(fileName) for fileName in fileNames ],
+                           settings)
+
+class ResultCache(object):
+    """An on-disk cache of numpy arrays with least recently used eviction.
+
+    Each entry is a dict of numpy arrays stored as a .npz file in cacheDir.
+    Reading an entry marks it as recently used (by updating its modification
+    time), and whenever the total size of the cache exceeds maxBytes the least
+    recently used entries are removed.
+    Entries are written atomically, so the cache may safely be shared by
+    several processes.
+    """
+    suffix = '.npz'
+
+    def __init__(self, cacheDir, maxBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        try:
+            os.makedirs(cacheDir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self.sizeEstimate = self.getSize()
+        if self.sizeEstimate > self.maxBytes:
+            self.evict()
+
+    def getEntryFile(self, key):
+        return os.path.join(self.cacheDir, key + self.suffix)
+
+    def listEntries(self):
+        """Returns a list of (modification time, size, file) for each entry."""
+        entries = []
+        for fileName in os.listdir(self.cacheDir):
+            if fileName.endswith(self.suffix):
+                entryFile = os.path.join(self.cacheDir, fileName)
+                try:
+                    stat = os.stat(entryFile)
+                except OSError:
+                    # (removed by another process)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entryFile))
+        return entries
+
+    def getSize(self):
+        return sum([ size for _, size, _ in self.listEntries() ])
+
+    def get(self, key):
+        """Returns the entry for key, or None if there is no such entry."""
+        entryFile = self.getEntryFile(key)
+        try:
+            with open(entryFile, 'rb') as f:
+                npzFile = np.load(f)
+                entry = dict([ (name, npzFile[name])
+                               for name in npzFile.files ])
+            os.utime(entryFile, None)
+        except (IOError, OSError):
+            return None
+        return entry
+
+    def put(self, key, entry):
+        """Stores a dict of numpy arrays as the entry for key."""
+        with util.openAtomic(self.getEntryFile(key)) as f:
+            np.savez(f, **entry)
+        self.sizeEstimate += os.path.getsize(self.getEntryFile(key))
+        if self.sizeEstimate > self.maxBytes:
+            self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache is small enough.
+
+        Entries are removed until the cache is at most 90% of its maximum size,
+        so that eviction does not happen on every subsequent write.
+        """
+        entries = sorted(self.listEntries())
+        size = sum([ size for _, size, _ in entries ])
+        targetSize = self.maxBytes * 0.9
+        for _, entrySize, entryFile in entries:
+            if size <= targetSize:
+                break
+            try:
+                os.remove(entryFile)
+            except OSError:
+                # (removed by another process)
+                pass
+            size -= entrySize
+        self.sizeEstimate = size
@@ -0,0 +1,235 @@
+"""Helper functions for processing a corpus of utterances."""
+
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import sys
+import time
+import json
+import multiprocessing
+
+from mcd import util
+
+def readUttIds(corpusFile):
+    """Returns an iterator over the utterance ids listed in a corpus file.
+
+    The corpus file has one utterance id per line (blank lines are ignored).
+    If corpusFile is '-' then utterance ids are read from stdin.
+    Utterance ids are read lazily as the iterator is consumed.
+    """
+    f = sys.stdin if corpusFile == '-' else open(corpusFile)
+    try:
+        for line in f:
+            uttId = line.strip()
+            if uttId:
+                yield uttId
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def getUttIds(uttIds, corpusFile=None):
+    """Returns an iterator over utterance ids given on the command line.
+
+    The utterance ids in uttIds come first, followed by those listed in
+    corpusFile (if not None).
+    """
+    for uttId in uttIds:
+        yield uttId
+    if corpusFile is not None:
+        for uttId in readUttIds(corpusFile):
+            yield uttId
+
+def parseArgs(parser, args):
+    """Parses the command-line arguments for a tool processing utterances.
+
+    The parser should have an optional positional argument uttIds and a
+    corpusFile option.
+    As with a required positional argument, utterance ids may be given before,
+    after or between options.
+    Exits with an error if no utterance ids or corpus file are specified.
+    """
+    # (argparse only assigns positional arguments given consecutively, so
+    #   utterance ids given after an option are left over)
+    parsedArgs, extraArgs = parser.parse_known_args(args)
+    unrecognizedArgs = [ arg for arg in extraArgs if arg.startswith('-') ]
+    if unrecognizedArgs:
+        parser.error('unrecognized arguments: %s' % ' '.join(unrecognizedArgs))
+    parsedArgs.uttIds = parsedArgs.uttIds + extraArgs
+    if not parsedArgs.uttIds and parsedArgs.corpusFile is None:
+        parser.error('no utterance ids specified')
+    return parsedArgs
+
+def getBatches(items, batchSize):
+    """Returns an iterator over lists of consecutive items.
+
+    Each list has batchSize items except possibly the last.
+    Items are consumed lazily.
+    """
+    assert batchSize >= 1
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class Timed(object):
+    """Wraps a function so that it also returns the time it took to run.
+
+    Calling an instance returns the pair (result, elapsed time in seconds).
+    An instance is picklable if the wrapped function is.
+    """
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, *args):
+        startTime = time.time()
+        result = self.fn(*args)
+        return result, time.time() - startTime
+
+class UttResultWriter(object):
+    """Writes per-utterance results to a file as JSON lines.
+
+    One JSON object is written per utterance, and the file is flushed after
+    each one, so that results are available as soon as each utterance is
+    finished and partial results survive if the run is interrupted.
+    """
+    def __init__(self, resultsFile):
+        self.f = sys.stdout if resultsFile == '-' else open(resultsFile, 'w')
+
+    def write(self, uttId, cost, frames, elapsed):
+        self.writeResult(dict(
+            uttId=uttId,
+            cost=float(cost),
+            frames=int(frames),
+            mcd=float(cost) / frames if frames > 0 else None,
+            elapsed=elapsed,
+        ))
+
+    def writeResult(self, result):
+        """Writes an arbitrary JSON-serializable dict as a line."""
+        self.f.write(json.dumps(result, sort_keys=True))
+        self.f.write('\n')
+        self.f.flush()
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+class SegmentCosts(object):
+    """Accumulates costs by segment and by label over a corpus.
+
+    For each utterance, add is given the alignment and the cost for each
+    frame, and sums the costs for each segment of the alignment.
+    If segmentResultsFile is not None then a JSON line is written to it for
+    each segment as it is added.
+    Costs are also accumulated over the corpus for each label, where if
+    labelRegex is not None then the label for a segment is the first group
+    (or if there are no groups, the whole match) of the regex in the segment
+    label, for example to extract the phone from a full-context label.
+    """
+    def __init__(self, segmentResultsFile=None, labelRegex=None):
+        self.segmentWriter = (None if segmentResultsFile is None
+                              else UttResultWriter(segmentResultsFile))
+        self.labelRegex = labelRegex
+        self.labelCosts = dict()
+        self.labelFrames = dict()
+        self.labelSegments = dict()
+
+    def getLabel(self, segmentLabel):
+        if self.labelRegex is None:
+            return segmentLabel
+        match = self.labelRegex.search(segmentLabel)
+        if match is None:
+            return segmentLabel
+        return match.group(1) if match.groups() else match.group(0)
+
+    def add(self, uttId, alignment, frameCosts):
+        """Adds the per-frame costs for an utterance.
+
+        alignment should be a sequence of (start time, end time, label)
+        triples with times in frames.
+        Raises ValueError if the alignment does not cover all the frames.
+        """
+        try:
+            segmentCosts = util.sumBySegment(frameCosts, alignment)
+        except ValueError as e:
+            raise ValueError('%s: %s' % (uttId, e))
+        for segmentIndex, ((startTime, endTime, segmentLabel), cost) in (
+            enumerate(zip(alignment, segmentCosts))
+        ):
+            label = self.getLabel(segmentLabel)
+            frames = endTime - startTime
+            self.labelCosts[label] = self.labelCosts.get(label, 0.0) + cost
+            self.labelFrames[label] = self.labelFrames.get(label, 0) + frames
+            self.labelSegments[label] = self.labelSegments.get(label, 0) + 1
+            if self.segmentWriter is not None:
+                self.segmentWriter.writeResult(dict(
+                    uttId=uttId,
+                    segment=segmentIndex,
+                    startFrame=int(startTime),
+                    endFrame=int(endTime),
+                    label=label,
+                    cost=float(cost),
+                    frames=int(frames),
+                    mcd=float(cost) / frames if frames > 0 else None,
+                ))
+
+    def getLabelResults(self):
+        """Returns a list of results for each label, sorted by label."""
+        return [
+            dict(
+                label=label,
+                cost=float(self.labelCosts[label]),
+                frames=self.labelFrames[label],
+                segments=self.labelSegments[label],
+                mcd=(float(self.labelCosts[label]) / self.labelFrames[label]
+                     if self.labelFrames[label] > 0 else None),
+            )
+            for label in sorted(self.labelCosts)
+        ]
+
+    def writeLabelResults(self, labelResultsFile):
+        """Writes the results for each label as JSON lines."""
+        labelWriter = UttResultWriter(labelResultsFile)
+        for result in self.getLabelResults():
+            labelWriter.writeResult(result)
+        labelWriter.close()
+
+    def close(self):
+        if self.segmentWriter is not None:
+            self.segmentWriter.close()
+
+def formatOverallMcd(costTot, framesTot):
+    """Returns the line summarizing the overall MCD printed by the tools."""
+    if framesTot == 0:
+        # (for example if a shard contains no utterances)
+        return 'overall MCD = undefined (0 frames)'
+    return 'overall MCD = %f (%d frames)' % (costTot / framesTot, framesTot)
+
+def mapUtts(processUtt, uttIds, numJobs=1):
+    """Applies processUtt to each utterance id, possibly in parallel.
+
+    Returns an iterator over the results, which are always produced in the
+    same order as uttIds regardless of the number of jobs, so that any
+    subsequent accumulation is performed in a deterministic order.
+    If numJobs is greater than 1 then the utterances are processed by a pool
+    of numJobs worker processes, in which case processUtt must be picklable.
+    """
+    assert numJobs >= 1
+    if numJobs == 1:
+        for uttId in uttIds:
+            yield processUtt(uttId)
+    else:
+        pool = multiprocessing.Pool(numJobs)
+        try:
+            for result in pool.imap(processUtt, uttIds):
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
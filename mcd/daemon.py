@@ -0,0 +1,300 @@
+"""A long-running server which runs the command-line tools on request.
+
+Running a command-line tool such as get_mcd_dtw involves starting python,
+importing numpy, htk_io and the compiled modules, and reading the natural
+speech parameters, all of which can take longer than the computation itself
+when only a few utterances are processed.
+A server started using mcd_daemon avoids this by running the tools within a
+single long-running process which listens for jobs on a Unix domain socket.
+Natural speech parameters are kept in a bounded in-memory cache between jobs
+(see paramfile.CachedDirReader).
+
+Messages are JSON objects, one per line.
+Each connection carries a single request and its response.
+A request has a 'command' of 'run', 'status' or 'shutdown'.
+A 'run' request specifies the 'tool' to run (one of toolNames), its
+command-line 'args', the working directory 'cwd' to run it in, and optionally
+'stdin', the data to provide as its standard input.
+The response gives the tool's 'exitCode', 'stdout' and 'stderr', together
+with the 'elapsed' time in seconds.
+If a request cannot be handled then the response contains an 'error'.
+
+The socket is kept in a directory only accessible by the current user, and
+neither the server nor clients will use a socket owned by another user.
+
+Only the standard library is imported by this module, so that clients start
+quickly.
+"""
+
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import os
+import sys
+import imp
+import json
+import time
+import stat
+import errno
+import socket
+import tempfile
+import traceback
+import SocketServer
+from StringIO import StringIO
+
+from mcd import instrument
+
+toolNames = ['dtw_synth', 'get_mcd_dtw', 'get_mcd_plain', 'warp_synth']
+
+def getDefaultSocketPath():
+    """Returns the default socket path for the current user.
+
+    This is in XDG_RUNTIME_DIR if set, which is private to the user, and
+    otherwise in a per-user directory in the temporary directory, which is
+    created by the server with permissions allowing access only by the user.
+    """
+    if 'XDG_RUNTIME_DIR' in os.environ:
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'mcd.sock')
+    else:
+        return os.path.join(tempfile.gettempdir(), 'mcd-%s' % os.getuid(),
+                            'mcd.sock')
+
+def checkSocketPath(socketPath):
+    """Checks socketPath cannot be controlled by another user.
+
+    The directory containing socketPath should be owned by the current user
+    (or root) and either not be writable by other users or have the sticky bit
+    set (as for /tmp), so that another user cannot replace the socket.
+    If socketPath exists then it should be a socket owned by the current user.
+    Raises IOError if not.
+    """
+    socketDir = os.path.dirname(os.path.abspath(socketPath))
+    try:
+        dirStat = os.stat(socketDir)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+    if (dirStat.st_uid not in [os.getuid(), 0] or
+            (dirStat.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and
+             not dirStat.st_mode & stat.S_ISVTX)):
+        raise IOError('directory %s may be controlled by another user' %
+                      socketDir)
+    try:
+        socketStat = os.lstat(socketPath)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+    if socketStat.st_uid != os.getuid():
+        raise IOError('%s is owned by another user' % socketPath)
+    if not stat.S_ISSOCK(socketStat.st_mode):
+        raise IOError('%s is not a socket' % socketPath)
+
+def writeMessage(f, message):
+    f.write(json.dumps(message, sort_keys=True) + '\n')
+    f.flush()
+
+def readMessage(f):
+    line = f.readline()
+    if not line:
+        raise IOError('connection closed before a message was received')
+    return json.loads(line)
+
+def sendRequest(socketPath, request):
+    """Sends a request to the server listening on socketPath.
+
+    Returns the response.
+    Raises socket.error if no server is listening, or IOError if socketPath
+    fails checkSocketPath.
+    """
+    checkSocketPath(socketPath)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketPath)
+        writeMessage(sock.makefile('w'), request)
+        return readMessage(sock.makefile('r'))
+    finally:
+        sock.close()
+
+def runTool(socketPath, toolName, args, cwd=None, stdinData=''):
+    """Runs a command-line tool using the server listening on socketPath.
+
+    args are the tool's command-line arguments, excluding the tool name.
+    Returns the response, as described above.
+    """
+    return sendRequest(socketPath, dict(
+        command='run',
+        tool=toolName,
+        args=list(args),
+        cwd=os.getcwd() if cwd is None else cwd,
+        stdin=stdinData,
+    ))
+
+class ToolRunner(object):
+    """Runs command-line tools within the current process.
+
+    Each tool is loaded once, from the script of the same name in toolsDir,
+    and its main function is called for each run with the standard streams,
+    sys.argv and working directory of the process temporarily replaced.
+    """
+    def __init__(self, toolsDir):
+        self.toolsDir = toolsDir
+        self.mains = dict()
+
+    def getMain(self, toolName):
+        if toolName not in toolNames:
+            raise ValueError('unknown tool %s (should be one of %s)' %
+                             (toolName, ', '.join(toolNames)))
+        if toolName not in self.mains:
+            toolFile = os.path.join(self.toolsDir, toolName)
+            # (the module is registered so that objects defined by the tool
+            #   can be pickled for worker processes)
+            moduleName = 'mcd_tool_%s' % toolName
+            module = imp.new_module(moduleName)
+            module.__file__ = toolFile
+            with open(toolFile) as f:
+                code = compile(f.read(), toolFile, 'exec')
+            sys.modules[moduleName] = module
+            exec code in module.__dict__
+            self.mains[toolName] = module.main
+        return self.mains[toolName]
+
+    def run(self, toolName, args, cwd, stdinData=''):
+        """Runs a tool, returning its exit code and output as a dict."""
+        main = self.getMain(toolName)
+        stdout = StringIO()
+        stderr = StringIO()
+        argv = [toolName] + list(args)
+        streamsBefore = sys.stdin, sys.stdout, sys.stderr
+        argvBefore = sys.argv
+        cwdBefore = os.getcwd()
+        startTime = time.time()
+        try:
+            os.chdir(cwd)
+            # (sys.argv is used by argparse for the program name)
+            sys.argv = argv
+            sys.stdin, sys.stdout, sys.stderr = (StringIO(stdinData), stdout,
+                                                 stderr)
+            try:
+                main(argv)
+                exitCode = 0
+            except SystemExit as e:
+                if e.code is None:
+                    exitCode = 0
+                elif isinstance(e.code, int):
+                    exitCode = e.code
+                else:
+                    sys.stderr.write('%s\n' % e.code)
+                    exitCode = 1
+            except Exception:
+                traceback.print_exc()
+                exitCode = 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = streamsBefore
+            sys.argv = argvBefore
+            os.chdir(cwdBefore)
+            # (the tool may have enabled instrumentation)
+            instrument.disable()
+        return dict(
+            exitCode=exitCode,
+            stdout=stdout.getvalue(),
+            stderr=stderr.getvalue(),
+            elapsed=time.time() - startTime,
+        )
+
+def removeStaleSocket(socketPath):
+    """Removes a socket left behind by a server which is no longer running.
+
+    Raises IOError if a server is listening on socketPath, or if socketPath
+    fails checkSocketPath.
+    """
+    checkSocketPath(socketPath)
+    if not os.path.lexists(socketPath):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketPath)
+    except socket.error:
+        os.remove(socketPath)
+    else:
+        raise IOError('a server is already listening on %s' % socketPath)
+    finally:
+        sock.close()
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        try:
+            response = self.server.handleRequest(readMessage(self.rfile))
+        except Exception as e:
+            response = dict(error='%s: %s' % (type(e).__name__, e))
+        writeMessage(self.wfile, response)
+
+class EvalServer(SocketServer.UnixStreamServer):
+    """Serves requests to run command-line tools on a Unix domain socket.
+
+    Requests are handled one at a time in the order they arrive, since
+    running a tool replaces the standard streams and working directory of the
+    process (and the tools are CPU-bound anyway).
+    The socket is only accessible by the current user, and its directory is
+    created if necessary with permissions allowing access only by the user.
+    """
+    def __init__(self, socketPath, toolRunner):
+        self.socketPath = socketPath
+        self.toolRunner = toolRunner
+        self.startTime = time.time()
+        self.numRuns = 0
+        self.shutdownRequested = False
+
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(socketPath)), 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        removeStaleSocket(socketPath)
+        umaskBefore = os.umask(0o077)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, socketPath,
+                                                   _RequestHandler)
+        finally:
+            os.umask(umaskBefore)
+
+    def handleRequest(self, request):
+        command = request.get('command')
+        if command == 'run':
+            self.numRuns += 1
+            return self.toolRunner.run(request['tool'], request['args'],
+                                       request['cwd'],
+                                       request.get('stdin', ''))
+        elif command == 'status':
+            return self.getStatus()
+        elif command == 'shutdown':
+            self.shutdownRequested = True
+            return dict(shutdown=True)
+        else:
+            raise ValueError('unknown command %r' % command)
+
+    def getStatus(self):
+        # (imported here so that clients do not import numpy)
+        from mcd import paramfile
+        fileCache = paramfile.getCache()
+        return dict(
+            pid=os.getpid(),
+            uptime=time.time() - self.startTime,
+            runs=self.numRuns,
+            fileCache=None if fileCache is None else fileCache.getStats(),
+        )
+
+    def serveUntilShutdown(self):
+        """Handles requests until a shutdown request is received.
+
+        The socket is removed on return.
+        """
+        try:
+            while not self.shutdownRequested:
+                self.handle_request()
+        finally:
+            self.server_close()
+            os.remove(self.socketPath)
@@ -4,14 +4,103 @@
 # This file is part of mcd.
 # See `License` for details of license and warranty.
 
+import time
+import bisect
 import numpy as np
 import itertools as it
 
-def getCostMatrix(xs, ys, costFn):
+import mcd.metrics as mt
+from mcd import instrument
+try:
+    import mcd.metrics_fast as mtf
+except ImportError:
+    mtf = None
+try:
+    import mcd.dtw_fast as dtw_fast
+except ImportError:
+    dtw_fast = None
+
+# (cost functions for which a vectorized version computing the whole cost
+#   matrix at once is available)
+_matrixCostFns = {
+    mt.sqCepDist: mt.sqCepDistMatrix,
+    mt.eucCepDist: mt.eucCepDistMatrix,
+    mt.logSpecDbDist: mt.logSpecDbDistMatrix,
+}
+if mtf is not None:
+    _matrixCostFns.update({
+        mtf.sqCepDist: mt.sqCepDistMatrix,
+        mtf.eucCepDist: mt.eucCepDistMatrix,
+        mtf.logSpecDbDist: mt.logSpecDbDistMatrix,
+    })
+
+# (cost functions for which a vectorized version computing the cost for each
+#   pair of corresponding rows is available)
+_alignedCostFns = {
+    mt.sqCepDist: mt.sqCepDistAligned,
+    mt.eucCepDist: mt.eucCepDistAligned,
+    mt.logSpecDbDist: mt.logSpecDbDistAligned,
+}
+if mtf is not None:
+    _alignedCostFns.update({
+        mtf.sqCepDist: mt.sqCepDistAligned,
+        mtf.eucCepDist: mt.eucCepDistAligned,
+        mtf.logSpecDbDist: mt.logSpecDbDistAligned,
+    })
+
+def getMatrixCostFn(costFn):
+    """Returns a vectorized version of costFn, or None if there is none.
+
+    The vectorized version takes two 2-D arrays xs and ys and returns the
+    matrix of costFn(x, y) for each row x of xs and each row y of ys.
+    """
+    if isinstance(costFn, mt.Metric):
+        return costFn.matrix
+    try:
+        return _matrixCostFns.get(costFn)
+    except TypeError:
+        # (unhashable cost function)
+        return None
+
+def getAlignedCostFn(costFn):
+    """Returns a vectorized version of costFn, or None if there is none.
+
+    The vectorized version takes two 2-D arrays xs and ys of the same shape
+    and returns the array of costFn(x, y) for each pair of corresponding rows.
+    """
+    if isinstance(costFn, mt.Metric):
+        return costFn.aligned
+    try:
+        return _alignedCostFns.get(costFn)
+    except TypeError:
+        # (unhashable cost function)
+        return None
+
+def isFloatMatrix(xs):
+    return (isinstance(xs, np.ndarray) and np.ndim(xs) == 2 and
+            np.issubdtype(xs.dtype, np.floating))
+
+def getCostMatrix(xs, ys, costFn, dtype=np.float64, threads=None):
+    """Computes the matrix of costFn(x, y) for each x in xs and y in ys.
+
+    The returned matrix has the given dtype.
+    Using np.float32 halves the size of the matrix, though costs are still
+    computed in double precision by the vectorized metrics.
+    If threads is not None then the vectorized metrics compute blocks of rows
+    of the matrix in parallel using this many threads.
+    """
     assert len(xs) > 0 and len(ys) > 0
 
-    costMat = np.array([ [ costFn(x, y) for y in ys ] for x in xs ])
+    with instrument.stage('costMatrix'):
+        matrixCostFn = getMatrixCostFn(costFn)
+        if (matrixCostFn is not None and isFloatMatrix(xs) and
+                isFloatMatrix(ys)):
+            costMat = matrixCostFn(xs, ys, dtype=dtype, threads=threads)
+        else:
+            costMat = np.array([ [ costFn(x, y) for y in ys ] for x in xs ],
+                               dtype=dtype)
     assert np.shape(costMat) == (len(xs), len(ys))
+    instrument.count('matrixCells', costMat.size)
     return costMat
 
 def getCumCostMatrix(costMat):
@@ -50,7 +139,8 @@ def getBestPath(cumMat):
 
     return path
 
-def dtw(xs, ys, costFn):
+def dtw(xs, ys, costFn, bandWidth=None, itakuraSlope=None,
+        costDtype=np.float64, threads=None, returnArray=False):
     """Computes an alignment of minimum cost using dynamic time warping.
 
     A path is a sequence of (x-index, y-index) pairs corresponding to a pairing
@@ -69,15 +159,1243 @@ def dtw(xs, ys, costFn):
     (x-index, y-index) are allowed: (+0, +1), (+1, +0), (+1, +1).
     This function computes the minimum cost a valid path can have.
 
+    Optionally paths may be further constrained to stay within bandWidth frames
+    of the diagonal (a Sakoe-Chiba band) and / or to have local slope between
+    1 / itakuraSlope and itakuraSlope (an Itakura parallelogram).
+    In this case only the points allowed by the constraints are computed.
+
+    The cost matrix is stored with dtype costDtype.
+    Using np.float32 halves its size, while cumulative costs are still
+    accumulated in double precision.
+
+    If threads is not None (and no constraints are specified) then the cost
+    matrix is computed in blocks of rows, and the cumulative cost matrix in
+    tiles along anti-diagonals, with blocks and tiles computed in parallel
+    using this many threads.
+    The result is exactly the same whatever the number of threads.
+
     Returns the minimum cost and a corresponding path.
     If there is more than one optimal path then one is chosen arbitrarily.
+    If returnArray is True then the path is instead returned as an int array
+    of shape (path length, 2), followed by the array of costs of each point on
+    the path (taken from the cost matrix, so with dtype costDtype).
+    The compiled DTW kernel is used if it has been built.
     """
-    costMat = getCostMatrix(xs, ys, costFn)
-    cumMat = getCumCostMatrix(costMat)
+    if bandWidth is not None or itakuraSlope is not None:
+        assert len(xs) > 0 and len(ys) > 0
+        window = getConstraintWindow(len(xs), len(ys), bandWidth,
+                                     itakuraSlope)
+        return dtwWindowed(xs, ys, costFn, window, costDtype=costDtype,
+                           returnArray=returnArray)
+
+    costMat = getCostMatrix(xs, ys, costFn, dtype=costDtype, threads=threads)
+    # (equivalent to dtw_fast.dtwCostMatrix, but timing each stage)
+    with instrument.stage('cumCostMatrix'):
+        if dtw_fast is None:
+            cumMat = getCumCostMatrix(costMat)
+        elif threads is None:
+            cumMat = dtw_fast.getCumCostMatrix(costMat)
+        else:
+            cumMat = dtw_fast.getCumCostMatrixWavefront(costMat, threads)
+    instrument.peak('matrixBytes', costMat.nbytes + cumMat.nbytes)
     minCost = cumMat[len(xs), len(ys)]
-    path = getBestPath(cumMat)
+    with instrument.stage('bestPath'):
+        if dtw_fast is None:
+            pathArray = np.array(getBestPath(cumMat), dtype=np.intp)
+        else:
+            pathArray = dtw_fast.getBestPath(cumMat)
+    if returnArray:
+        pathCosts = costMat[pathArray[:, 0], pathArray[:, 1]]
+        return minCost, pathArray, pathCosts
+    else:
+        path = [ (i, j) for i, j in pathArray.tolist() ]
+        return minCost, path
+
+# (number of rows of the cost matrix computed at a time by dtwFused)
+fusedBlockSize = 64
+
+def updateCumCostRow(cumPrev, costRow, cumCur, backPacked=None):
+    """Computes one row of the cumulative cost matrix from the previous row.
+
+    cumPrev and cumCur correspond to consecutive rows of the matrix returned by
+    getCumCostMatrix, and costRow to the corresponding row of the cost matrix.
+    cumCur is filled in place.
+    If backPacked is not None, it is filled in place with a back-pointer for
+    each element of the row, packed 4 to a byte, 2 bits each.
+    A back-pointer is 0 for (-1, -1), 1 for (-1, +0) and 2 for (+0, -1), and
+    ties are resolved in the same way as for getBestPath.
+    """
+    ySize = len(costRow)
+    assert len(cumPrev) == ySize + 1
+    assert len(cumCur) == ySize + 1
+
+    codes = np.zeros(4 * ((ySize + 3) // 4), dtype=np.uint8)
+    cumCur[0] = float('inf')
+    for j in range(ySize):
+        cumBest = cumPrev[j]
+        if cumPrev[j + 1] < cumBest:
+            cumBest = cumPrev[j + 1]
+            codes[j] = 1
+        if cumCur[j] < cumBest:
+            cumBest = cumCur[j]
+            codes[j] = 2
+        cumCur[j + 1] = cumBest + costRow[j]
+
+    if backPacked is not None:
+        codes = np.reshape(codes, (-1, 4))
+        backPacked[:] = (codes[:, 0] | (codes[:, 1] << 2) |
+                         (codes[:, 2] << 4) | (codes[:, 3] << 6))
+
+def getBestPathPacked(backPacked, ySize):
+    """Computes the best path from packed back-pointers.
+
+    backPacked contains one row of packed back-pointers (as computed by
+    updateCumCostRow) for each x-index.
+    Returns the path as an int array of shape (path length, 2).
+    """
+    xSize = np.shape(backPacked)[0]
+    assert xSize > 0 and ySize > 0
+    assert np.shape(backPacked)[1] == (ySize + 3) // 4
+
+    i, j = xSize - 1, ySize - 1
+    path = [(i, j)]
+    while (i, j) != (0, 0):
+        if i == 0:
+            j -= 1
+        elif j == 0:
+            i -= 1
+        else:
+            code = (backPacked[i, j // 4] >> ((j % 4) * 2)) & 3
+            if code == 0:
+                i, j = i - 1, j - 1
+            elif code == 1:
+                i -= 1
+            else:
+                j -= 1
+        path.append((i, j))
+    path.reverse()
+
+    return np.array(path, dtype=np.intp)
+
+def dtwFused(xs, ys, costFn, returnPath=True):
+    """Computes an alignment of minimum cost using memory-efficient DTW.
+
+    Computes the same minimum cost and path as dtw, but without storing the
+    full cost matrix or cumulative cost matrix.
+    Costs are computed a few rows at a time as they are needed, and only two
+    rows of the cumulative cost matrix are stored.
+    If returnPath is True then a 2-bit back-pointer is stored for each
+    element of the cumulative cost matrix (len(xs) * len(ys) / 4 bytes in
+    total), otherwise memory use is linear in len(ys).
+
+    Returns the minimum cost and a corresponding path, or None instead of the
+    path if returnPath is False.
+    """
+    assert len(xs) > 0 and len(ys) > 0
+    xSize = len(xs)
+    ySize = len(ys)
+
+    if dtw_fast is not None:
+        updateRow = dtw_fast.updateCumCostRow
+        getPath = dtw_fast.getBestPathPacked
+    else:
+        updateRow = updateCumCostRow
+        getPath = getBestPathPacked
+
+    cumPrev = np.empty((ySize + 1,))
+    cumPrev[0] = 0.0
+    cumPrev[1:] = float('inf')
+    cumCur = np.empty((ySize + 1,))
+    backPacked = (np.empty((xSize, (ySize + 3) // 4), dtype=np.uint8)
+                  if returnPath else None)
+
+    for iStart in range(0, xSize, fusedBlockSize):
+        costMatBlock = np.asarray(
+            getCostMatrix(xs[iStart:(iStart + fusedBlockSize)], ys, costFn),
+            dtype=np.float64
+        )
+        for iOffset, costRow in enumerate(costMatBlock):
+            updateRow(
+                cumPrev, costRow, cumCur,
+                None if backPacked is None else backPacked[iStart + iOffset]
+            )
+            cumPrev, cumCur = cumCur, cumPrev
+    minCost = cumPrev[ySize]
+
+    if returnPath:
+        pathArray = getPath(backPacked, ySize)
+        path = [ (i, j) for i, j in pathArray.tolist() ]
+    else:
+        path = None
+
+    return minCost, path
+
+def updateCumCostRowLabels(cumPrev, costRow, cumCur, labelsPrev, labelsCur):
+    """Computes one row of the cumulative cost matrix, propagating labels.
+
+    cumPrev, costRow and cumCur are as for updateCumCostRow.
+    labelsPrev and labelsCur have one label for each element of cumPrev and
+    cumCur, and labelsCur is filled in place with the label of the best
+    predecessor of each element, with ties resolved in the same way as for
+    getBestPath.
+    The label of each point is therefore the label of the point in the row
+    where labels were first assigned through which the best path to the point
+    passes.
+    """
+    ySize = len(costRow)
+    assert len(cumPrev) == ySize + 1
+    assert len(cumCur) == ySize + 1
+
+    cumCur[0] = float('inf')
+    labelsCur[0] = -1
+    for j in range(ySize):
+        cumBest = cumPrev[j]
+        label = labelsPrev[j]
+        if cumPrev[j + 1] < cumBest:
+            cumBest = cumPrev[j + 1]
+            label = labelsPrev[j + 1]
+        if cumCur[j] < cumBest:
+            cumBest = cumCur[j]
+            label = labelsCur[j]
+        cumCur[j + 1] = cumBest + costRow[j]
+        labelsCur[j + 1] = label
+
+# (sub-problems of dtwHirschberg with at most this many points are solved
+#   directly)
+hirschbergBaseCells = 1 << 16
+
+def getBestPathHirschberg(xs, ys, costFn, cumTop, baseCells):
+    """Computes the best path for a sub-problem using divide and conquer.
+
+    The sub-problem is a rectangle of the full problem, and cumTop gives the
+    cumulative costs of the row just above the rectangle, starting with the
+    point diagonally above and to the left of its first point (as for cumPrev
+    in updateCumCostRow).
+    The cumulative costs of the points just to the left of the rectangle are
+    taken to be infinite.
+    Provided the best path for the full problem enters the rectangle at its
+    first point, cumTop agrees with the full problem for the points on this
+    path and is no smaller elsewhere, then the part of the best path in the
+    rectangle is the path getBestPath finds for the rectangle, since every
+    choice made in tracing back the best path is the same.
+
+    Returns the path relative to the rectangle as an int array of shape
+    (path length, 2) and the array of costs of each point on the path.
+    """
+    xSize = len(xs)
+    ySize = len(ys)
+    assert len(cumTop) == ySize + 1
+    if dtw_fast is not None:
+        updateRow = dtw_fast.updateCumCostRow
+        updateRowLabels = dtw_fast.updateCumCostRowLabels
+    else:
+        updateRow = updateCumCostRow
+        updateRowLabels = updateCumCostRowLabels
+
+    if xSize == 1 or ySize == 1 or xSize * ySize <= baseCells:
+        costMat = np.asarray(getCostMatrix(xs, ys, costFn), dtype=np.float64)
+        cumMat = np.empty((xSize + 1, ySize + 1))
+        cumMat[0] = cumTop
+        for i in range(xSize):
+            updateRow(cumMat[i], costMat[i], cumMat[i + 1])
+        if dtw_fast is not None:
+            pathArray = dtw_fast.getBestPath(cumMat)
+        else:
+            pathArray = np.array(getBestPath(cumMat), dtype=np.intp)
+        return pathArray, costMat[pathArray[:, 0], pathArray[:, 1]]
+
+    # (the cumulative costs of the middle row m are stored, and each point in
+    #   later rows is labelled with the y-index at which the best path to it
+    #   enters row m + 1)
+    m = (xSize - 1) // 2
+    cumPrev = np.array(cumTop, dtype=np.float64)
+    cumCur = np.empty((ySize + 1,))
+    labelsPrev = np.empty((ySize + 1,), dtype=np.intp)
+    labelsCur = np.empty((ySize + 1,), dtype=np.intp)
+    backPacked = np.empty(((ySize + 3) // 4,), dtype=np.uint8)
+    for iStart in range(0, xSize, fusedBlockSize):
+        costMatBlock = np.asarray(
+            getCostMatrix(xs[iStart:(iStart + fusedBlockSize)], ys, costFn),
+            dtype=np.float64
+        )
+        for iOffset, costRow in enumerate(costMatBlock):
+            i = iStart + iOffset
+            if i <= m:
+                updateRow(cumPrev, costRow, cumCur)
+            elif i == m + 1:
+                cumMiddle = cumPrev.copy()
+                updateRow(cumPrev, costRow, cumCur, backPacked)
+                codes = np.ravel(
+                    (backPacked[:, np.newaxis] >> np.array([0, 2, 4, 6])) & 3
+                )[:ySize]
+                # (a point is entered from row m unless its best predecessor
+                #   is to its left)
+                labelsCur[0] = -1
+                labelsCur[1:] = np.maximum.accumulate(
+                    np.where(codes != 2, np.arange(ySize), 0)
+                )
+            else:
+                updateRowLabels(cumPrev, costRow, cumCur, labelsPrev,
+                                labelsCur)
+            cumPrev, cumCur = cumCur, cumPrev
+            labelsPrev, labelsCur = labelsCur, labelsPrev
+
+    # (the best path enters row m + 1 at (m + 1, jNext) from (m, j))
+    jNext = labelsPrev[ySize]
+    j = jNext if cumMiddle[jNext + 1] < cumMiddle[jNext] else jNext - 1
+
+    pathBefore, pathCostsBefore = getBestPathHirschberg(
+        xs[:(m + 1)], ys[:(j + 1)], costFn, cumTop[:(j + 2)], baseCells
+    )
+    pathAfter, pathCostsAfter = getBestPathHirschberg(
+        xs[(m + 1):], ys[jNext:], costFn, cumMiddle[jNext:].copy(), baseCells
+    )
+    pathArray = np.concatenate([pathBefore, pathAfter + [m + 1, jNext]])
+    pathCosts = np.concatenate([pathCostsBefore, pathCostsAfter])
+    return pathArray, pathCosts
+
+def dtwHirschberg(xs, ys, costFn, baseCells=None):
+    """Computes an alignment of minimum cost using little memory.
+
+    Computes the same path as dtw (including which path is returned when
+    there is more than one optimal path) and the same minimum cost up to
+    rounding, but without storing the full cost matrix or cumulative cost
+    matrix.
+    Instead Hirschberg's divide and conquer approach is used.
+    A forward pass computes the cumulative costs for the middle row and
+    propagates to each later point the y-index at which the best path to it
+    crosses from the middle row to the next, storing only a few rows at a
+    time.
+    The crossing for the last point splits the best path into two halves,
+    each of which lies in a rectangle of the matrix which is solved
+    recursively, and rectangles with at most baseCells points
+    (hirschbergBaseCells if None) are solved directly.
+    Memory use is linear in len(xs) and len(ys) for paths close to the
+    diagonal (plus that used for baseCells points), and the time taken is
+    roughly twice that of dtw.
+
+    Returns the minimum cost and a corresponding path.
+    """
+    assert len(xs) > 0 and len(ys) > 0
+    if baseCells is None:
+        baseCells = hirschbergBaseCells
+
+    cumTop = np.empty((len(ys) + 1,))
+    cumTop[0] = 0.0
+    cumTop[1:] = float('inf')
+    pathArray, pathCosts = getBestPathHirschberg(xs, ys, costFn, cumTop,
+                                                 baseCells)
+    # (summing in order along the path gives the cumulative cost)
+    minCost = np.cumsum(pathCosts)[-1]
+    path = [ (i, j) for i, j in pathArray.tolist() ]
     return minCost, path
 
+def repairWindow(jStarts, jEnds, ySize):
+    """Minimally enlarges a window so that it contains a valid path.
+
+    A window specifies, for each x-index i, the range of y-indices
+    jStarts[i] <= j < jEnds[i] which a path may visit.
+    The returned window contains (0, 0) and the last point, has non-empty
+    monotone ranges, and allows a contiguous path from one row to the next.
+    """
+    jStarts = np.clip(np.asarray(jStarts, dtype=np.intp), 0, ySize - 1)
+    jEnds = np.clip(np.asarray(jEnds, dtype=np.intp), 1, ySize)
+    jStarts[0] = 0
+    jEnds[-1] = ySize
+    jStarts = np.minimum.accumulate(jStarts[::-1])[::-1]
+    jEnds = np.maximum(jEnds, jStarts + 1)
+    jEnds[:-1] = np.maximum(jEnds[:-1], jStarts[1:])
+    jEnds = np.maximum.accumulate(jEnds)
+    return jStarts, jEnds
+
+def getSakoeChibaWindow(xSize, ySize, bandWidth):
+    """Returns a window containing points within bandWidth of the diagonal.
+
+    The diagonal is the straight line from (0, 0) to (xSize - 1, ySize - 1),
+    and distance is measured along the y-axis in frames.
+    """
+    assert xSize > 0 and ySize > 0
+    assert bandWidth >= 0
+    slope = (ySize - 1.0) / (xSize - 1.0) if xSize > 1 else 0.0
+    centres = np.arange(xSize) * slope
+    jStarts = np.ceil(centres - bandWidth - 1e-9).astype(np.intp)
+    jEnds = np.floor(centres + bandWidth + 1e-9).astype(np.intp) + 1
+    return repairWindow(jStarts, jEnds, ySize)
+
+def getItakuraWindow(xSize, ySize, maxSlope):
+    """Returns an Itakura parallelogram window.
+
+    The window contains the points (i, j) such that both (i, j) and
+    (xSize - 1 - i, ySize - 1 - j) lie between the lines through the origin
+    with slopes 1 / maxSlope and maxSlope.
+    """
+    assert xSize > 0 and ySize > 0
+    assert maxSlope >= 1.0
+    iRev = xSize - 1 - np.arange(xSize)
+    i = np.arange(xSize)
+    jStarts = np.ceil(np.maximum(
+        i / maxSlope,
+        ySize - 1 - iRev * maxSlope
+    ) - 1e-9).astype(np.intp)
+    jEnds = np.floor(np.minimum(
+        i * maxSlope,
+        ySize - 1 - iRev / maxSlope
+    ) + 1e-9).astype(np.intp) + 1
+    return repairWindow(jStarts, jEnds, ySize)
+
+def getConstraintWindow(xSize, ySize, bandWidth=None, itakuraSlope=None):
+    """Returns a window implementing the specified global path constraints.
+
+    If both bandWidth and itakuraSlope are specified then the window is the
+    (repaired) intersection of the Sakoe-Chiba band and Itakura parallelogram.
+    """
+    jStarts = np.zeros((xSize,), dtype=np.intp)
+    jEnds = np.zeros((xSize,), dtype=np.intp) + ySize
+    if bandWidth is not None:
+        jStartsBand, jEndsBand = getSakoeChibaWindow(xSize, ySize, bandWidth)
+        jStarts = np.maximum(jStarts, jStartsBand)
+        jEnds = np.minimum(jEnds, jEndsBand)
+    if itakuraSlope is not None:
+        jStartsIt, jEndsIt = getItakuraWindow(xSize, ySize, itakuraSlope)
+        jStarts = np.maximum(jStarts, jStartsIt)
+        jEnds = np.minimum(jEnds, jEndsIt)
+    return repairWindow(jStarts, jEnds, ySize)
+
+def getBandedCostMatrix(xs, ys, costFn, window, dtype=np.float64):
+    """Computes the cost matrix restricted to a window in banded form.
+
+    Element (i, j - jStarts[i]) of the returned matrix is the cost of pairing
+    xs[i] with ys[j], for each j in the range specified by the window.
+    Elements outside the window are infinite.
+    The returned matrix has the given dtype.
+    """
+    assert len(xs) > 0 and len(ys) > 0
+    jStarts, jEnds = window
+    xSize = len(xs)
+    assert len(jStarts) == xSize and len(jEnds) == xSize
+    bandSize = np.max(jEnds - jStarts)
+
+    with instrument.stage('costMatrix'):
+        costBand = np.empty((xSize, bandSize), dtype=dtype)
+        costBand[:] = float('inf')
+        for iStart in range(0, xSize, fusedBlockSize):
+            fillBandedCostRows(xs, ys, costFn, window, costBand, iStart,
+                               min(iStart + fusedBlockSize, xSize))
+    instrument.count('matrixCells', int(np.sum(jEnds - jStarts)))
+
+    return costBand
+
+def fillBandedCostRows(xs, ys, costFn, window, costBand, iStart, iEnd):
+    """Computes rows iStart to iEnd of a banded cost matrix in place.
+
+    When a vectorized cost function is available, the cost matrix for the
+    rectangle bounding the window over a block of rows is computed at once.
+    Blocks are split in two until this rectangle is at most twice the size of
+    the part of the window it contains, so the number of local costs computed
+    is proportional to the area of the window even for a narrow or slanted
+    band.
+    """
+    jStarts, jEnds = window
+    if (getMatrixCostFn(costFn) is not None and isFloatMatrix(xs) and
+            isFloatMatrix(ys)):
+        blocks = [(iStart, iEnd)]
+        while blocks:
+            iLo, iHi = blocks.pop()
+            jLo, jHi = jStarts[iLo], jEnds[iHi - 1]
+            windowCells = np.sum(jEnds[iLo:iHi] - jStarts[iLo:iHi])
+            if iHi - iLo > 1 and (iHi - iLo) * (jHi - jLo) > 2 * windowCells:
+                iMid = (iLo + iHi) // 2
+                blocks.extend([(iMid, iHi), (iLo, iMid)])
+                continue
+            costMatBlock = getCostMatrix(xs[iLo:iHi], ys[jLo:jHi], costFn,
+                                         dtype=costBand.dtype)
+            for i in range(iLo, iHi):
+                jStart, jEnd = jStarts[i], jEnds[i]
+                costBand[i, :(jEnd - jStart)] = (
+                    costMatBlock[i - iLo, (jStart - jLo):(jEnd - jLo)]
+                )
+    else:
+        for i in range(iStart, iEnd):
+            jStart, jEnd = jStarts[i], jEnds[i]
+            costBand[i, :(jEnd - jStart)] = [
+                costFn(xs[i], ys[j]) for j in range(jStart, jEnd)
+            ]
+
+def getBandedCumCostMatrix(costBand, window):
+    """Computes the cumulative cost matrix in banded form.
+
+    Element (i, j - jStarts[i]) of the returned matrix is element
+    (i + 1, j + 1) of the matrix getCumCostMatrix would compute if all costs
+    outside the window were infinite.
+    """
+    jStarts, jEnds = window
+    xSize, bandSize = np.shape(costBand)
+
+    def getCum(i, j):
+        if i < 0:
+            return 0.0 if j < 0 else float('inf')
+        if jStarts[i] <= j < jEnds[i]:
+            return cumBand[i, j - jStarts[i]]
+        else:
+            return float('inf')
+
+    cumBand = np.empty((xSize, bandSize))
+    cumBand[:] = float('inf')
+    for i in range(xSize):
+        for j in range(jStarts[i], jEnds[i]):
+            cumBand[i, j - jStarts[i]] = min(
+                getCum(i - 1, j - 1),
+                getCum(i - 1, j),
+                getCum(i, j - 1)
+            ) + costBand[i, j - jStarts[i]]
+
+    return cumBand
+
+def updateBandedCumCostMatrix(costBand, cumBand, window, iStart, iEnd,
+                              rowBoundsAfter, colBoundsAfter, maxCost):
+    """Computes rows iStart to iEnd of a banded cumulative cost matrix.
+
+    Rows of cumBand before iStart should already have been computed, and rows
+    iStart to iEnd are computed in place as for getBandedCumCostMatrix.
+    The cost of the remainder of any path through (i, j) is assumed to be at
+    least the larger of rowBoundsAfter[i] and colBoundsAfter[j].
+    After each row, if the cumulative cost plus this bound exceeds maxCost for
+    every point in the row then the computation is abandoned.
+
+    Returns True if the computation was abandoned.
+    """
+    jStarts, jEnds = window
+
+    def getCum(i, j):
+        if i < 0:
+            return 0.0 if j < 0 else float('inf')
+        if jStarts[i] <= j < jEnds[i]:
+            return cumBand[i, j - jStarts[i]]
+        else:
+            return float('inf')
+
+    for i in range(iStart, iEnd):
+        for j in range(jStarts[i], jEnds[i]):
+            cumBand[i, j - jStarts[i]] = min(
+                getCum(i - 1, j - 1),
+                getCum(i - 1, j),
+                getCum(i, j - 1)
+            ) + costBand[i, j - jStarts[i]]
+        boundsAfter = np.maximum(rowBoundsAfter[i],
+                                 colBoundsAfter[jStarts[i]:jEnds[i]])
+        rowMin = np.min(cumBand[i, :(jEnds[i] - jStarts[i])] + boundsAfter)
+        if rowMin > maxCost:
+            return True
+
+    return False
+
+def getBandedBestPath(cumBand, window):
+    """Computes the best path given a banded cumulative cost matrix.
+
+    Ties are resolved in the same way as for getBestPath.
+    """
+    jStarts, jEnds = window
+    xSize = np.shape(cumBand)[0]
+    ySize = jEnds[-1]
+    assert xSize > 0 and ySize > 0
+
+    def getCum(i, j):
+        if jStarts[i] <= j < jEnds[i]:
+            return cumBand[i, j - jStarts[i]]
+        else:
+            return float('inf')
+
+    i, j = xSize - 1, ySize - 1
+    path = [(i, j)]
+    while (i, j) != (0, 0):
+        if i == 0:
+            j -= 1
+        elif j == 0:
+            i -= 1
+        else:
+            _, (i, j) = min(
+                (getCum(i - 1, j - 1), (i - 1, j - 1)),
+                (getCum(i - 1, j), (i - 1, j)),
+                (getCum(i, j - 1), (i, j - 1))
+            )
+        path.append((i, j))
+    path.reverse()
+
+    return path
+
+def dtwWindowed(xs, ys, costFn, window, costDtype=np.float64,
+                returnArray=False):
+    """Computes an alignment of minimum cost among paths inside a window.
+
+    Only points inside the window are visited by the returned path, and costs
+    are only computed for points inside the window.
+    Time and memory are proportional to the number of points in the window.
+    The banded cost matrix is stored with dtype costDtype.
+
+    Returns the minimum cost and a corresponding path, or if returnArray is
+    True the minimum cost, path array and path costs as for dtw.
+    """
+    jStarts, jEnds = window
+    costBand = getBandedCostMatrix(xs, ys, costFn, window, dtype=costDtype)
+    with instrument.stage('cumCostMatrix'):
+        if dtw_fast is not None:
+            cumBand = dtw_fast.getBandedCumCostMatrix(costBand, jStarts, jEnds)
+        else:
+            cumBand = getBandedCumCostMatrix(costBand, window)
+    instrument.peak('matrixBytes', costBand.nbytes + cumBand.nbytes)
+    with instrument.stage('bestPath'):
+        if dtw_fast is not None:
+            pathArray = dtw_fast.getBandedBestPath(cumBand, jStarts, jEnds)
+        else:
+            pathArray = np.array(getBandedBestPath(cumBand, window),
+                                 dtype=np.intp)
+    iLast, jLast = pathArray[-1]
+    minCost = cumBand[iLast, jLast - jStarts[iLast]]
+    if returnArray:
+        pathBand = pathArray[:, 1] - jStarts[pathArray[:, 0]]
+        pathCosts = costBand[pathArray[:, 0], pathBand]
+        return minCost, pathArray, pathCosts
+    else:
+        path = [ (i, j) for i, j in pathArray.tolist() ]
+        return minCost, path
+
+def coarsen(xs):
+    """Halves the length of a sequence by averaging adjacent pairs of frames.
+
+    If the sequence has odd length then the last frame is kept as it is.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    xsCoarse = (xs[0:(len(xs) - 1):2] + xs[1::2]) * 0.5
+    if len(xs) % 2 == 1:
+        xsCoarse = np.concatenate([xsCoarse, xs[-1:]])
+    return xsCoarse
+
+def getProjectedPathWindow(pathCoarse, xSize, ySize, radius):
+    """Returns the window around a coarse path projected to a finer level.
+
+    Each point on pathCoarse corresponds to a 2 x 2 block of points at the
+    finer level (see coarsen), and the window consists of these blocks
+    enlarged by radius points in each direction.
+    """
+    pathCoarse = np.asarray(pathCoarse, dtype=np.intp)
+    iFine = np.concatenate([2 * pathCoarse[:, 0], 2 * pathCoarse[:, 0] + 1])
+    jCoarse = np.concatenate([pathCoarse[:, 1], pathCoarse[:, 1]])
+    valid = iFine < xSize
+    iFine, jCoarse = iFine[valid], jCoarse[valid]
+
+    jStarts = np.zeros((xSize,), dtype=np.intp) + ySize
+    jEnds = np.zeros((xSize,), dtype=np.intp)
+    np.minimum.at(jStarts, iFine, 2 * jCoarse)
+    np.maximum.at(jEnds, iFine, 2 * jCoarse + 2)
+
+    # (jStarts and jEnds are non-decreasing since the path is monotone)
+    iIndices = np.arange(xSize)
+    jStarts = jStarts[np.maximum(iIndices - radius, 0)] - radius
+    jEnds = jEnds[np.minimum(iIndices + radius, xSize - 1)] + radius
+
+    return repairWindow(jStarts, jEnds, ySize)
+
+def fastDtw(xs, ys, costFn, radius=1):
+    """Computes an approximately optimal alignment using multi-level DTW.
+
+    This is the FastDTW algorithm: xs and ys are repeatedly coarsened by
+    averaging adjacent frames, DTW is computed exactly at the coarsest level,
+    and then at each finer level DTW is computed only within radius frames of
+    the projection of the path found at the coarser level.
+    Time and memory are approximately linear in len(xs) + len(ys) for fixed
+    radius.
+
+    The radius controls how far the result may diverge from that of dtw.
+    The returned path is always a valid path, so the returned cost is never
+    less than the exact minimum cost, and as radius increases the returned
+    cost approaches the exact minimum cost (and is equal to it once radius is
+    at least max(len(xs), len(ys))).
+
+    Returns the approximate minimum cost and a corresponding path, as for dtw.
+    """
+    assert len(xs) > 0 and len(ys) > 0
+    assert radius >= 0
+
+    minSize = radius + 2
+    if len(xs) <= minSize or len(ys) <= minSize:
+        return dtw(xs, ys, costFn)
+
+    _, pathCoarse = fastDtw(coarsen(xs), coarsen(ys), costFn, radius=radius)
+    window = getProjectedPathWindow(pathCoarse, len(xs), len(ys), radius)
+    return dtwWindowed(xs, ys, costFn, window)
+
+def dtwBatch(pairs, costFn, returnPaths=True, bandWidth=None,
+             itakuraSlope=None, pairTimes=None):
+    """Computes dtw for each of a sequence of (xs, ys) pairs.
+
+    Where possible (the compiled DTW kernel has been built, costFn is one of
+    the known metrics or an mcd.metrics.Metric based on one of them, each
+    sequence is a 2-D float array and no global constraints are specified)
+    the whole batch is computed in compiled code in a single call, with
+    scratch buffers sized for the largest pair reused across pairs.
+    This avoids most of the per-pair overhead of calling dtw repeatedly, which
+    is significant for short sequences.
+    Otherwise dtw is called for each pair.
+    If pairTimes is not None then the time taken to align each pair, in
+    seconds, is stored in it (an array with one element per pair).
+
+    Returns an array containing the minimum cost for each pair, and (if
+    returnPaths is True) a list containing a corresponding path for each pair
+    as an int array of shape (path length, 2).
+    """
+    pairs = list(pairs)
+    metric = costFn if isinstance(costFn, mt.Metric) else None
+    metricName = (getattr(costFn, '__name__', None) if metric is None
+                  else metric.baseName)
+    metricCode = (None if dtw_fast is None
+                  else dtw_fast.metricCodes.get(metricName))
+    useCompiled = (
+        bandWidth is None and itakuraSlope is None and
+        metricCode is not None and getMatrixCostFn(costFn) is not None and
+        all([ isFloatMatrix(xs) and isFloatMatrix(ys) for xs, ys in pairs ])
+    )
+
+    if not useCompiled:
+        minCosts = []
+        paths = []
+        for pairIndex, (xs, ys) in enumerate(pairs):
+            startTime = time.time()
+            minCost, path = dtw(xs, ys, costFn, bandWidth=bandWidth,
+                                itakuraSlope=itakuraSlope)
+            if pairTimes is not None:
+                pairTimes[pairIndex] = time.time() - startTime
+            minCosts.append(minCost)
+            paths.append(np.array(path, dtype=np.intp))
+        minCosts = np.array(minCosts, dtype=np.float64)
+        return (minCosts, paths) if returnPaths else minCosts
+
+    for xs, ys in pairs:
+        assert len(xs) > 0 and len(ys) > 0
+    if not pairs:
+        return (np.zeros((0,)), []) if returnPaths else np.zeros((0,))
+    if metric is not None:
+        # (the kernel computes the base distance of the transformed vectors)
+        pairs = [ (metric.transform(xs), metric.transform(ys))
+                  for xs, ys in pairs ]
+
+    xOffsets = np.cumsum([0] + [ len(xs) for xs, _ in pairs ])
+    yOffsets = np.cumsum([0] + [ len(ys) for _, ys in pairs ])
+    # (float32 sequences are passed to the kernel as they are, since it
+    #   computes costs in double precision anyway)
+    dtype = (np.float32
+             if all([ xs.dtype == np.float32 and ys.dtype == np.float32
+                      for xs, ys in pairs ])
+             else np.float64)
+    xsAll = np.ascontiguousarray(
+        np.concatenate([ xs for xs, _ in pairs ]), dtype=dtype
+    )
+    ysAll = np.ascontiguousarray(
+        np.concatenate([ ys for _, ys in pairs ]), dtype=dtype
+    )
+    instrument.count('matrixCells', int(np.sum(np.diff(xOffsets) *
+                                               np.diff(yOffsets))))
+    with instrument.stage('dtwBatch'):
+        if returnPaths:
+            minCosts, pathsAll, pathOffsets = dtw_fast.dtwBatch(
+                xsAll, xOffsets.astype(np.intp), ysAll,
+                yOffsets.astype(np.intp), metricCode, returnPaths=True,
+                pairTimes=pairTimes
+            )
+            paths = np.split(pathsAll, pathOffsets[1:-1])
+            return minCosts, paths
+        else:
+            return dtw_fast.dtwBatch(
+                xsAll, xOffsets.astype(np.intp), ysAll,
+                yOffsets.astype(np.intp), metricCode, returnPaths=False,
+                pairTimes=pairTimes
+            )
+
+# (relative amount by which a lower bound must exceed a cost before it is
+#   trusted, since tight bounds may exceed the cost slightly due to rounding)
+boundRelTol = 1e-9
+
+def getTransposedWindow(window, ySize):
+    """Returns the window for the transposed problem (swapping x and y).
+
+    For each y-index j the returned window specifies the range of x-indices i
+    such that (i, j) is inside the original window.
+    """
+    jStarts, jEnds = window
+    j = np.arange(ySize)
+    iStarts = np.searchsorted(jEnds, j, side='right')
+    iEnds = np.searchsorted(jStarts, j, side='right')
+    return iStarts.astype(np.intp), iEnds.astype(np.intp)
+
+def getEnvelope(ys, window):
+    """Returns the lower and upper envelopes of ys over a window.
+
+    Row i of the lower (upper) envelope is the elementwise minimum (maximum)
+    of ys[j] over jStarts[i] <= j < jEnds[i].
+    The compiled version (used if it has been built) takes time linear in
+    len(ys) and len(window).
+    Otherwise a sparse table of minima and maxima over ranges of length a
+    power of 2 is used, so that time is O(len(ys) log(len(ys))) whatever the
+    window size.
+    """
+    jStarts, jEnds = window
+    ys = np.asarray(ys, dtype=np.float64)
+    ySize = len(ys)
+    assert np.all(jEnds > jStarts)
+
+    if dtw_fast is not None:
+        return dtw_fast.getEnvelope(ys, jStarts, jEnds)
+
+    if np.all(jStarts == 0) and np.all(jEnds == ySize):
+        lowers = np.empty((len(jStarts), np.shape(ys)[1]))
+        lowers[:] = np.min(ys, axis=0)
+        uppers = np.empty((len(jStarts), np.shape(ys)[1]))
+        uppers[:] = np.max(ys, axis=0)
+        return lowers, uppers
+
+    # (level k of each table contains the minimum or maximum over
+    #   ys[j:(j + 2 ** k)], padded to length ySize)
+    numLevels = int(np.log2(ySize)) + 1
+    lowerTable = np.empty((numLevels,) + np.shape(ys))
+    upperTable = np.empty((numLevels,) + np.shape(ys))
+    lowerTable[0] = ys
+    upperTable[0] = ys
+    for level in range(1, numLevels):
+        width = 1 << (level - 1)
+        np.minimum(lowerTable[level - 1, :-width],
+                   lowerTable[level - 1, width:],
+                   out=lowerTable[level, :-width])
+        lowerTable[level, -width:] = float('inf')
+        np.maximum(upperTable[level - 1, :-width],
+                   upperTable[level - 1, width:],
+                   out=upperTable[level, :-width])
+        upperTable[level, -width:] = -float('inf')
+
+    levels = np.floor(np.log2(jEnds - jStarts)).astype(np.intp)
+    secondStarts = jEnds - (1 << levels)
+    lowers = np.minimum(lowerTable[levels, jStarts],
+                        lowerTable[levels, secondStarts])
+    uppers = np.maximum(upperTable[levels, jStarts],
+                        upperTable[levels, secondStarts])
+    return lowers, uppers
+
+def getLbKeoghRows(xs, ys, costFn, window):
+    """Computes LB_Keogh lower bounds for each row of the DTW problem.
+
+    Element i of the returned array is a lower bound on the cost of pairing
+    xs[i] with any ys[j] inside the window, computed as the cost of pairing
+    xs[i] with the closest point of the box bounded by the envelopes of ys.
+    Every valid path inside the window visits each x-index at least once and
+    costs are non-negative, so the sum of these bounds over any set of rows
+    is a lower bound on the cost of the part of any path in those rows.
+    This is only valid for costs which are increasing functions of the
+    Euclidean distance, so if costFn is not one of the known metrics then the
+    trivial bound of zero is returned.
+    """
+    alignedCostFn = getAlignedCostFn(costFn)
+    if alignedCostFn is None or not (isFloatMatrix(xs) and isFloatMatrix(ys)):
+        return np.zeros((len(xs),))
+    lowers, uppers = getEnvelope(ys, window)
+    return alignedCostFn(xs, np.clip(xs, lowers, uppers))
+
+def getLowerBound(xs, ys, costFn, window):
+    """Computes a lower bound on the minimum DTW cost inside a window.
+
+    The bound is the larger of the LB_Keogh bounds obtained by enveloping ys
+    around xs and by enveloping xs around ys.
+    """
+    lbForward = np.sum(getLbKeoghRows(xs, ys, costFn, window))
+    lbReverse = np.sum(getLbKeoghRows(ys, xs, costFn,
+                                      getTransposedWindow(window, len(ys))))
+    return max(lbForward, lbReverse)
+
+def getBoundsAfter(lowerBounds):
+    """Returns the sums of lowerBounds[(i + 1):] for each i."""
+    return np.concatenate([np.cumsum(lowerBounds[::-1])[::-1][1:], [0.0]])
+
+def dtwBounded(xs, ys, costFn, maxCost, window=None, rowLowerBounds=None,
+               colLowerBounds=None):
+    """Computes the minimum DTW cost, abandoning early if it exceeds maxCost.
+
+    The banded cost and cumulative cost matrices for window (all points if
+    window is None) are computed a block of rows at a time.
+    rowLowerBounds (colLowerBounds) gives a lower bound on the cost of the
+    part of any path in each row (column), for example as computed by
+    getLbKeoghRows.
+    Any path through point (i, j) must still visit every later row and every
+    later column, so the cumulative cost at (i, j) plus the larger of the sum
+    of the bounds for the rows after i and the sum of the bounds for the
+    columns after j is a lower bound on the final cost of such a path.
+    After each row, if this bound exceeds maxCost for every point in the row
+    then the computation is abandoned, saving the computation of the
+    remaining costs.
+
+    Returns the minimum cost (exactly as dtwWindowed would compute it) if it
+    is at most maxCost, and otherwise either the minimum cost or infinity.
+    """
+    assert len(xs) > 0 and len(ys) > 0
+    xSize = len(xs)
+    ySize = len(ys)
+    if window is None:
+        window = getConstraintWindow(xSize, ySize)
+    jStarts, jEnds = window
+    assert len(jStarts) == xSize and len(jEnds) == xSize
+    if rowLowerBounds is None:
+        rowBoundsAfter = np.zeros((xSize,))
+    else:
+        assert len(rowLowerBounds) == xSize
+        rowBoundsAfter = getBoundsAfter(rowLowerBounds)
+    if colLowerBounds is None:
+        colBoundsAfter = np.zeros((ySize,))
+    else:
+        assert len(colLowerBounds) == ySize
+        colBoundsAfter = getBoundsAfter(colLowerBounds)
+    # (allow for rounding error in tight bounds)
+    maxCost = maxCost * (1.0 + boundRelTol)
+
+    bandSize = np.max(jEnds - jStarts)
+    costBand = np.empty((xSize, bandSize))
+    costBand[:] = float('inf')
+    cumBand = np.empty((xSize, bandSize))
+    cumBand[:] = float('inf')
+    for iStart in range(0, xSize, fusedBlockSize):
+        iEnd = min(iStart + fusedBlockSize, xSize)
+        fillBandedCostRows(xs, ys, costFn, window, costBand, iStart, iEnd)
+        if dtw_fast is not None:
+            abandoned = dtw_fast.updateBandedCumCostMatrix(
+                costBand, cumBand, jStarts, jEnds, iStart, iEnd,
+                rowBoundsAfter, colBoundsAfter, maxCost
+            )
+        else:
+            abandoned = updateBandedCumCostMatrix(
+                costBand, cumBand, window, iStart, iEnd, rowBoundsAfter,
+                colBoundsAfter, maxCost
+            )
+        if abandoned:
+            return float('inf')
+
+    return cumBand[xSize - 1, ySize - 1 - jStarts[xSize - 1]]
+
+def dtwSearch(xs, candidates, costFn, k=1, bandWidth=None, itakuraSlope=None,
+              stats=None):
+    """Finds the k candidates closest to xs in terms of minimum DTW cost.
+
+    The DTW cost of each candidate is the minimum cost dtw would compute with
+    the given constraints (up to rounding error), but typically most
+    candidates are never aligned in full.
+    A cheap lower bound (see getLowerBound) is computed for each candidate,
+    and candidates are considered in order of increasing lower bound.
+    Once k candidates have been aligned, any candidate whose lower bound
+    exceeds the k-th best cost so far is skipped without being aligned, and
+    any alignment whose partial cost exceeds it is abandoned (see
+    dtwBounded).
+    Lower bounds are tighter, and so more candidates are skipped, when a band
+    constraint is used.
+
+    If stats is not None then it should be a dict, and the number of
+    candidates skipped, abandoned and aligned in full are stored in it with
+    keys 'pruned', 'abandoned' and 'completed'.
+
+    Returns a list of (candidate index, minimum cost) for the k best
+    candidates (or all candidates if there are fewer than k) in order of
+    increasing cost, with ties broken by candidate index.
+    """
+    assert k >= 1
+    assert len(xs) > 0
+    candidates = list(candidates)
+    if stats is None:
+        stats = dict()
+    stats.update(pruned=0, abandoned=0, completed=0)
+
+    windows = []
+    rowLowerBoundsAll = []
+    colLowerBoundsAll = []
+    lowerBounds = []
+    for ys in candidates:
+        window = getConstraintWindow(len(xs), len(ys), bandWidth,
+                                     itakuraSlope)
+        rowLowerBounds = getLbKeoghRows(xs, ys, costFn, window)
+        colLowerBounds = getLbKeoghRows(ys, xs, costFn,
+                                        getTransposedWindow(window, len(ys)))
+        windows.append(window)
+        rowLowerBoundsAll.append(rowLowerBounds)
+        colLowerBoundsAll.append(colLowerBounds)
+        lowerBounds.append(max(np.sum(rowLowerBounds),
+                               np.sum(colLowerBounds)))
+
+    order = sorted(range(len(candidates)),
+                   key=lambda index: (lowerBounds[index], index))
+    best = []
+    for pos, index in enumerate(order):
+        maxCost = best[-1][0] if len(best) == k else float('inf')
+        if lowerBounds[index] > maxCost * (1.0 + boundRelTol):
+            # (all remaining candidates have at least this lower bound)
+            stats['pruned'] += len(order) - pos
+            break
+
+        minCost = dtwBounded(xs, candidates[index], costFn, maxCost,
+                             windows[index], rowLowerBoundsAll[index],
+                             colLowerBoundsAll[index])
+        if minCost == float('inf'):
+            stats['abandoned'] += 1
+            continue
+        stats['completed'] += 1
+
+        # (a cost which turns out to be worse than the k-th best is dropped)
+        bisect.insort(best, (minCost, index))
+        del best[k:]
+
+    return [ (index, minCost) for minCost, index in best ]
+
+class OnlineDtw(object):
+    """Computes dynamic time warping incrementally as frames arrive.
+
+    The frames xs of one sequence arrive one at a time and are aligned to a
+    fixed reference sequence ys which is known in advance, for example
+    synthesized frames being aligned to natural frames while synthesis is
+    still running.
+    The x-indices and y-indices of paths are as for dtw(xs, ys, costFn).
+
+    For each new frame, costs and cumulative costs are only computed for a
+    window of windowSize consecutive y-indices (all of ys if windowSize is
+    None).
+    The window for a new frame is centered on the best point of the previous
+    frame, where points are compared by their cumulative cost normalized by
+    i + j + 2 to avoid favouring short paths.
+    The window never moves backwards and never starts after the end of the
+    previous window, so it always overlaps or immediately follows the
+    previous window and contains a valid path, and time per frame is
+    proportional to windowSize.
+    If windowSize is None then the results are exactly those of dtw applied
+    to the frames received so far.
+
+    The cumulative costs for only the most recent historySize to
+    2 * historySize frames are kept.
+    When older frames are discarded, the part of the best path visiting them
+    is fixed, and later paths are joined on to this fixed part.
+    The path returned by getPath may then be slightly worse than the best
+    path, though costs returned are still those of the best path.
+    The fixed part of the path grows with the length of the stream, so for
+    long streams it should be handed back periodically using popFixedPath to
+    keep memory use bounded.
+    """
+    def __init__(self, ys, costFn, windowSize=None, historySize=1000):
+        assert len(ys) > 0
+        assert windowSize is None or windowSize >= 1
+        assert historySize >= 1
+        self.ys = ys
+        self.costFn = costFn
+        self.ySize = len(ys)
+        self.windowSize = (self.ySize if windowSize is None
+                           else min(windowSize, self.ySize))
+        self.historySize = historySize
+
+        # (row r of the history corresponds to x-index iBase + r)
+        capacity = 2 * historySize
+        self.costHist = np.empty((capacity, self.windowSize))
+        self.cumHist = np.empty((capacity, self.windowSize))
+        self.jStarts = np.zeros((capacity,), dtype=np.intp)
+        self.jEnds = np.zeros((capacity,), dtype=np.intp)
+        self.iBase = 0
+        self.numRows = 0
+        self.pathFixed = []
+        # (the number of points at the start of pathFixed which have already
+        #   been returned by popFixedPath, which is at most one since only
+        #   the last point is kept to join later paths on to)
+        self.numPathFixedPopped = 0
+        self.rowBoundsAfter = np.zeros((2,))
+        self.colBoundsAfter = np.zeros((self.ySize,))
+
+    @property
+    def numFrames(self):
+        """The number of frames received so far."""
+        return self.iBase + self.numRows
+
+    def getBestPoint(self, row):
+        jStart, jEnd = self.jStarts[row], self.jEnds[row]
+        i = self.iBase + row
+        cums = self.cumHist[row, :(jEnd - jStart)]
+        js = np.arange(jStart, jEnd)
+        return jStart + np.argmin(cums / (i + js + 2))
+
+    def addFrame(self, x):
+        """Adds the next frame of xs."""
+        if self.numRows == len(self.jStarts):
+            self.discardHistory()
+
+        row = self.numRows
+        if row == 0 and self.iBase == 0:
+            jStart = 0
+        else:
+            jStartPrev, jEndPrev = self.jStarts[row - 1], self.jEnds[row - 1]
+            jCenter = self.getBestPoint(row - 1)
+            jStart = max(jStartPrev,
+                         min(jCenter - self.windowSize // 2,
+                             self.ySize - self.windowSize, jEndPrev))
+        jEnd = min(jStart + self.windowSize, self.ySize)
+        self.jStarts[row] = jStart
+        self.jEnds[row] = jEnd
+
+        xs = x[np.newaxis] if isinstance(x, np.ndarray) else [x]
+        self.costHist[row, :(jEnd - jStart)] = getCostMatrix(
+            xs, self.ys[jStart:jEnd], self.costFn
+        )[0]
+
+        # (only the previous row is needed to compute the new row)
+        rowStart = max(row - 1, 0)
+        costBand = self.costHist[rowStart:(row + 1)]
+        cumBand = self.cumHist[rowStart:(row + 1)]
+        jStarts = self.jStarts[rowStart:(row + 1)]
+        jEnds = self.jEnds[rowStart:(row + 1)]
+        iStart = row - rowStart
+        rowBoundsAfter = self.rowBoundsAfter[:(row + 1 - rowStart)]
+        if dtw_fast is not None:
+            dtw_fast.updateBandedCumCostMatrix(
+                costBand, cumBand, jStarts, jEnds, iStart, iStart + 1,
+                rowBoundsAfter, self.colBoundsAfter, float('inf')
+            )
+        else:
+            updateBandedCumCostMatrix(
+                costBand, cumBand, (jStarts, jEnds), iStart, iStart + 1,
+                rowBoundsAfter, self.colBoundsAfter, float('inf')
+            )
+        self.numRows += 1
+
+    def addFrames(self, xs):
+        """Adds several frames of xs in order."""
+        for x in xs:
+            self.addFrame(x)
+
+    def getCum(self, row, j):
+        if self.jStarts[row] <= j < self.jEnds[row]:
+            return self.cumHist[row, j - self.jStarts[row]]
+        else:
+            return float('inf')
+
+    def tracePath(self, row, j):
+        """Traces the best path back from a point to the oldest kept frame.
+
+        Ties are resolved in the same way as for getBestPath.
+        """
+        i = self.iBase + row
+        path = [(i, j)]
+        while (i, j) != (0, 0):
+            if i == 0:
+                j -= 1
+            elif row == 0:
+                # (earlier frames have been discarded)
+                break
+            elif j == 0:
+                row -= 1
+            else:
+                _, (row, j) = min(
+                    (self.getCum(row - 1, j - 1), (row - 1, j - 1)),
+                    (self.getCum(row - 1, j), (row - 1, j)),
+                    (self.getCum(row, j - 1), (row, j - 1))
+                )
+            i = self.iBase + row
+            path.append((i, j))
+        path.reverse()
+        return path
+
+    def discardHistory(self):
+        """Discards the cumulative costs for all but historySize frames."""
+        numDiscard = self.numRows - self.historySize
+        row = self.numRows - 1
+        path = self.tracePath(row, self.getBestPoint(row))
+        iKeep = self.iBase + numDiscard
+        self.pathFixed = joinPath(self.pathFixed,
+                                  [ (i, j) for i, j in path if i < iKeep ])
+
+        for hist in [self.costHist, self.cumHist, self.jStarts, self.jEnds]:
+            hist[:self.historySize] = hist[numDiscard:self.numRows].copy()
+        self.iBase = iKeep
+        self.numRows = self.historySize
+
+    def getCost(self):
+        """Returns the cost and y-index of the current best partial path.
+
+        The best partial path aligns all the frames received so far to the
+        first j + 1 frames of ys, for the y-index j in the current window
+        which is best in the sense used to position the window.
+        """
+        assert self.numRows > 0
+        row = self.numRows - 1
+        j = self.getBestPoint(row)
+        return self.getCum(row, j), j
+
+    def getMeanCost(self):
+        """Returns the cost of the current best partial path per y-frame.
+
+        If ys is the natural sequence and costFn is metrics.logSpecDbDist
+        then this is the running MCD, normalized in the same way as
+        get_mcd_dtw normalizes MCD.
+        """
+        cost, j = self.getCost()
+        return cost / (j + 1)
+
+    def getFinalCost(self):
+        """Returns the cost of the best path aligning all of ys.
+
+        This is the minimum cost dtw would compute if all frames of xs have
+        been received (and windowSize is None).
+        Returns infinity if the last frame of ys is not in the current window.
+        """
+        assert self.numRows > 0
+        return self.getCum(self.numRows - 1, self.ySize - 1)
+
+    def getPath(self, final=False):
+        """Returns the current best path.
+
+        The path ends at the best point as for getCost, or at the last frame
+        of ys if final is True.
+        If the fixed part of the path for discarded frames already visits
+        later frames of ys than this, the path instead ends at the last
+        y-index of the fixed part.
+        """
+        assert self.numRows > 0
+        row = self.numRows - 1
+        j = self.ySize - 1 if final else self.getBestPoint(row)
+        if final:
+            assert self.getFinalCost() < float('inf')
+        path = joinPath(self.pathFixed, self.tracePath(row, j))
+        return path[self.numPathFixedPopped:]
+
+    def popFixedPath(self):
+        """Returns the fixed part of the path not already returned.
+
+        The returned points are then forgotten, and are omitted from the
+        paths returned by getPath, so that concatenating the results of each
+        call to popFixedPath and a final call to getPath gives the whole
+        path.
+        """
+        path = self.pathFixed[self.numPathFixedPopped:]
+        if self.pathFixed:
+            self.pathFixed = self.pathFixed[-1:]
+            self.numPathFixedPopped = 1
+        return path
+
+def joinPath(pathBefore, pathAfter):
+    """Joins two partial paths into a valid path.
+
+    pathAfter should start at the x-index after the last x-index of
+    pathBefore.
+    Where the two paths do not meet, pathAfter is clipped or pathBefore is
+    extended along its last x-index as necessary.
+    """
+    if not pathBefore:
+        return list(pathAfter)
+    iLast, jLast = pathBefore[-1]
+    path = list(pathBefore)
+    if pathAfter:
+        i, j = pathAfter[0]
+        assert i == iLast + 1
+        path.extend([ (iLast, jFill) for jFill in range(jLast + 1, j) ])
+    for i, j in pathAfter:
+        j = max(j, jLast)
+        if (i, j) != path[-1]:
+            path.append((i, j))
+    return path
+
 def isValidPath(path):
     if not path:
         return False
@@ -131,6 +1449,174 @@ def projectPathBestCost(path, pathCosts):
     yIndexSeq = [ j for _, j in costedYIndexSeq ]
     return yIndexSeq
 
+def getPathGroupStarts(pathArray):
+    """Returns the position in pathArray of the first point for each x-index.
+
+    pathArray should be a valid path as an int array of shape
+    (path length, 2).
+    """
+    xIndices = pathArray[:, 0]
+    assert len(xIndices) > 0 and xIndices[0] == 0
+    isStart = np.empty((len(xIndices),), dtype=bool)
+    isStart[0] = True
+    isStart[1:] = xIndices[1:] != xIndices[:-1]
+    groupStarts = np.flatnonzero(isStart)
+    assert np.all(xIndices[groupStarts] == np.arange(len(groupStarts)))
+    return groupStarts
+
+def projectPathMinIndexArray(pathArray):
+    """Projects a path array on to an array of y-indices, one per x-index.
+
+    Computes the same projection as projectPathMinIndex using vectorized
+    operations.
+    """
+    pathArray = np.asarray(pathArray)
+    groupStarts = getPathGroupStarts(pathArray)
+    return np.minimum.reduceat(pathArray[:, 1], groupStarts)
+
+def projectPathCostArray(pathArray, pathCosts):
+    """Projects the costs along a path on to an array with one per x-index.
+
+    The cost for each x-index is the sum of the costs of the points of the
+    path with that x-index, so the total of the returned costs is the total
+    cost of the path.
+    """
+    pathArray = np.asarray(pathArray)
+    pathCosts = np.asarray(pathCosts)
+    assert np.shape(pathCosts) == (len(pathArray),)
+    groupStarts = getPathGroupStarts(pathArray)
+    return np.add.reduceat(pathCosts, groupStarts)
+
+def projectPathBestCostArray(pathArray, pathCosts):
+    """Projects a path array on to an array of y-indices, one per x-index.
+
+    Computes the same projection as projectPathBestCost using vectorized
+    operations.
+    """
+    pathArray = np.asarray(pathArray)
+    pathCosts = np.asarray(pathCosts)
+    pathSize = len(pathArray)
+    assert np.shape(pathCosts) == (pathSize,)
+    groupStarts = getPathGroupStarts(pathArray)
+    groupSizes = np.diff(np.append(groupStarts, pathSize))
+
+    minCosts = np.minimum.reduceat(pathCosts, groupStarts)
+    isMin = pathCosts == np.repeat(minCosts, groupSizes)
+    # (y-indices increase within each group, so the first minimum has the
+    #   smallest y-index)
+    posBest = np.minimum.reduceat(
+        np.where(isMin, np.arange(pathSize), pathSize), groupStarts
+    )
+    return pathArray[posBest, 1]
+
+# (change in (x-index, y-index) for each step code, as for back-pointers)
+_stepDeltas = np.array([(1, 1), (1, 0), (0, 1)], dtype=np.int32)
+
+class CompactPath(object):
+    """A valid path stored as runs of identical steps.
+
+    A path is stored as an array of step codes and an array of run lengths,
+    where step code 0 is (+1, +1), 1 is (+1, +0) and 2 is (+0, +1).
+    Since the path starts at (0, 0) this determines every point on the path.
+    Paths found by DTW are mostly long diagonal runs, so this usually takes
+    far less memory than a list of (x-index, y-index) pairs or even an int
+    array of points.
+    Any path stored in this form is contiguous, monotone and starts at (0, 0),
+    and it is complete for sequences of a given length if it ends at the
+    last point given by getEnd.
+    """
+    def __init__(self, stepCodes, runLengths):
+        self.stepCodes = np.asarray(stepCodes, dtype=np.uint8)
+        self.runLengths = np.asarray(runLengths, dtype=np.int32)
+        assert np.shape(self.stepCodes) == np.shape(self.runLengths)
+        assert np.ndim(self.stepCodes) == 1
+        assert np.all(self.stepCodes < 3)
+        assert np.all(self.runLengths > 0)
+
+    @classmethod
+    def fromPath(cls, path):
+        """Creates a compact path from a list of pairs or an int array.
+
+        Raises ValueError if path is not contiguous and monotone starting at
+        (0, 0).
+        """
+        pathArray = np.reshape(np.asarray(path, dtype=np.int64), (-1, 2))
+        if len(pathArray) == 0 or np.any(pathArray[0] != 0):
+            raise ValueError('path does not start at (0, 0)')
+        deltas = np.diff(pathArray, axis=0)
+        isStep = [ np.all(deltas == delta, axis=1) for delta in _stepDeltas ]
+        if not np.all(isStep[0] | isStep[1] | isStep[2]):
+            raise ValueError('path contains an invalid step')
+        codes = np.select(isStep[1:], [1, 2], default=0).astype(np.uint8)
+
+        isRunStart = np.empty((len(codes),), dtype=bool)
+        isRunStart[:1] = True
+        isRunStart[1:] = codes[1:] != codes[:-1]
+        runStarts = np.flatnonzero(isRunStart)
+        runLengths = np.diff(np.append(runStarts, len(codes)))
+        return cls(codes[runStarts], runLengths)
+
+    def __len__(self):
+        """Returns the number of points on the path."""
+        return 1 + int(np.sum(self.runLengths, dtype=np.int64))
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactPath) and
+                np.array_equal(self.stepCodes, other.stepCodes) and
+                np.array_equal(self.runLengths, other.runLengths))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def getEnd(self):
+        """Returns the last point on the path."""
+        runLengths = self.runLengths[:, np.newaxis]
+        i, j = np.sum(_stepDeltas[self.stepCodes] * runLengths, axis=0,
+                      dtype=np.int64)
+        return int(i), int(j)
+
+    def isComplete(self, xSize, ySize):
+        """Returns True if this is a valid path for sequences of given size."""
+        return self.getEnd() == (xSize - 1, ySize - 1)
+
+    def swap(self):
+        """Returns the path with x-indices and y-indices swapped."""
+        return CompactPath(np.array([0, 2, 1], dtype=np.uint8)[self.stepCodes],
+                           self.runLengths)
+
+    def toArray(self):
+        """Returns the path as an int array of shape (path length, 2)."""
+        pathArray = np.zeros((len(self), 2), dtype=np.intp)
+        steps = np.repeat(_stepDeltas[self.stepCodes], self.runLengths, axis=0)
+        np.cumsum(steps, axis=0, out=pathArray[1:])
+        return pathArray
+
+    def toList(self):
+        """Returns the path as a list of (x-index, y-index) pairs."""
+        return [ (i, j) for i, j in self.toArray().tolist() ]
+
+    def projectMinIndex(self):
+        """Projects the path as for projectPathMinIndex, returning an array."""
+        return projectPathMinIndexArray(self.toArray())
+
+    def projectBestCost(self, pathCosts):
+        """Projects the path as for projectPathBestCost, returning an array."""
+        return projectPathBestCostArray(self.toArray(), pathCosts)
+
+    def save(self, pathFile):
+        """Saves the path to a file (a file name or a file object)."""
+        np.savez(pathFile, stepCodes=self.stepCodes,
+                 runLengths=self.runLengths)
+
+    @classmethod
+    def load(cls, pathFile):
+        """Loads a path saved using save."""
+        npzFile = np.load(pathFile)
+        try:
+            return cls(npzFile['stepCodes'], npzFile['runLengths'])
+        finally:
+            npzFile.close()
+
 def findWarpingMinIndex(xs, ys, costFn):
     """Finds a warping of ys with same length as xs using dynamic time warping.
 
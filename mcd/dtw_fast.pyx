@@ -0,0 +1,672 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+
+import numpy as np
+
+from libc.math cimport log, sqrt
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
+cimport numpy as cnp
+cimport cython
+from cython.parallel cimport prange
+
+cnp.import_array()
+cnp.import_ufunc()
+
+cdef double inf = float('inf')
+
+# (cost matrices and sequences may be float32 or float64, but cumulative costs
+#   are always accumulated in double precision)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void fillCumTile(double[:, ::1] cumMat, cython.floating[:, :] costMat,
+                      Py_ssize_t iStart, Py_ssize_t iEnd, Py_ssize_t jStart,
+                      Py_ssize_t jEnd) noexcept nogil:
+    """Computes a rectangular tile of the cumulative cost matrix in place.
+
+    Computes cumMat[i + 1, j + 1] for iStart <= i < iEnd and
+    jStart <= j < jEnd, assuming the row above and column to the left of the
+    tile have already been computed.
+    """
+    cdef Py_ssize_t i, j
+    cdef double cumPrev
+
+    for i in range(iStart, iEnd):
+        for j in range(jStart, jEnd):
+            cumPrev = cumMat[i, j]
+            if cumMat[i, j + 1] < cumPrev:
+                cumPrev = cumMat[i, j + 1]
+            if cumMat[i + 1, j] < cumPrev:
+                cumPrev = cumMat[i + 1, j]
+            cumMat[i + 1, j + 1] = cumPrev + costMat[i, j]
+
+cdef initCumCostMatrix(Py_ssize_t xSize, Py_ssize_t ySize):
+    cumMatArray = np.empty((xSize + 1, ySize + 1))
+    cumMatArray[0, 0] = 0.0
+    cumMatArray[0, 1:] = inf
+    cumMatArray[1:, 0] = inf
+    return cumMatArray
+
+def getCumCostMatrix(cython.floating[:, :] costMat):
+    """Computes the cumulative cost matrix (see dtw.getCumCostMatrix)."""
+    cdef Py_ssize_t xSize, ySize
+
+    xSize = costMat.shape[0]
+    ySize = costMat.shape[1]
+
+    cumMatArray = initCumCostMatrix(xSize, ySize)
+    cdef double[:, ::1] cumMat = cumMatArray
+    with nogil:
+        fillCumTile(cumMat, costMat, 0, xSize, 0, ySize)
+
+    return cumMatArray
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def getCumCostMatrixWavefront(cython.floating[:, :] costMat, int numThreads,
+                              Py_ssize_t tileSize=64):
+    """Computes the cumulative cost matrix using several threads.
+
+    The matrix is divided into square tiles of size tileSize.
+    A tile only depends on the tiles above it and to its left, so all the
+    tiles on an anti-diagonal of tiles may be computed in parallel once the
+    previous anti-diagonals have been computed.
+    Each element is computed using exactly the same operations as
+    getCumCostMatrix, so the result is identical to that of getCumCostMatrix
+    whatever the number of threads.
+    Parallelism requires the module to have been compiled with OpenMP;
+    otherwise the tiles are computed in turn.
+    """
+    cdef Py_ssize_t xSize, ySize, numTileRows, numTileCols, d, tiLo, tiHi
+    cdef Py_ssize_t ti, tj
+
+    assert numThreads >= 1
+    assert tileSize >= 1
+    xSize = costMat.shape[0]
+    ySize = costMat.shape[1]
+    numTileRows = (xSize + tileSize - 1) // tileSize
+    numTileCols = (ySize + tileSize - 1) // tileSize
+
+    cumMatArray = initCumCostMatrix(xSize, ySize)
+    cdef double[:, ::1] cumMat = cumMatArray
+    with nogil:
+        for d in range(numTileRows + numTileCols - 1):
+            tiLo = d - numTileCols + 1 if d >= numTileCols else 0
+            tiHi = d if d < numTileRows else numTileRows - 1
+            for ti in prange(tiLo, tiHi + 1, num_threads=numThreads,
+                             schedule='static'):
+                tj = d - ti
+                fillCumTile(cumMat, costMat, ti * tileSize,
+                            min((ti + 1) * tileSize, xSize), tj * tileSize,
+                            min((tj + 1) * tileSize, ySize))
+
+    return cumMatArray
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def getBestPath(double[:, :] cumMat):
+    """Computes the best path as an int array (see dtw.getBestPath).
+
+    Returns an array of shape (path length, 2).
+    Ties are resolved in the same way as for dtw.getBestPath.
+    """
+    cdef Py_ssize_t xSize, ySize, i, j, iNext, jNext, pos
+    cdef double cumBest
+
+    xSize = cumMat.shape[0] - 1
+    ySize = cumMat.shape[1] - 1
+    assert xSize > 0 and ySize > 0
+
+    pathArray = np.empty((xSize + ySize - 1, 2), dtype=np.intp)
+    cdef Py_ssize_t[:, ::1] path = pathArray
+
+    i, j = xSize - 1, ySize - 1
+    pos = xSize + ySize - 2
+    path[pos, 0] = i
+    path[pos, 1] = j
+    with nogil:
+        while i != 0 or j != 0:
+            if i == 0:
+                j -= 1
+            elif j == 0:
+                i -= 1
+            else:
+                # (prefer diagonal, then decreasing x-index, then decreasing
+                #   y-index, as for the tuple comparison in dtw.getBestPath)
+                cumBest = cumMat[i, j]
+                iNext, jNext = i - 1, j - 1
+                if cumMat[i, j + 1] < cumBest:
+                    cumBest = cumMat[i, j + 1]
+                    iNext, jNext = i - 1, j
+                if cumMat[i + 1, j] < cumBest:
+                    cumBest = cumMat[i + 1, j]
+                    iNext, jNext = i, j - 1
+                i, j = iNext, jNext
+            pos -= 1
+            path[pos, 0] = i
+            path[pos, 1] = j
+
+    return pathArray[pos:]
+
+def dtwCostMatrix(costMat, threads=None):
+    """Computes the minimum cost and best path given a cost matrix.
+
+    If threads is not None then the cumulative cost matrix is computed using
+    getCumCostMatrixWavefront with this many threads.
+
+    Returns the minimum cost and a corresponding path as an int array of shape
+    (path length, 2).
+    """
+    if threads is None:
+        cumMat = getCumCostMatrix(costMat)
+    else:
+        cumMat = getCumCostMatrixWavefront(costMat, threads)
+    xSize, ySize = np.shape(costMat)
+    minCost = cumMat[xSize, ySize]
+    path = getBestPath(cumMat)
+    return minCost, path
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def updateCumCostRow(double[:] cumPrev, cython.floating[:] costRow,
+                     double[:] cumCur, unsigned char[:] backPacked=None):
+    """Computes one row of the cumulative cost matrix from the previous row.
+
+    See dtw.updateCumCostRow.
+    """
+    cdef Py_ssize_t ySize, j
+    cdef double cumBest
+    cdef unsigned char code
+    cdef bint storeBack = backPacked is not None
+
+    ySize = costRow.shape[0]
+    assert cumPrev.shape[0] == ySize + 1
+    assert cumCur.shape[0] == ySize + 1
+    if storeBack:
+        assert backPacked.shape[0] == (ySize + 3) // 4
+        backPacked[:] = 0
+
+    with nogil:
+        cumCur[0] = inf
+        for j in range(ySize):
+            cumBest = cumPrev[j]
+            code = 0
+            if cumPrev[j + 1] < cumBest:
+                cumBest = cumPrev[j + 1]
+                code = 1
+            if cumCur[j] < cumBest:
+                cumBest = cumCur[j]
+                code = 2
+            cumCur[j + 1] = cumBest + costRow[j]
+            if storeBack:
+                backPacked[j >> 2] |= code << ((j & 3) * 2)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def updateCumCostRowLabels(double[:] cumPrev, cython.floating[:] costRow,
+                           double[:] cumCur, Py_ssize_t[:] labelsPrev,
+                           Py_ssize_t[:] labelsCur):
+    """Computes one row of the cumulative cost matrix, propagating labels.
+
+    See dtw.updateCumCostRowLabels.
+    """
+    cdef Py_ssize_t ySize, j, label
+    cdef double cumBest
+
+    ySize = costRow.shape[0]
+    assert cumPrev.shape[0] == ySize + 1
+    assert cumCur.shape[0] == ySize + 1
+    assert labelsPrev.shape[0] == ySize + 1
+    assert labelsCur.shape[0] == ySize + 1
+
+    with nogil:
+        cumCur[0] = inf
+        labelsCur[0] = -1
+        for j in range(ySize):
+            cumBest = cumPrev[j]
+            label = labelsPrev[j]
+            if cumPrev[j + 1] < cumBest:
+                cumBest = cumPrev[j + 1]
+                label = labelsPrev[j + 1]
+            if cumCur[j] < cumBest:
+                cumBest = cumCur[j]
+                label = labelsCur[j]
+            cumCur[j + 1] = cumBest + costRow[j]
+            labelsCur[j + 1] = label
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def getBestPathPacked(unsigned char[:, :] backPacked, Py_ssize_t ySize):
+    """Computes the best path from packed back-pointers as an int array.
+
+    See dtw.getBestPathPacked.
+    """
+    cdef Py_ssize_t xSize, i, j, pos
+    cdef unsigned char code
+
+    xSize = backPacked.shape[0]
+    assert xSize > 0 and ySize > 0
+    assert backPacked.shape[1] == (ySize + 3) // 4
+
+    pathArray = np.empty((xSize + ySize - 1, 2), dtype=np.intp)
+    cdef Py_ssize_t[:, ::1] path = pathArray
+
+    i, j = xSize - 1, ySize - 1
+    pos = xSize + ySize - 2
+    path[pos, 0] = i
+    path[pos, 1] = j
+    with nogil:
+        while i != 0 or j != 0:
+            if i == 0:
+                j -= 1
+            elif j == 0:
+                i -= 1
+            else:
+                code = (backPacked[i, j >> 2] >> ((j & 3) * 2)) & 3
+                if code == 0:
+                    i -= 1
+                    j -= 1
+                elif code == 1:
+                    i -= 1
+                else:
+                    j -= 1
+            pos -= 1
+            path[pos, 0] = i
+            path[pos, 1] = j
+
+    return pathArray[pos:]
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline double getBandedCum(double[:, ::1] cumBand, Py_ssize_t[:] jStarts,
+                                Py_ssize_t[:] jEnds, Py_ssize_t i,
+                                Py_ssize_t j) nogil:
+    if i < 0:
+        return 0.0 if j < 0 else inf
+    if jStarts[i] <= j < jEnds[i]:
+        return cumBand[i, j - jStarts[i]]
+    else:
+        return inf
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef bint fillBandedCumRows(cython.floating[:, :] costBand,
+                            double[:, ::1] cumBand, Py_ssize_t[:] jStarts,
+                            Py_ssize_t[:] jEnds, Py_ssize_t iStart,
+                            Py_ssize_t iEnd, double[:] rowBoundsAfter,
+                            double[:] colBoundsAfter,
+                            double maxCost) noexcept nogil:
+    cdef Py_ssize_t i, j
+    cdef double cumPrev, cumOther, boundAfter, rowMin
+
+    for i in range(iStart, iEnd):
+        rowMin = inf
+        for j in range(jStarts[i], jEnds[i]):
+            cumPrev = getBandedCum(cumBand, jStarts, jEnds, i - 1, j - 1)
+            cumOther = getBandedCum(cumBand, jStarts, jEnds, i - 1, j)
+            if cumOther < cumPrev:
+                cumPrev = cumOther
+            cumOther = getBandedCum(cumBand, jStarts, jEnds, i, j - 1)
+            if cumOther < cumPrev:
+                cumPrev = cumOther
+            cumPrev = cumPrev + costBand[i, j - jStarts[i]]
+            cumBand[i, j - jStarts[i]] = cumPrev
+            boundAfter = rowBoundsAfter[i]
+            if colBoundsAfter[j] > boundAfter:
+                boundAfter = colBoundsAfter[j]
+            if cumPrev + boundAfter < rowMin:
+                rowMin = cumPrev + boundAfter
+        if rowMin > maxCost:
+            return True
+
+    return False
+
+cdef checkBanded(Py_ssize_t xSize, Py_ssize_t bandSize, Py_ssize_t[:] jStarts,
+                 Py_ssize_t[:] jEnds):
+    cdef Py_ssize_t i
+
+    assert jStarts.shape[0] == xSize and jEnds.shape[0] == xSize
+    for i in range(xSize):
+        assert 0 <= jEnds[i] - jStarts[i] <= bandSize
+
+def getBandedCumCostMatrix(cython.floating[:, :] costBand,
+                           Py_ssize_t[:] jStarts, Py_ssize_t[:] jEnds):
+    """Computes the cumulative cost matrix in banded form.
+
+    See dtw.getBandedCumCostMatrix.
+    """
+    cdef Py_ssize_t xSize, bandSize
+
+    xSize = costBand.shape[0]
+    bandSize = costBand.shape[1]
+    checkBanded(xSize, bandSize, jStarts, jEnds)
+
+    cumBandArray = np.empty((xSize, bandSize))
+    cumBandArray[:] = inf
+    cdef double[:, ::1] cumBand = cumBandArray
+    cdef double[:] rowBoundsAfter = np.zeros((xSize,))
+    cdef double[:] colBoundsAfter = np.zeros((jEnds[xSize - 1]
+                                              if xSize > 0 else 0,))
+    with nogil:
+        fillBandedCumRows(costBand, cumBand, jStarts, jEnds, 0, xSize,
+                          rowBoundsAfter, colBoundsAfter, inf)
+
+    return cumBandArray
+
+def updateBandedCumCostMatrix(cython.floating[:, :] costBand,
+                              double[:, ::1] cumBand, Py_ssize_t[:] jStarts,
+                              Py_ssize_t[:] jEnds, Py_ssize_t iStart,
+                              Py_ssize_t iEnd, double[:] rowBoundsAfter,
+                              double[:] colBoundsAfter, double maxCost):
+    """Computes some rows of a banded cumulative cost matrix in place.
+
+    See dtw.updateBandedCumCostMatrix.
+    """
+    cdef Py_ssize_t xSize, bandSize
+    cdef bint abandoned
+
+    xSize = costBand.shape[0]
+    bandSize = costBand.shape[1]
+    checkBanded(xSize, bandSize, jStarts, jEnds)
+    assert cumBand.shape[0] == xSize and cumBand.shape[1] == bandSize
+    assert rowBoundsAfter.shape[0] == xSize
+    assert 0 <= iStart <= iEnd <= xSize
+    if xSize > 0:
+        assert colBoundsAfter.shape[0] >= jEnds[xSize - 1]
+
+    with nogil:
+        abandoned = fillBandedCumRows(costBand, cumBand, jStarts, jEnds,
+                                      iStart, iEnd, rowBoundsAfter,
+                                      colBoundsAfter, maxCost)
+
+    return abandoned
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def getBandedBestPath(double[:, ::1] cumBand, Py_ssize_t[:] jStarts,
+                      Py_ssize_t[:] jEnds):
+    """Computes the best path as an int array given a banded cumulative cost.
+
+    See dtw.getBandedBestPath.
+    """
+    cdef Py_ssize_t xSize, ySize, i, j, iNext, jNext, pos
+    cdef double cumBest, cumOther
+
+    xSize = cumBand.shape[0]
+    assert xSize > 0
+    assert jStarts.shape[0] == xSize and jEnds.shape[0] == xSize
+    ySize = jEnds[xSize - 1]
+    assert ySize > 0
+
+    pathArray = np.empty((xSize + ySize - 1, 2), dtype=np.intp)
+    cdef Py_ssize_t[:, ::1] path = pathArray
+
+    i, j = xSize - 1, ySize - 1
+    pos = xSize + ySize - 2
+    path[pos, 0] = i
+    path[pos, 1] = j
+    with nogil:
+        while i != 0 or j != 0:
+            if i == 0:
+                j -= 1
+            elif j == 0:
+                i -= 1
+            else:
+                cumBest = getBandedCum(cumBand, jStarts, jEnds, i - 1, j - 1)
+                iNext, jNext = i - 1, j - 1
+                cumOther = getBandedCum(cumBand, jStarts, jEnds, i - 1, j)
+                if cumOther < cumBest:
+                    cumBest = cumOther
+                    iNext, jNext = i - 1, j
+                cumOther = getBandedCum(cumBand, jStarts, jEnds, i, j - 1)
+                if cumOther < cumBest:
+                    cumBest = cumOther
+                    iNext, jNext = i, j - 1
+                i, j = iNext, jNext
+            pos -= 1
+            path[pos, 0] = i
+            path[pos, 1] = j
+
+    return pathArray[pos:]
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def getEnvelope(double[:, :] ys, Py_ssize_t[:] jStarts, Py_ssize_t[:] jEnds):
+    """Returns the lower and upper envelopes of ys over a window.
+
+    See dtw.getEnvelope.
+    The window ranges must be non-empty with jStarts and jEnds
+    non-decreasing, which allows the minimum and maximum over each sliding
+    range to be computed in amortized constant time using a monotone queue of
+    candidate indices.
+    """
+    cdef Py_ssize_t xSize, ySize, dim, i, j, k, jNext
+    cdef Py_ssize_t minHead, minTail, maxHead, maxTail
+    cdef double value
+
+    xSize = jStarts.shape[0]
+    ySize = ys.shape[0]
+    dim = ys.shape[1]
+    assert jEnds.shape[0] == xSize
+    for i in range(xSize):
+        assert 0 <= jStarts[i] < jEnds[i] <= ySize
+        if i > 0:
+            assert jStarts[i] >= jStarts[i - 1] and jEnds[i] >= jEnds[i - 1]
+
+    lowersArray = np.empty((xSize, dim))
+    uppersArray = np.empty((xSize, dim))
+    cdef double[:, ::1] lowers = lowersArray
+    cdef double[:, ::1] uppers = uppersArray
+    cdef Py_ssize_t[::1] minQueue = np.empty((ySize,), dtype=np.intp)
+    cdef Py_ssize_t[::1] maxQueue = np.empty((ySize,), dtype=np.intp)
+
+    with nogil:
+        for k in range(dim):
+            minHead, minTail = 0, 0
+            maxHead, maxTail = 0, 0
+            jNext = 0
+            for i in range(xSize):
+                while jNext < jEnds[i]:
+                    value = ys[jNext, k]
+                    while (minTail > minHead and
+                           ys[minQueue[minTail - 1], k] >= value):
+                        minTail -= 1
+                    minQueue[minTail] = jNext
+                    minTail += 1
+                    while (maxTail > maxHead and
+                           ys[maxQueue[maxTail - 1], k] <= value):
+                        maxTail -= 1
+                    maxQueue[maxTail] = jNext
+                    maxTail += 1
+                    jNext += 1
+                while minQueue[minHead] < jStarts[i]:
+                    minHead += 1
+                while maxQueue[maxHead] < jStarts[i]:
+                    maxHead += 1
+                lowers[i, k] = ys[minQueue[minHead], k]
+                uppers[i, k] = ys[maxQueue[maxHead], k]
+
+    return lowersArray, uppersArray
+
+# (codes for the metrics supported by dtwBatch)
+cdef enum:
+    METRIC_SQ_CEP = 0
+    METRIC_EUC_CEP = 1
+    METRIC_LOG_SPEC_DB = 2
+
+metricCodes = {
+    'sqCepDist': METRIC_SQ_CEP,
+    'eucCepDist': METRIC_EUC_CEP,
+    'logSpecDbDist': METRIC_LOG_SPEC_DB,
+}
+
+cdef double logSpecDbConst = 10.0 / log(10.0) * sqrt(2.0)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def dtwBatch(cython.floating[:, ::1] xsAll, Py_ssize_t[::1] xOffsets,
+             cython.floating[:, ::1] ysAll, Py_ssize_t[::1] yOffsets,
+             int metricCode, bint returnPaths=True,
+             double[::1] pairTimes=None):
+    """Computes DTW for a batch of sequence pairs.
+
+    The x-sequences are stored one after another in xsAll, with sequence p
+    being xsAll[xOffsets[p]:xOffsets[p + 1]], and similarly for ysAll.
+    xsAll and ysAll should both be float32 or both be float64.
+    Costs are computed on the fly using the metric specified by metricCode
+    (see metricCodes), and the same scratch buffers, sized for the largest
+    pair, are reused for every pair in the batch.
+    If pairTimes is not None then the time taken to align each pair, in
+    seconds, is stored in it.
+
+    Returns the minimum cost for each pair, and (if returnPaths is True) the
+    concatenated paths as an int array of shape (total path length, 2) and the
+    offsets of each pair's path within it.
+    """
+    cdef Py_ssize_t numPairs, dim, p, i, j, k, xStart, yStart, xSize, ySize
+    cdef Py_ssize_t maxXSize, maxYSize, stride, cursor
+    cdef double xVal, diff, cost, cumPrev
+    cdef timespec startTime, endTime
+    cdef bint recordTimes = pairTimes is not None
+
+    numPairs = xOffsets.shape[0] - 1
+    assert yOffsets.shape[0] == numPairs + 1
+    dim = xsAll.shape[1]
+    assert ysAll.shape[1] == dim
+    assert METRIC_SQ_CEP <= metricCode <= METRIC_LOG_SPEC_DB
+    if recordTimes:
+        assert pairTimes.shape[0] == numPairs
+
+    maxXSize, maxYSize = 0, 0
+    for p in range(numPairs):
+        xSize = xOffsets[p + 1] - xOffsets[p]
+        ySize = yOffsets[p + 1] - yOffsets[p]
+        assert xSize > 0 and ySize > 0
+        maxXSize = max(maxXSize, xSize)
+        maxYSize = max(maxYSize, ySize)
+
+    cdef double[::1] cum = np.empty(((maxXSize + 1) * (maxYSize + 1),))
+    cdef double[::1] costRow = np.empty((maxYSize,))
+    cdef cython.floating[:, ::1] ysAllT = np.ascontiguousarray(
+        np.transpose(ysAll)
+    )
+    cdef Py_ssize_t[:, ::1] pathScratch = np.empty(
+        (maxXSize + maxYSize - 1, 2), dtype=np.intp
+    )
+
+    minCostsArray = np.empty((numPairs,))
+    cdef double[::1] minCosts = minCostsArray
+    pathOffsetsArray = np.zeros((numPairs + 1,), dtype=np.intp)
+    cdef Py_ssize_t[::1] pathOffsets = pathOffsetsArray
+    pathsAllArray = np.empty(
+        ((xOffsets[numPairs] + yOffsets[numPairs] - numPairs
+          if returnPaths else 0), 2),
+        dtype=np.intp
+    )
+    cdef Py_ssize_t[:, ::1] pathsAll = pathsAllArray
+
+    cursor = 0
+    with nogil:
+        for p in range(numPairs):
+            if recordTimes:
+                clock_gettime(CLOCK_MONOTONIC, &startTime)
+            xStart = xOffsets[p]
+            yStart = yOffsets[p]
+            xSize = xOffsets[p + 1] - xStart
+            ySize = yOffsets[p + 1] - yStart
+            stride = ySize + 1
+
+            # cumulative cost recurrence, computing costs on the fly
+            cum[0] = 0.0
+            for j in range(1, ySize + 1):
+                cum[j] = inf
+            for i in range(xSize):
+                # (loop over j innermost so that it can be vectorized, using
+                #   the transpose of ysAll for contiguous access)
+                for j in range(ySize):
+                    costRow[j] = 0.0
+                for k in range(dim):
+                    xVal = xsAll[xStart + i, k]
+                    for j in range(ySize):
+                        diff = xVal - <double> ysAllT[k, yStart + j]
+                        costRow[j] += diff * diff
+                if metricCode == METRIC_EUC_CEP:
+                    for j in range(ySize):
+                        costRow[j] = sqrt(costRow[j])
+                elif metricCode == METRIC_LOG_SPEC_DB:
+                    for j in range(ySize):
+                        costRow[j] = sqrt(costRow[j]) * logSpecDbConst
+
+                cum[(i + 1) * stride] = inf
+                for j in range(ySize):
+                    cost = costRow[j]
+                    cumPrev = cum[i * stride + j]
+                    if cum[i * stride + j + 1] < cumPrev:
+                        cumPrev = cum[i * stride + j + 1]
+                    if cum[(i + 1) * stride + j] < cumPrev:
+                        cumPrev = cum[(i + 1) * stride + j]
+                    cum[(i + 1) * stride + j + 1] = cumPrev + cost
+            minCosts[p] = cum[xSize * stride + ySize]
+
+            if returnPaths:
+                cursor = tracebackBatchPath(cum, stride, xSize, ySize,
+                                            pathScratch, pathsAll, cursor)
+                pathOffsets[p + 1] = cursor
+
+            if recordTimes:
+                clock_gettime(CLOCK_MONOTONIC, &endTime)
+                pairTimes[p] = (
+                    (endTime.tv_sec - startTime.tv_sec) +
+                    (endTime.tv_nsec - startTime.tv_nsec) * 1e-9
+                )
+
+    if returnPaths:
+        return minCostsArray, pathsAllArray[:cursor], pathOffsetsArray
+    else:
+        return minCostsArray
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t tracebackBatchPath(double[::1] cum, Py_ssize_t stride,
+                                   Py_ssize_t xSize, Py_ssize_t ySize,
+                                   Py_ssize_t[:, ::1] pathScratch,
+                                   Py_ssize_t[:, ::1] pathsAll,
+                                   Py_ssize_t cursor) noexcept nogil:
+    """Appends the best path for one pair of dtwBatch to pathsAll.
+
+    Returns the new end of the paths stored in pathsAll.
+    """
+    cdef Py_ssize_t i, j, k, pos, iNext, jNext
+    cdef double cumBest
+
+    # traceback (ties are resolved as for getBestPath)
+    i, j = xSize - 1, ySize - 1
+    pos = xSize + ySize - 2
+    pathScratch[pos, 0] = i
+    pathScratch[pos, 1] = j
+    while i != 0 or j != 0:
+        if i == 0:
+            j -= 1
+        elif j == 0:
+            i -= 1
+        else:
+            cumBest = cum[i * stride + j]
+            iNext, jNext = i - 1, j - 1
+            if cum[i * stride + j + 1] < cumBest:
+                cumBest = cum[i * stride + j + 1]
+                iNext, jNext = i - 1, j
+            if cum[(i + 1) * stride + j] < cumBest:
+                cumBest = cum[(i + 1) * stride + j]
+                iNext, jNext = i, j - 1
+            i, j = iNext, jNext
+        pos -= 1
+        pathScratch[pos, 0] = i
+        pathScratch[pos, 1] = j
+    for k in range(pos, xSize + ySize - 1):
+        pathsAll[cursor, 0] = pathScratch[k, 0]
+        pathsAll[cursor, 1] = pathScratch[k, 1]
+        cursor += 1
+    return cursor
@@ -0,0 +1,191 @@
+"""Opt-in timing and counting of the stages of MCD computations.
+
+Instrumentation is disabled by default, in which case timing a stage or
+updating a counter does essentially nothing.
+After calling enable, the time spent in each stage (reading files, computing
+cost matrices, computing cumulative cost matrices, finding best paths,
+projecting paths, writing files, etc) is accumulated together with counters
+such as the number of frames and matrix cells processed, and the peak values
+of quantities such as the memory used by matrices.
+Hooks may be added to be notified of each of these measurements as it is made,
+for example to forward them to an external metrics system.
+"""
+
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import time
+import json
+
+class Profile(object):
+    """Accumulated per-stage timings, counters and peak values."""
+    def __init__(self):
+        self.times = dict()
+        self.calls = dict()
+        self.counts = dict()
+        self.peaks = dict()
+
+    def addTime(self, stageName, elapsed, calls=1):
+        self.times[stageName] = self.times.get(stageName, 0.0) + elapsed
+        self.calls[stageName] = self.calls.get(stageName, 0) + calls
+
+    def addCount(self, counterName, amount):
+        self.counts[counterName] = self.counts.get(counterName, 0) + amount
+
+    def addPeak(self, peakName, value):
+        if peakName not in self.peaks or value > self.peaks[peakName]:
+            self.peaks[peakName] = value
+
+    def merge(self, profileDict):
+        """Adds the measurements in profileDict (as returned by toDict)."""
+        for stageName, elapsed in profileDict['times'].items():
+            self.addTime(stageName, elapsed, profileDict['calls'][stageName])
+        for counterName, amount in profileDict['counts'].items():
+            self.addCount(counterName, amount)
+        for peakName, value in profileDict['peaks'].items():
+            self.addPeak(peakName, value)
+
+    def toDict(self):
+        """Returns the measurements as a JSON-serializable dict."""
+        return dict(
+            times=dict(self.times),
+            calls=dict(self.calls),
+            counts=dict(self.counts),
+            peaks=dict(self.peaks),
+        )
+
+    def getReport(self):
+        """Returns a human-readable per-stage breakdown as a string."""
+        totalTime = sum(self.times.values())
+        lines = ['%-20s %8s %12s %7s' % ('stage', 'calls', 'time (s)', '%')]
+        for stageName, elapsed in sorted(self.times.items(),
+                                         key=lambda item: -item[1]):
+            lines.append('%-20s %8d %12.6f %7.2f' % (
+                stageName, self.calls[stageName], elapsed,
+                100.0 * elapsed / totalTime if totalTime > 0.0 else 0.0
+            ))
+        for counterName, amount in sorted(self.counts.items()):
+            lines.append('%-20s %s' % (counterName, amount))
+        for peakName, value in sorted(self.peaks.items()):
+            lines.append('%-20s %s (peak)' % (peakName, value))
+        return '\n'.join(lines) + '\n'
+
+    def writeJson(self, profileFile):
+        """Writes the measurements to a file as JSON."""
+        with open(profileFile, 'w') as f:
+            json.dump(self.toDict(), f, sort_keys=True, indent=2)
+            f.write('\n')
+
+_profile = None
+_hooks = []
+
+def enable():
+    """Enables instrumentation, returning a new empty Profile."""
+    global _profile
+    _profile = Profile()
+    return _profile
+
+def disable():
+    global _profile
+    _profile = None
+
+def getProfile():
+    """Returns the current Profile, or None if instrumentation is disabled."""
+    return _profile
+
+def addHook(hook):
+    """Adds a function to be notified of each measurement.
+
+    hook(kind, name, value) is called for each measurement made while
+    instrumentation is enabled, where kind is 'time', 'count' or 'peak'.
+    When utterances are processed by worker processes, hooks are called in the
+    worker process which made the measurement.
+    """
+    _hooks.append(hook)
+
+def removeHook(hook):
+    _hooks.remove(hook)
+
+def count(counterName, amount=1):
+    """Adds amount to a counter."""
+    if _profile is not None:
+        _profile.addCount(counterName, amount)
+        for hook in _hooks:
+            hook('count', counterName, amount)
+
+def peak(peakName, value):
+    """Records a value whose maximum is of interest."""
+    if _profile is not None:
+        _profile.addPeak(peakName, value)
+        for hook in _hooks:
+            hook('peak', peakName, value)
+
+class _Stage(object):
+    def __init__(self, stageName):
+        self.stageName = stageName
+
+    def __enter__(self):
+        self.startTime = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.time() - self.startTime
+        if _profile is not None:
+            _profile.addTime(self.stageName, elapsed)
+            for hook in _hooks:
+                hook('time', self.stageName, elapsed)
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_nullStage = _NullStage()
+
+def stage(stageName):
+    """Returns a context manager which times a stage.
+
+    For example:
+
+        with instrument.stage('read'):
+            vecSeq = vecSeqIo.readFile(vecSeqFile)
+    """
+    if _profile is None:
+        return _nullStage
+    else:
+        return _Stage(stageName)
+
+class Profiled(object):
+    """Wraps a function so that it also returns the measurements it made.
+
+    Calling an instance returns the pair (result, measurements), where the
+    measurements are as returned by Profile.toDict, or None if
+    instrumentation is disabled.
+    This allows measurements made in worker processes to be combined in the
+    main process using merge.
+    An instance is picklable if the wrapped function is.
+    """
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, *args):
+        global _profile
+        if _profile is None:
+            return self.fn(*args), None
+        outerProfile = _profile
+        _profile = Profile()
+        try:
+            result = self.fn(*args)
+            profileDict = _profile.toDict()
+        finally:
+            _profile = outerProfile
+        return result, profileDict
+
+def merge(profileDict):
+    """Adds measurements returned by a Profiled function to the profile."""
+    if _profile is not None and profileDict is not None:
+        _profile.merge(profileDict)
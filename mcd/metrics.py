@@ -6,6 +6,7 @@
 
 import math
 import numpy as np
+from multiprocessing.pool import ThreadPool
 
 def sqCepDist(x, y):
     diff = x - y
@@ -19,3 +20,316 @@ logSpecDbConst = 10.0 / math.log(10.0) * math.sqrt(2.0)
 def logSpecDbDist(x, y):
     diff = x - y
     return logSpecDbConst * math.sqrt(np.inner(diff, diff))
+
+# (relative size of squared distance, compared to the squared norms of the
+#   two vectors, below which the expanded form is considered inaccurate)
+expansionRelTol = 1e-4
+
+# (number of rows computed at a time when returning a lower precision matrix
+#   or using several threads)
+matrixBlockSize = 256
+
+def getSqDistMatrixDouble(xs, ys, yNormsSq):
+    xNormsSq = np.einsum('ik,ik->i', xs, xs)
+    normsSqSum = xNormsSq[:, np.newaxis] + yNormsSq[np.newaxis, :]
+    sqDistMat = normsSqSum - 2.0 * np.dot(xs, ys.T)
+
+    iRecomp, jRecomp = np.nonzero(sqDistMat <= expansionRelTol * normsSqSum)
+    if len(iRecomp) > 0:
+        diffs = xs[iRecomp] - ys[jRecomp]
+        sqDistMat[iRecomp, jRecomp] = np.einsum('lk,lk->l', diffs, diffs)
+
+    return sqDistMat
+
+def getDistMatrix(xs, ys, sqDistToDist, dtype, threads):
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    assert np.ndim(xs) == 2 and np.ndim(ys) == 2
+    if np.shape(xs)[1] != np.shape(ys)[1]:
+        raise ValueError('vector sizes differ (%s vs %s)' %
+                         (np.shape(xs)[1], np.shape(ys)[1]))
+
+    yNormsSq = np.einsum('jk,jk->j', ys, ys)
+    if threads is None and np.dtype(dtype) == np.float64:
+        return sqDistToDist(getSqDistMatrixDouble(xs, ys, yNormsSq))
+
+    distMat = np.empty((len(xs), len(ys)), dtype=dtype)
+    def computeBlock(iStart):
+        iEnd = iStart + matrixBlockSize
+        distMat[iStart:iEnd] = sqDistToDist(
+            getSqDistMatrixDouble(xs[iStart:iEnd], ys, yNormsSq)
+        )
+    iStarts = range(0, len(xs), matrixBlockSize)
+    if threads is None or threads == 1 or len(iStarts) <= 1:
+        for iStart in iStarts:
+            computeBlock(iStart)
+    else:
+        # (numpy releases the GIL for the bulk of the computation)
+        pool = ThreadPool(threads)
+        try:
+            pool.map(computeBlock, iStarts)
+        finally:
+            pool.close()
+            pool.join()
+    return distMat
+
+def sqCepDistMatrix(xs, ys, dtype=np.float64, threads=None):
+    """Computes sqCepDist for every pair of rows of xs and ys.
+
+    Uses the expansion ||x - y||^2 = ||x||^2 + ||y||^2 - 2 x.y so that the bulk
+    of the computation is a single matrix product.
+    This expansion suffers from cancellation when x and y are close relative to
+    their norms, so entries where this may have occurred are recomputed
+    directly.
+    Distances are always computed in double precision, but may be returned
+    with a different dtype (e.g. np.float32 to halve the size of the matrix),
+    in which case they are computed a block of rows at a time so that no
+    full-size double precision matrix is ever stored.
+    If threads is not None then the matrix is computed a block of rows at a
+    time using this many threads.
+    Since the blocks are the same whatever the number of threads, the result
+    does not depend on threads.
+    """
+    return getDistMatrix(xs, ys, lambda sqDistMat: sqDistMat, dtype, threads)
+
+def eucCepDistMatrix(xs, ys, dtype=np.float64, threads=None):
+    """Computes eucCepDist for every pair of rows of xs and ys."""
+    return getDistMatrix(xs, ys, np.sqrt, dtype, threads)
+
+def logSpecDbDistMatrix(xs, ys, dtype=np.float64, threads=None):
+    """Computes logSpecDbDist for every pair of rows of xs and ys."""
+    return getDistMatrix(
+        xs, ys, lambda sqDistMat: logSpecDbConst * np.sqrt(sqDistMat), dtype,
+        threads
+    )
+
+def sqCepDistAligned(xs, ys):
+    """Computes sqCepDist for each pair of corresponding rows of xs and ys."""
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    assert np.ndim(xs) == 2 and np.ndim(ys) == 2
+    if np.shape(xs) != np.shape(ys):
+        raise ValueError('shapes differ (%s vs %s)' %
+                         (np.shape(xs), np.shape(ys)))
+    diffs = xs - ys
+    return np.einsum('tk,tk->t', diffs, diffs)
+
+def eucCepDistAligned(xs, ys):
+    """Computes eucCepDist for each pair of corresponding rows of xs and ys."""
+    return np.sqrt(sqCepDistAligned(xs, ys))
+
+def logSpecDbDistAligned(xs, ys):
+    """Computes logSpecDbDist for each pair of corresponding rows of xs and ys.
+    """
+    return logSpecDbConst * np.sqrt(sqCepDistAligned(xs, ys))
+
+def getMaskedCost(costs, mask=None):
+    """Computes the total of per-frame costs.
+
+    For example the total cost of two sequences xs and ys which are already
+    aligned is getMaskedCost(logSpecDbDistAligned(xs, ys)), and cost / frames
+    is then the MCD.
+    If mask is not None then it should be a boolean array with one element per
+    frame, and only frames for which mask is True are included.
+    Returns the total cost and the number of frames included.
+    """
+    costs = np.asarray(costs)
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        assert np.shape(mask) == np.shape(costs)
+        costs = costs[mask]
+    return np.sum(costs), len(costs)
+
+# (registered base distances, each mapping a name to the pointwise,
+#   vectorized matrix and vectorized aligned versions of the distance)
+_baseMetrics = dict()
+
+def registerMetric(name, pointFn, matrixFn, alignedFn):
+    """Registers a base distance for use by Metric.
+
+    pointFn(x, y) should compute the distance between two vectors,
+    matrixFn(xs, ys, dtype, threads) should compute it for every pair of rows
+    of xs and ys (with the same arguments as sqCepDistMatrix), and
+    alignedFn(xs, ys) should compute it for each pair of corresponding rows.
+    """
+    _baseMetrics[name] = pointFn, matrixFn, alignedFn
+
+def getMetricNames():
+    return sorted(_baseMetrics.keys())
+
+registerMetric('sqCepDist', sqCepDist, sqCepDistMatrix, sqCepDistAligned)
+registerMetric('eucCepDist', eucCepDist, eucCepDistMatrix, eucCepDistAligned)
+registerMetric('logSpecDbDist', logSpecDbDist, logSpecDbDistMatrix,
+               logSpecDbDistAligned)
+
+class Metric(object):
+    """A parameterized distance between vectors.
+
+    The distance is a registered base distance (see registerMetric) computed
+    on the coefficients coeffRange[0] to coeffRange[1] - 1 of each vector
+    (with coeffRange[1] being None to use all remaining coefficients), with
+    the squared difference of each of these coefficients optionally
+    multiplied by a non-negative weight.
+    Weighting is implemented by scaling each coefficient by the square root of
+    its weight, so the vectorized versions of the base distance, and the
+    compiled DTW kernels used by dtw.dtwBatch, are used unchanged and no
+    Python function is called per pair of vectors.
+    An instance may be used as a cost function wherever one is expected.
+    Its __name__ describes the base distance and its parameters, and so is
+    suitable for use in cache settings.
+    """
+    def __init__(self, baseName, coeffRange=None, weights=None):
+        if baseName not in _baseMetrics:
+            raise ValueError('unknown metric %s (should be one of %s)' %
+                             (baseName, ', '.join(getMetricNames())))
+        self.baseName = baseName
+        self.coeffStart, self.coeffEnd = ((0, None) if coeffRange is None
+                                          else coeffRange)
+        if self.coeffStart < 0 or (self.coeffEnd is not None and
+                                   self.coeffEnd <= self.coeffStart):
+            raise ValueError('invalid coefficient range %s:%s' %
+                             (self.coeffStart, self.coeffEnd))
+        if weights is None:
+            self.weights = None
+            self.scales = None
+        else:
+            self.weights = np.array(weights, dtype=np.float64)
+            if np.ndim(self.weights) != 1 or np.any(self.weights < 0.0):
+                raise ValueError('weights should be a sequence of non-negative'
+                                 ' numbers')
+            if (self.coeffEnd is not None and
+                    len(self.weights) != self.coeffEnd - self.coeffStart):
+                raise ValueError('%s weights given for %s coefficients' %
+                                 (len(self.weights),
+                                  self.coeffEnd - self.coeffStart))
+            self.scales = np.sqrt(self.weights)
+        self.pointFn, self.matrixFn, self.alignedFn = _baseMetrics[baseName]
+
+        name = baseName
+        if coeffRange is not None:
+            name += '[%s:%s]' % (self.coeffStart,
+                                 '' if self.coeffEnd is None
+                                 else self.coeffEnd)
+        if weights is not None:
+            name += '*(%s)' % ','.join([ repr(weight)
+                                         for weight in self.weights ])
+        self.__name__ = name
+
+    def isIdentity(self):
+        """Returns True if the metric is just its base distance."""
+        return (self.coeffStart == 0 and self.coeffEnd is None and
+                self.scales is None)
+
+    def checkVecSize(self, vecSize):
+        """Raises ValueError if the metric cannot be used for vectors of the
+        given size."""
+        numCoeffs = len(range(vecSize)[self.coeffStart:self.coeffEnd])
+        if numCoeffs == 0 or (self.coeffEnd is not None and
+                              self.coeffEnd > vecSize):
+            raise ValueError('coefficient range %s:%s is invalid for vectors'
+                             ' of size %s' %
+                             (self.coeffStart,
+                              '' if self.coeffEnd is None else self.coeffEnd,
+                              vecSize))
+        if self.scales is not None and len(self.scales) != numCoeffs:
+            raise ValueError('%s weights given for %s coefficients' %
+                             (len(self.scales), numCoeffs))
+
+    def transform(self, xs):
+        """Returns the weighted coefficients of xs used by the metric.
+
+        xs may be a single vector or a 2-D array with one vector per row.
+        The base distance of the transformed vectors is the metric.
+        """
+        if self.isIdentity():
+            return xs
+        xs = np.asarray(xs)
+        self.checkVecSize(np.shape(xs)[-1])
+        xs = xs[..., self.coeffStart:self.coeffEnd]
+        if self.scales is not None:
+            xs = xs * self.scales
+        return xs
+
+    def __call__(self, x, y):
+        return self.pointFn(self.transform(np.asarray(x)),
+                            self.transform(np.asarray(y)))
+
+    def matrix(self, xs, ys, dtype=np.float64, threads=None):
+        """Computes the metric for every pair of rows of xs and ys."""
+        return self.matrixFn(self.transform(xs), self.transform(ys),
+                             dtype=dtype, threads=threads)
+
+    def aligned(self, xs, ys):
+        """Computes the metric for each pair of corresponding rows of xs and
+        ys."""
+        return self.alignedFn(self.transform(xs), self.transform(ys))
+
+    def __repr__(self):
+        return 'Metric(%s)' % self.__name__
+
+def parseCoeffRange(coeffRangeStr):
+    """Parses a coefficient range of the form START:END or START:.
+
+    For example '1:' specifies all coefficients except the 0th.
+    """
+    try:
+        startStr, endStr = coeffRangeStr.split(':')
+        coeffStart = int(startStr) if startStr else 0
+        coeffEnd = int(endStr) if endStr else None
+    except ValueError:
+        raise ValueError('invalid coefficient range %r (should be of the form'
+                         ' START:END)' % coeffRangeStr)
+    return coeffStart, coeffEnd
+
+def getMetric(name, coeffRange=None, weights=None):
+    """Returns the Metric with the given base name and parameters."""
+    return Metric(name, coeffRange=coeffRange, weights=weights)
+
+def addMetricArgs(parser):
+    """Adds the --metric, --coeffs and --weights options to an argparse parser.
+
+    The Metric they specify is returned by metricFromArgs.
+    """
+    parser.add_argument(
+        '--metric', dest='metricName', default='logSpecDbDist',
+        choices=getMetricNames(), metavar='METRIC',
+        help=(
+            'distance used to compare frames (one of %s)' %
+            ', '.join(getMetricNames())
+        )
+    )
+    parser.add_argument(
+        '--coeffs', dest='coeffRange', default='1:', metavar='START:END',
+        help=(
+            'range of coefficients to include in the distance (END may be'
+            ' omitted to include all remaining coefficients, and the default'
+            ' ignores the 0th cepstral component)'
+        )
+    )
+    parser.add_argument(
+        '--weights', dest='weights', default=None, metavar='WEIGHTLIST',
+        help=(
+            'if specified, comma-separated weights for each coefficient in'
+            ' the range given by --coeffs, multiplying the squared difference'
+            ' of that coefficient'
+        )
+    )
+
+def metricFromArgs(args, paramOrder):
+    """Returns the Metric specified by options added by addMetricArgs.
+
+    Raises ValueError if the options are invalid or the Metric is not suitable
+    for vectors of size paramOrder.
+    """
+    try:
+        weights = (None if args.weights is None
+                   else [ float(weightStr)
+                          for weightStr in args.weights.split(',') ])
+    except ValueError:
+        raise ValueError('invalid weights %r (should be a comma-separated'
+                         ' list of numbers)' % args.weights)
+    metric = getMetric(args.metricName,
+                       coeffRange=parseCoeffRange(args.coeffRange),
+                       weights=weights)
+    metric.checkVecSize(paramOrder)
+    return metric
@@ -15,54 +15,74 @@ cimport cython
 cnp.import_array()
 cnp.import_ufunc()
 
-@cython.boundscheck(False)
-def sqCepDist(cnp.ndarray[cnp.float64_t, ndim=1] x,
-              cnp.ndarray[cnp.float64_t, ndim=1] y):
-    cdef unsigned int k, size
-    cdef double diff, sumSqDiff
+# (the metrics accept float32 or float64 vectors, with both vectors required to
+#   have the same dtype, and always accumulate in double precision)
+
+# (the data is accessed directly rather than using typed buffer arguments,
+#   since acquiring buffers costs more than computing the distance for
+#   typical vector sizes, and the GIL is not released since doing so would
+#   also cost more than computing the distance)
 
-    size = x.shape[0]
-    assert y.shape[0] == size
+cdef double getSumSqDiff64(char *xData, Py_ssize_t xStride, char *yData,
+                           Py_ssize_t yStride, Py_ssize_t size):
+    cdef Py_ssize_t k
+    cdef double diff, sumSqDiff
 
     sumSqDiff = 0.0
     for k in range(size):
-        diff = x[k] - y[k]
+        diff = ((<double *> (xData + k * xStride))[0] -
+                (<double *> (yData + k * yStride))[0])
         sumSqDiff += diff * diff
 
     return sumSqDiff
 
-@cython.boundscheck(False)
-def eucCepDist(cnp.ndarray[cnp.float64_t, ndim=1] x,
-               cnp.ndarray[cnp.float64_t, ndim=1] y):
-    cdef unsigned int k, size
-    cdef double diff, sumSqDiff, dist
-
-    size = x.shape[0]
-    assert y.shape[0] == size
+cdef double getSumSqDiff32(char *xData, Py_ssize_t xStride, char *yData,
+                           Py_ssize_t yStride, Py_ssize_t size):
+    cdef Py_ssize_t k
+    cdef double diff, sumSqDiff
 
     sumSqDiff = 0.0
     for k in range(size):
-        diff = x[k] - y[k]
+        diff = (<double> (<float *> (xData + k * xStride))[0] -
+                <double> (<float *> (yData + k * yStride))[0])
         sumSqDiff += diff * diff
 
-    dist = sqrt(sumSqDiff)
+    return sumSqDiff
+
+cdef inline double getSumSqDiff(cnp.ndarray x, cnp.ndarray y) except -1.0:
+    cdef int typeNum = cnp.PyArray_TYPE(x)
+    cdef Py_ssize_t size
+
+    if cnp.PyArray_NDIM(x) != 1 or cnp.PyArray_NDIM(y) != 1:
+        raise ValueError('vectors should be 1-dimensional')
+    if (cnp.PyArray_TYPE(y) != typeNum or
+            (typeNum != cnp.NPY_FLOAT32 and typeNum != cnp.NPY_FLOAT64)):
+        raise ValueError('vectors should both be float32 or both be float64')
+    size = cnp.PyArray_DIM(x, 0)
+    assert cnp.PyArray_DIM(y, 0) == size
+
+    if typeNum == cnp.NPY_FLOAT32:
+        return getSumSqDiff32(cnp.PyArray_BYTES(x), cnp.PyArray_STRIDE(x, 0),
+                              cnp.PyArray_BYTES(y), cnp.PyArray_STRIDE(y, 0),
+                              size)
+    else:
+        return getSumSqDiff64(cnp.PyArray_BYTES(x), cnp.PyArray_STRIDE(x, 0),
+                              cnp.PyArray_BYTES(y), cnp.PyArray_STRIDE(y, 0),
+                              size)
+
+def sqCepDist(cnp.ndarray x, cnp.ndarray y):
+    return getSumSqDiff(x, y)
+
+def eucCepDist(cnp.ndarray x, cnp.ndarray y):
+    cdef double dist
+
+    dist = sqrt(getSumSqDiff(x, y))
     return dist
 
 cdef double logSpecDbConst = 10.0 / log(10.0) * sqrt(2.0)
 
-@cython.boundscheck(False)
-def logSpecDbDist(cnp.ndarray[cnp.float64_t, ndim=1] x,
-                  cnp.ndarray[cnp.float64_t, ndim=1] y):
-    cdef unsigned int k, size
-    cdef double diff, sumSqDiff, dist
-
-    size = x.shape[0]
-    assert y.shape[0] == size
-
-    sumSqDiff = 0.0
-    for k in range(size):
-        diff = x[k] - y[k]
-        sumSqDiff += diff * diff
+def logSpecDbDist(cnp.ndarray x, cnp.ndarray y):
+    cdef double dist
 
-    dist = sqrt(sumSqDiff) * logSpecDbConst
+    dist = sqrt(getSumSqDiff(x, y)) * logSpecDbConst
     return dist
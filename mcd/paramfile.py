@@ -0,0 +1,143 @@
+"""Memory-mapped reading of raw speech parameter files."""
+
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import os
+import collections
+import numpy as np
+
+from mcd import instrument
+
+class VecSeqMapIo(object):
+    """Reads and writes raw vector sequence files using memory-mapping.
+
+    This raw format is used by HTS for speech parameter files (as well as by
+    the Speech Processing Toolkit (SPTK) for lots of purposes).
+    This class is a drop-in replacement for htk_io.vecseq.VecSeqIo, except
+    that readFile returns a read-only view of the file contents in their
+    on-disk dtype rather than a 64-bit copy.
+    No data is read until it is accessed, and slicing the returned array (for
+    example to drop the 0th cepstral component) does not copy any data.
+    The distance and DTW functions in mcd accept such arrays directly,
+    converting to 64-bit floats internally.
+    """
+    def __init__(self, vecSize, dtypeFile=np.float32):
+        self.vecSize = vecSize
+        self.dtypeFile = dtypeFile
+
+    def readFile(self, vecSeqFile):
+        """Returns a read-only array of shape (number of frames, vecSize)."""
+        dtype = np.dtype(self.dtypeFile)
+        frameBytes = self.vecSize * dtype.itemsize
+        fileBytes = os.path.getsize(vecSeqFile)
+        if fileBytes % frameBytes != 0:
+            raise ValueError('size of %s (%s bytes) is not a multiple of the'
+                             ' frame size (%s bytes)' %
+                             (vecSeqFile, fileBytes, frameBytes))
+        if fileBytes == 0:
+            # (empty files cannot be memory-mapped)
+            vecSeq = np.zeros((0, self.vecSize), dtype=dtype)
+            vecSeq.setflags(write=False)
+            return vecSeq
+        vecSeqMap = np.memmap(vecSeqFile, dtype=dtype, mode='r',
+                              shape=(fileBytes // frameBytes, self.vecSize))
+        # (a plain ndarray view avoids numpy returning memmap instances from
+        #   reductions; the view keeps the mapping alive)
+        return vecSeqMap.view(np.ndarray)
+
+    def writeFile(self, vecSeqFile, vecSeq):
+        """Writes a raw vector sequence file."""
+        np.asarray(vecSeq).astype(self.dtypeFile).tofile(vecSeqFile)
+
+class VecSeqCache(object):
+    """A bounded in-memory cache of vector sequences.
+
+    Entries are evicted least recently used first once their total size
+    exceeds maxBytes.
+    """
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.entries = collections.OrderedDict()
+        self.numBytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached vector sequence for key, or None if absent."""
+        vecSeq = self.entries.pop(key, None)
+        if vecSeq is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries[key] = vecSeq
+        return vecSeq
+
+    def put(self, key, vecSeq):
+        if key in self.entries:
+            self.numBytes -= self.entries.pop(key).nbytes
+        if vecSeq.nbytes > self.maxBytes:
+            return
+        self.entries[key] = vecSeq
+        self.numBytes += vecSeq.nbytes
+        while self.numBytes > self.maxBytes:
+            _, vecSeqOld = self.entries.popitem(last=False)
+            self.numBytes -= vecSeqOld.nbytes
+
+    def getStats(self):
+        return dict(entries=len(self.entries), bytes=self.numBytes,
+                    maxBytes=self.maxBytes, hits=self.hits, misses=self.misses)
+
+_cache = None
+
+def enableCache(maxBytes):
+    """Enables caching of files read by CachedDirReader, returning the cache.
+    """
+    global _cache
+    _cache = VecSeqCache(maxBytes)
+    return _cache
+
+def disableCache():
+    global _cache
+    _cache = None
+
+def getCache():
+    """Returns the current VecSeqCache, or None if caching is disabled."""
+    return _cache
+
+class CachedDirReader(object):
+    """Reads vector sequence files from a directory, caching them if enabled.
+
+    This is a drop-in replacement for htk_io.base.DirReader.
+    By default (as in the command-line tools) caching is disabled and each
+    file is simply read using vecSeqIo.
+    Once enableCache has been called (as in a long-running process such as
+    mcd_daemon) the contents of each file read are copied into memory and
+    kept in a bounded least recently used cache.
+    Files are identified by their absolute path, size and modification time,
+    so a file which has changed is always read again.
+    """
+    def __init__(self, vecSeqIo, readDir, ext):
+        self.vecSeqIo = vecSeqIo
+        self.readDir = readDir
+        self.ext = ext
+
+    def __call__(self, base):
+        vecSeqFile = os.path.join(self.readDir, '%s.%s' % (base, self.ext))
+        if _cache is None:
+            return self.vecSeqIo.readFile(vecSeqFile)
+
+        stat = os.stat(vecSeqFile)
+        key = (os.path.abspath(vecSeqFile), stat.st_size, stat.st_mtime,
+               self.vecSeqIo.vecSize, np.dtype(self.vecSeqIo.dtypeFile).str)
+        vecSeq = _cache.get(key)
+        if vecSeq is None:
+            instrument.count('fileCacheMisses')
+            vecSeq = np.array(self.vecSeqIo.readFile(vecSeqFile))
+            vecSeq.setflags(write=False)
+            _cache.put(key, vecSeq)
+        else:
+            instrument.count('fileCacheHits')
+        return vecSeq
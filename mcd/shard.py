@@ -0,0 +1,219 @@
+"""Splitting a corpus into shards and merging the partial results.
+
+A large corpus may be processed by running a command-line tool once per shard
+(for example on different machines), with each run processing the utterances
+in one shard and writing a partial results file.
+The partial results files are then merged by merge_results, which gives
+exactly the same overall result as processing the whole corpus in a single
+run.
+"""
+
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import json
+import time
+import hashlib
+
+from mcd import util
+
+def parseShard(shardStr):
+    """Parses a shard specification of the form K/N.
+
+    Shards are numbered from 1 to N.
+    Returns the pair (K, N).
+    """
+    try:
+        shardNumberStr, numShardsStr = shardStr.split('/')
+        shardNumber = int(shardNumberStr)
+        numShards = int(numShardsStr)
+    except ValueError:
+        raise ValueError('invalid shard %r (should be of the form K/N)' %
+                         shardStr)
+    if not 1 <= shardNumber <= numShards:
+        raise ValueError('invalid shard %r (K should be between 1 and N)' %
+                         shardStr)
+    return shardNumber, numShards
+
+def getShardNumber(uttId, numShards):
+    """Returns the shard an utterance belongs to, from 1 to numShards.
+
+    This depends only on the utterance id (and not for example on its
+    position in the corpus or on the python version), so every machine
+    assigns utterances to shards in the same way.
+    """
+    return int(hashlib.sha1(uttId).hexdigest(), 16) % numShards + 1
+
+class Shard(object):
+    """Selects the utterances in one shard of a corpus.
+
+    The whole corpus is iterated over by select, which records the size and a
+    hash of the whole corpus together with the position in the corpus of
+    each selected utterance, so that partial results can be checked and
+    merged in corpus order.
+    """
+    def __init__(self, shardNumber=1, numShards=1):
+        assert 1 <= shardNumber <= numShards
+        self.shardNumber = shardNumber
+        self.numShards = numShards
+        self.corpusSize = 0
+        self.corpusHasher = hashlib.sha1()
+        self.positions = []
+
+    def select(self, uttIds):
+        """Returns an iterator over the utterance ids in this shard.
+
+        Utterance ids are consumed lazily.
+        """
+        for uttId in uttIds:
+            position = self.corpusSize
+            self.corpusSize += 1
+            self.corpusHasher.update(uttId + '\n')
+            if getShardNumber(uttId, self.numShards) == self.shardNumber:
+                self.positions.append(position)
+                yield uttId
+
+    def getCorpusHash(self):
+        return self.corpusHasher.hexdigest()
+
+class PartialResults(object):
+    """Accumulates the per-utterance results for one shard.
+
+    Results should be added in the order the utterances were selected by
+    shard.
+    settings should be a JSON-serializable dict of the settings which affect
+    the results (such as the metric used), so that results computed with
+    different settings are not merged.
+    """
+    def __init__(self, toolName, shard, settings=None):
+        self.toolName = toolName
+        self.shard = shard
+        self.settings = dict() if settings is None else dict(settings)
+        self.uttResults = []
+        self.startTime = time.time()
+
+    def add(self, uttId, cost, frames, elapsed):
+        self.uttResults.append(dict(
+            uttId=uttId,
+            position=self.shard.positions[len(self.uttResults)],
+            cost=float(cost),
+            frames=int(frames),
+            elapsed=elapsed,
+        ))
+
+    def write(self, partialResultsFile):
+        """Writes the partial results to a file as JSON.
+
+        The file is written atomically, so an interrupted run never leaves a
+        partially written file behind.
+        """
+        costTot, framesTot = sumResults(self.uttResults)
+        partialResults = dict(
+            tool=self.toolName,
+            settings=self.settings,
+            shard=self.shard.shardNumber,
+            numShards=self.shard.numShards,
+            corpusSize=self.shard.corpusSize,
+            corpusHash=self.shard.getCorpusHash(),
+            utts=self.uttResults,
+            costTot=costTot,
+            framesTot=framesTot,
+            elapsed=time.time() - self.startTime,
+        )
+        with util.openAtomic(partialResultsFile, 'w') as f:
+            json.dump(partialResults, f, sort_keys=True)
+            f.write('\n')
+
+def sumResults(uttResults):
+    """Returns the total cost and frames, accumulated as by the tools."""
+    costTot = 0.0
+    framesTot = 0
+    for uttResult in uttResults:
+        costTot += uttResult['cost']
+        framesTot += uttResult['frames']
+    return costTot, framesTot
+
+def readPartialResults(partialResultsFile):
+    with open(partialResultsFile) as f:
+        return json.load(f)
+
+def describePositions(positions, maxShown=10):
+    positions = sorted(positions)
+    desc = ', '.join([ str(position) for position in positions[:maxShown] ])
+    if len(positions) > maxShown:
+        desc += ', ...'
+    return desc
+
+def mergePartialResults(partialResultsList):
+    """Merges the partial results for a set of shards.
+
+    Returns the per-utterance results in corpus order, together with the
+    total cost and frames.
+    Since these totals are accumulated in corpus order from the same
+    per-utterance costs, they are exactly those a single run over the whole
+    corpus would give.
+    Raises ValueError if the partial results are for different tools,
+    settings or corpora, or if any utterance is missing or included more than
+    once.
+    """
+    if not partialResultsList:
+        raise ValueError('no partial results given')
+    first = partialResultsList[0]
+    for key in ['tool', 'numShards', 'corpusSize', 'corpusHash']:
+        values = set([ partialResults[key]
+                       for partialResults in partialResultsList ])
+        if len(values) > 1:
+            raise ValueError('partial results have different %s (%s)' %
+                             (key, ', '.join(sorted(map(str, values)))))
+    settingNames = set([ settingName
+                         for partialResults in partialResultsList
+                         for settingName in partialResults['settings'] ])
+    for settingName in sorted(settingNames):
+        values = set([ json.dumps(partialResults['settings'].get(settingName))
+                       for partialResults in partialResultsList ])
+        if len(values) > 1:
+            raise ValueError('partial results have different settings for'
+                             ' %s (%s)' %
+                             (settingName, ', '.join(sorted(values))))
+
+    shardNumbers = [ partialResults['shard']
+                     for partialResults in partialResultsList ]
+    duplicateShards = sorted(set([ shardNumber for shardNumber in shardNumbers
+                                   if shardNumbers.count(shardNumber) > 1 ]))
+    if duplicateShards:
+        raise ValueError('duplicate results for shards %s' %
+                         ', '.join(map(str, duplicateShards)))
+
+    uttResultForPosition = dict()
+    duplicatePositions = set()
+    for partialResults in partialResultsList:
+        for uttResult in partialResults['utts']:
+            position = uttResult['position']
+            if position in uttResultForPosition:
+                duplicatePositions.add(position)
+            uttResultForPosition[position] = uttResult
+    if duplicatePositions:
+        raise ValueError('duplicate results for %s utterances (at corpus'
+                         ' positions %s)' %
+                         (len(duplicatePositions),
+                          describePositions(duplicatePositions)))
+    missingPositions = (set(range(first['corpusSize'])) -
+                        set(uttResultForPosition))
+    if missingPositions:
+        missingShards = sorted(set(range(1, first['numShards'] + 1)) -
+                               set(shardNumbers))
+        raise ValueError('missing results for %s utterances (at corpus'
+                         ' positions %s; missing shards %s of %s)' %
+                         (len(missingPositions),
+                          describePositions(missingPositions),
+                          ', '.join(map(str, missingShards)) or 'none',
+                          first['numShards']))
+    if len(uttResultForPosition) != first['corpusSize']:
+        raise ValueError('results for utterances outside the corpus')
+
+    uttResults = [ uttResultForPosition[position]
+                   for position in range(first['corpusSize']) ]
+    costTot, framesTot = sumResults(uttResults)
+    return uttResults, costTot, framesTot
@@ -0,0 +1,88 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import unittest
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from numpy.random import randn, randint
+
+from mcd import cache
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp(prefix='mcd.')
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir)
+
+    def test_getKey(self):
+        fileA = os.path.join(self.cacheDir, 'a')
+        fileB = os.path.join(self.cacheDir, 'b')
+        with open(fileA, 'w') as f:
+            f.write('apple')
+        with open(fileB, 'w') as f:
+            f.write('apple')
+        assert cache.getKey([fileA], [1]) == cache.getKey([fileB], [1])
+        assert cache.getKey([fileA], [1]) != cache.getKey([fileA], [2])
+        assert cache.getKey([fileA], [1]) != cache.getKey([fileA, fileB], [1])
+        with open(fileB, 'w') as f:
+            f.write('pears')
+        assert cache.getKey([fileA], [1]) != cache.getKey([fileB], [1])
+
+        # (keys change when the cache format version does)
+        key = cache.getKey([fileA], [1])
+        cacheFormatVersion = cache.cacheFormatVersion
+        cache.cacheFormatVersion += 1
+        try:
+            assert cache.getKey([fileA], [1]) != key
+        finally:
+            cache.cacheFormatVersion = cacheFormatVersion
+
+    def test_put_and_get(self, numEntries=20):
+        resultCache = cache.ResultCache(self.cacheDir, maxBytes=1 << 30)
+        entries = dict()
+        for index in range(numEntries):
+            key = 'key%s' % index
+            entries[key] = dict(
+                minCost=randn(),
+                path=randint(100, size=(randint(1, 10), 2)),
+            )
+            resultCache.put(key, entries[key])
+        assert resultCache.get('missing') is None
+        for key, entryGood in entries.items():
+            entry = resultCache.get(key)
+            assert sorted(entry.keys()) == sorted(entryGood.keys())
+            for name in entry:
+                assert np.all(entry[name] == entryGood[name])
+
+        resultCache = cache.ResultCache(self.cacheDir, maxBytes=1 << 30)
+        assert resultCache.get('key0') is not None
+
+    def test_eviction(self, numEntries=20):
+        resultCache = cache.ResultCache(self.cacheDir, maxBytes=1 << 30)
+        resultCache.put('key', dict(xs=np.zeros((100,))))
+        entrySize = resultCache.getSize()
+
+        resultCache = cache.ResultCache(self.cacheDir,
+                                        maxBytes=entrySize * 5 + 1)
+        startTime = time.time() - 1000.0
+        for index in range(numEntries):
+            key = 'key%s' % index
+            resultCache.put(key, dict(xs=np.zeros((100,))))
+            assert resultCache.getSize() <= resultCache.maxBytes
+            # (ensure modification times are distinct)
+            os.utime(resultCache.getEntryFile(key),
+                     (startTime + index, startTime + index))
+            # (keep the first entry recently used)
+            assert resultCache.get('key0') is not None
+        assert resultCache.get('key0') is not None
+        assert resultCache.get('key%s' % (numEntries - 1)) is not None
+        assert resultCache.get('key1') is None
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import unittest
+import re
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+from numpy.random import randint
+
+from mcd import corpus
+
+def getUttLength(uttId):
+    return uttId, len(uttId)
+
+class TestCorpus(unittest.TestCase):
+    def test_mapUtts(self, numCorpora=5):
+        for _ in range(numCorpora):
+            uttIds = [ 'utt%s' % randint(1000) for _ in range(randint(50)) ]
+            resultsGood = [ (uttId, len(uttId)) for uttId in uttIds ]
+            for numJobs in [1, 2, 4]:
+                results = list(corpus.mapUtts(getUttLength, uttIds,
+                                              numJobs=numJobs))
+                assert results == resultsGood
+
+    def test_getBatches(self, numCorpora=5):
+        for _ in range(numCorpora):
+            uttIds = [ 'utt%s' % randint(1000) for _ in range(randint(50)) ]
+            batchSize = randint(1, 10)
+            batches = list(corpus.getBatches(iter(uttIds), batchSize))
+            assert sum(batches, []) == uttIds
+            assert all([ len(batch) == batchSize for batch in batches[:-1] ])
+            if batches:
+                assert 1 <= len(batches[-1]) <= batchSize
+
+    def test_SegmentCosts(self):
+        tempDir = tempfile.mkdtemp(prefix='mcd.')
+        try:
+            segmentResultsFile = os.path.join(tempDir, 'segments.jsonl')
+            segmentCosts = corpus.SegmentCosts(
+                segmentResultsFile, labelRegex=re.compile('-(.+?)\\+')
+            )
+            segmentCosts.add('utt1', [
+                (0, 2, 'x-a+y'), (2, 3, 'a-b+x'), (3, 3, 'b-a+x'),
+            ], np.array([1.0, 2.0, 4.0]))
+            segmentCosts.add('utt2', [(0, 1, 'sil'), (1, 3, 'x-a+y')],
+                             np.array([8.0, 16.0, 32.0]))
+            self.assertRaises(ValueError, segmentCosts.add, 'utt3',
+                              [(0, 1, 'sil')], np.array([1.0, 2.0]))
+            segmentCosts.close()
+
+            labelResults = segmentCosts.getLabelResults()
+            assert [ result['label'] for result in labelResults ] == [
+                'a', 'b', 'sil'
+            ]
+            resultA = labelResults[0]
+            assert resultA['cost'] == 51.0
+            assert resultA['frames'] == 4 and resultA['segments'] == 3
+            assert resultA['mcd'] == 51.0 / 4
+
+            segmentResults = [ json.loads(line)
+                               for line in open(segmentResultsFile) ]
+            assert [ (result['uttId'], result['label'], result['cost'],
+                      result['frames'])
+                     for result in segmentResults ] == [
+                ('utt1', 'a', 3.0, 2),
+                ('utt1', 'b', 4.0, 1),
+                ('utt1', 'a', 0.0, 0),
+                ('utt2', 'sil', 8.0, 1),
+                ('utt2', 'a', 48.0, 2),
+            ]
+            assert segmentResults[2]['mcd'] is None
+        finally:
+            shutil.rmtree(tempDir)
+
+if __name__ == '__main__':
+    unittest.main()
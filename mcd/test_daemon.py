@@ -0,0 +1,73 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import unittest
+import os
+import shutil
+import socket
+import tempfile
+
+from mcd import daemon
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix='mcd.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_getDefaultSocketPath(self):
+        runtimeDirBefore = os.environ.get('XDG_RUNTIME_DIR')
+        try:
+            os.environ['XDG_RUNTIME_DIR'] = self.tempDir
+            assert daemon.getDefaultSocketPath() == os.path.join(
+                self.tempDir, 'mcd.sock'
+            )
+            del os.environ['XDG_RUNTIME_DIR']
+            # (a per-user directory rather than the shared directory itself)
+            socketDir = os.path.dirname(daemon.getDefaultSocketPath())
+            assert socketDir != tempfile.gettempdir()
+            assert str(os.getuid()) in os.path.basename(socketDir)
+        finally:
+            if runtimeDirBefore is not None:
+                os.environ['XDG_RUNTIME_DIR'] = runtimeDirBefore
+
+    def test_checkSocketPath(self):
+        socketPath = os.path.join(self.tempDir, 'daemon.sock')
+        daemon.checkSocketPath(socketPath)
+        daemon.checkSocketPath(os.path.join(self.tempDir, 'missing',
+                                            'daemon.sock'))
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(socketPath)
+            daemon.checkSocketPath(socketPath)
+
+            # (a directory other users could replace the socket in)
+            os.chmod(self.tempDir, 0o777)
+            self.assertRaises(IOError, daemon.checkSocketPath, socketPath)
+            os.chmod(self.tempDir, 0o1777)
+            daemon.checkSocketPath(socketPath)
+            os.chmod(self.tempDir, 0o700)
+
+            if os.getuid() == 0:
+                # (a socket owned by another user)
+                os.lchown(socketPath, 12345, -1)
+                self.assertRaises(IOError, daemon.checkSocketPath,
+                                  socketPath)
+                self.assertRaises(IOError, daemon.removeStaleSocket,
+                                  socketPath)
+                assert os.path.exists(socketPath)
+        finally:
+            sock.close()
+
+        filePath = os.path.join(self.tempDir, 'notASocket')
+        open(filePath, 'w').close()
+        self.assertRaises(IOError, daemon.checkSocketPath, filePath)
+        self.assertRaises(IOError, daemon.sendRequest, filePath,
+                          dict(command='status'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,14 +5,26 @@
 # See `License` for details of license and warranty.
 
 import unittest
+import os
+import io
+from os.path import join
 import math
 import numpy as np
 import random
 from numpy.random import randn, randint
 
+import htk_io.vecseq as vsio
+
 from mcd import dtw
+import mcd.dtw_fast as dtw_fast
+import mcd.metrics as mt
+import mcd.metrics_fast as mtf
 from mcd.util import assert_allclose
 
+testDataDir = join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_data'
+)
+
 def randBool():
     return randint(0, 2) == 0
 
@@ -175,6 +187,511 @@ class TestDtw(unittest.TestCase):
             # minCost to itself should be zero
             assert dtw.dtw(xs, xs, eucCost)[0] == 0.0
 
+    def test_getCostMatrix_vectorized(self, numPairs=100):
+        for pair in range(numPairs):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            ys = randSeq(dim=dim, minLength=1)
+            for costFn in [mt.sqCepDist, mt.eucCepDist, mt.logSpecDbDist,
+                           mtf.sqCepDist, mtf.eucCepDist, mtf.logSpecDbDist]:
+                costMat = dtw.getCostMatrix(xs, ys, costFn)
+                costMatGood = np.array([
+                    [ costFn(x, y) for y in ys ] for x in xs
+                ])
+                assert_allclose(costMat, costMatGood, rtol=1e-9)
+
+    def test_dtw_fast_agrees(self, numPairs=100):
+        for pair in range(numPairs):
+            xSize = randint(1, 4) if randBool() else randint(1, 50)
+            ySize = randint(1, 4) if randBool() else randint(1, 50)
+            if randBool():
+                # (small integer costs so there are lots of ties)
+                costMat = randint(0, 3, size=(xSize, ySize)).astype(float)
+            else:
+                costMat = np.abs(randn(xSize, ySize))
+
+            cumMatGood = dtw.getCumCostMatrix(costMat)
+            pathGood = dtw.getBestPath(cumMatGood)
+
+            cumMat = dtw_fast.getCumCostMatrix(costMat)
+            assert np.all(cumMat == cumMatGood)
+            minCost, pathArray = dtw_fast.dtwCostMatrix(costMat)
+            assert minCost == cumMatGood[xSize, ySize]
+            assert np.shape(pathArray) == (len(pathGood), 2)
+            assert [ (i, j) for i, j in pathArray ] == pathGood
+
+    def test_dtwFused(self, numPairs=100):
+        for pair in range(numPairs):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            ys = randSeq(dim=dim, minLength=1)
+            costFn = random.choice([eucCost, mt.logSpecDbDist,
+                                    mtf.logSpecDbDist])
+            minCostGood, pathGood = dtw.dtw(xs, ys, costFn)
+
+            minCost, path = dtw.dtwFused(xs, ys, costFn)
+            assert_allclose(minCost, minCostGood)
+            assert path == pathGood
+
+            minCost, path = dtw.dtwFused(xs, ys, costFn, returnPath=False)
+            assert_allclose(minCost, minCostGood)
+            assert path is None
+
+    def test_updateCumCostRow(self, numPairs=100):
+        for pair in range(numPairs):
+            xSize = randint(1, 4) if randBool() else randint(1, 50)
+            ySize = randint(1, 4) if randBool() else randint(1, 50)
+            if randBool():
+                # (small integer costs so there are lots of ties)
+                costMat = randint(0, 3, size=(xSize, ySize)).astype(float)
+            else:
+                costMat = np.abs(randn(xSize, ySize))
+            cumMatGood = dtw.getCumCostMatrix(costMat)
+            pathGood = dtw.getBestPath(cumMatGood)
+
+            for updateRow, getPath in [
+                (dtw.updateCumCostRow, dtw.getBestPathPacked),
+                (dtw_fast.updateCumCostRow, dtw_fast.getBestPathPacked),
+            ]:
+                cumMat = np.empty((xSize + 1, ySize + 1))
+                cumMat[0] = cumMatGood[0]
+                backPacked = np.empty((xSize, (ySize + 3) // 4),
+                                      dtype=np.uint8)
+                for i in range(xSize):
+                    updateRow(cumMat[i], costMat[i], cumMat[i + 1],
+                              backPacked[i])
+                assert np.all(cumMat == cumMatGood)
+                pathArray = getPath(backPacked, ySize)
+                assert [ (i, j) for i, j in pathArray ] == pathGood
+
+    def test_constraint_window(self, numPairs=100):
+        for pair in range(numPairs):
+            xSize = randint(1, 4) if randBool() else randint(1, 50)
+            ySize = randint(1, 4) if randBool() else randint(1, 50)
+            bandWidth = randint(0, 10) if randBool() else None
+            itakuraSlope = 1.0 + 2.0 * random.random() if randBool() else None
+            jStarts, jEnds = dtw.getConstraintWindow(xSize, ySize, bandWidth,
+                                                     itakuraSlope)
+
+            assert len(jStarts) == xSize and len(jEnds) == xSize
+            assert jStarts[0] == 0 and jEnds[-1] == ySize
+            assert np.all(jStarts < jEnds)
+            assert np.all(jEnds <= ySize)
+            assert np.all(np.diff(jStarts) >= 0)
+            assert np.all(np.diff(jEnds) >= 0)
+            assert np.all(jStarts[1:] <= jEnds[:-1])
+
+            if bandWidth is not None and itakuraSlope is None:
+                slope = (ySize - 1.0) / (xSize - 1.0) if xSize > 1 else 0.0
+                for i in range(xSize):
+                    for j in range(ySize):
+                        if abs(j - i * slope) <= bandWidth:
+                            assert jStarts[i] <= j < jEnds[i]
+
+    def test_getBandedCostMatrix(self, numPairs=50):
+        getCostMatrixOrig = dtw.getCostMatrix
+        cellsComputed = [0]
+        def getCostMatrixCounted(xs, ys, costFn, dtype=np.float64):
+            cellsComputed[0] += len(xs) * len(ys)
+            return getCostMatrixOrig(xs, ys, costFn, dtype=dtype)
+
+        for pair in range(numPairs):
+            dim = randint(1, 10)
+            xSize = randint(1, 300)
+            ySize = randint(1, 600)
+            xs = randn(xSize, dim)
+            ys = randn(ySize, dim)
+            costFn = random.choice([mt.sqCepDist, mtf.logSpecDbDist])
+            window = dtw.getSakoeChibaWindow(xSize, ySize, randint(0, 5))
+            jStarts, jEnds = window
+
+            dtw.getCostMatrix = getCostMatrixCounted
+            cellsComputed[0] = 0
+            try:
+                costBand = dtw.getBandedCostMatrix(xs, ys, costFn, window)
+            finally:
+                dtw.getCostMatrix = getCostMatrixOrig
+
+            costMat = dtw.getCostMatrix(xs, ys, costFn)
+            for i in range(xSize):
+                jStart, jEnd = jStarts[i], jEnds[i]
+                assert_allclose(costBand[i, :(jEnd - jStart)],
+                                costMat[i, jStart:jEnd])
+                assert np.all(np.isinf(costBand[i, (jEnd - jStart):]))
+            # (local costs should only be computed near the window)
+            assert cellsComputed[0] <= 2 * np.sum(jEnds - jStarts)
+
+    def test_dtw_constrained(self, numPairs=100):
+        for pair in range(numPairs):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            ys = randSeq(dim=dim, minLength=1)
+            costFn = random.choice([eucCost, mtf.logSpecDbDist])
+            bandWidth = randint(0, 10)
+            itakuraSlope = 1.0 + 2.0 * random.random() if randBool() else None
+            window = dtw.getConstraintWindow(len(xs), len(ys), bandWidth,
+                                             itakuraSlope)
+            jStarts, jEnds = window
+
+            # compare to unconstrained DTW with infinite cost outside window
+            costMat = dtw.getCostMatrix(xs, ys, costFn)
+            for i in range(len(xs)):
+                costMat[i, :jStarts[i]] = float('inf')
+                costMat[i, jEnds[i]:] = float('inf')
+            cumMatGood = dtw.getCumCostMatrix(costMat)
+            minCostGood = cumMatGood[len(xs), len(ys)]
+            pathGood = dtw.getBestPath(cumMatGood)
+
+            minCost, path = dtw.dtw(xs, ys, costFn, bandWidth=bandWidth,
+                                    itakuraSlope=itakuraSlope)
+            assert_allclose(minCost, minCostGood)
+            assert path == pathGood
+            assert dtw.isValidPath(path)
+            for i, j in path:
+                assert jStarts[i] <= j < jEnds[i]
+
+            # python versions should agree with compiled versions
+            costBand = dtw.getBandedCostMatrix(xs, ys, costFn, window)
+            cumBand = dtw.getBandedCumCostMatrix(costBand, window)
+            assert np.all(
+                cumBand ==
+                dtw_fast.getBandedCumCostMatrix(costBand, jStarts, jEnds)
+            )
+            assert dtw.getBandedBestPath(cumBand, window) == path
+
+            # a wide enough band should have no effect
+            bandWidth = max(len(xs), len(ys))
+            assert dtw.dtw(xs, ys, costFn, bandWidth=bandWidth)[1] == (
+                dtw.dtw(xs, ys, costFn)[1]
+            )
+
+    def test_fastDtw(self, numPairs=100):
+        for pair in range(numPairs):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            ys = randSeq(dim=dim, minLength=1)
+            costFn = random.choice([eucCost, mtf.logSpecDbDist])
+            radius = randint(0, 4)
+            minCostGood, pathGood = dtw.dtw(xs, ys, costFn)
+
+            minCost, path = dtw.fastDtw(xs, ys, costFn, radius=radius)
+            assert dtw.isValidPath(path)
+            assert path[-1] == (len(xs) - 1, len(ys) - 1)
+            assert_allclose(minCost, getPathCost(path, xs, ys, costFn))
+            assert minCost >= minCostGood or np.allclose(minCost, minCostGood)
+
+            radius = max(len(xs), len(ys))
+            minCost, path = dtw.fastDtw(xs, ys, costFn, radius=radius)
+            assert_allclose(minCost, minCostGood)
+            assert path == pathGood
+
+    def test_fastDtw_test_data(self):
+        vecSeqIo = vsio.VecSeqIo(40)
+        uttIds = [
+            line.strip() for line in open(join(testDataDir, 'corpus.lst'))
+        ]
+        for uttId in uttIds:
+            nat = vecSeqIo.readFile(
+                join(testDataDir, 'ref-examples', uttId + '.mgc')
+            )[:, 1:]
+            synth = vecSeqIo.readFile(
+                join(testDataDir, 'synth-examples', uttId + '.mgc')
+            )[:, 1:]
+            mcdExact = dtw.dtw(nat, synth, mtf.logSpecDbDist)[0] / len(nat)
+            for radius, relTol in [(1, 1e-3), (5, 1e-9)]:
+                minCost, _ = dtw.fastDtw(nat, synth, mtf.logSpecDbDist,
+                                         radius=radius)
+                mcdApprox = minCost / len(nat)
+                assert mcdApprox >= mcdExact * (1.0 - 1e-9)
+                assert mcdApprox <= mcdExact * (1.0 + relTol)
+
+    def test_dtwHirschberg(self, numPairs=100):
+        for _ in range(numPairs):
+            dim = randint(0, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            ys = randSeq(dim=dim, minLength=1)
+            costFn = random.choice([eucCost, mt.sqCepDist, mtf.logSpecDbDist])
+            baseCells = random.choice([1, randint(1, 100), None])
+
+            minCostGood, pathGood = dtw.dtw(xs, ys, costFn)
+            minCost, path = dtw.dtwHirschberg(xs, ys, costFn,
+                                              baseCells=baseCells)
+            assert_allclose(minCost, minCostGood)
+            # (including when there are ties, e.g. when dim is 0)
+            assert path == pathGood
+
+    def test_dtwHirschberg_test_data(self):
+        vecSeqIo = vsio.VecSeqIo(40)
+        uttIds = [
+            line.strip() for line in open(join(testDataDir, 'corpus.lst'))
+        ]
+        for uttId in uttIds:
+            nat = vecSeqIo.readFile(
+                join(testDataDir, 'ref-examples', uttId + '.mgc')
+            )[:, 1:]
+            synth = vecSeqIo.readFile(
+                join(testDataDir, 'synth-examples', uttId + '.mgc')
+            )[:, 1:]
+            minCostGood, pathGood = dtw.dtw(nat, synth, mtf.logSpecDbDist)
+            minCost, path = dtw.dtwHirschberg(nat, synth, mtf.logSpecDbDist,
+                                              baseCells=1000)
+            assert_allclose(minCost, minCostGood)
+            assert path == pathGood
+
+    def test_dtwBatch(self, numBatches=20):
+        for _ in range(numBatches):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            pairs = [
+                (randSeq(dim=dim, minLength=1), randSeq(dim=dim, minLength=1))
+                for _ in range(randint(0, 10))
+            ]
+            costFn = random.choice([eucCost, mt.sqCepDist, mt.eucCepDist,
+                                    mtf.logSpecDbDist])
+
+            minCosts, paths = dtw.dtwBatch(pairs, costFn)
+            assert len(minCosts) == len(pairs)
+            assert len(paths) == len(pairs)
+            for (xs, ys), minCost, path in zip(pairs, minCosts, paths):
+                minCostGood, _ = dtw.dtw(xs, ys, costFn)
+                assert_allclose(minCost, minCostGood)
+                # (N.B. the path is not compared directly since costs may be
+                #   computed slightly differently, which can affect which of
+                #   several (near-)optimal paths is found)
+                path = [ (i, j) for i, j in path ]
+                assert dtw.isValidPath(path)
+                assert path[-1] == (len(xs) - 1, len(ys) - 1)
+                assert_allclose(getPathCost(path, xs, ys, costFn), minCost)
+
+            pairTimes = np.zeros((len(pairs),)) - 1.0
+            minCosts2 = dtw.dtwBatch(pairs, costFn, returnPaths=False,
+                                     pairTimes=pairTimes)
+            assert np.all(minCosts2 == minCosts)
+            assert np.all(pairTimes >= 0.0)
+
+    def test_dtwBatch_Metric(self, numBatches=20):
+        for _ in range(numBatches):
+            dim = randint(2, 10)
+            pairs = [
+                (randSeq(dim=dim, minLength=1), randSeq(dim=dim, minLength=1))
+                for _ in range(randint(1, 10))
+            ]
+            costFn = mt.getMetric(
+                random.choice(mt.getMetricNames()), coeffRange=(1, None),
+                weights=np.abs(randn(dim - 1)) if randBool() else None
+            )
+
+            minCosts, paths = dtw.dtwBatch(pairs, costFn)
+            for (xs, ys), minCost, path in zip(pairs, minCosts, paths):
+                minCostGood, _ = dtw.dtw(xs, ys, costFn)
+                assert_allclose(minCost, minCostGood)
+                path = [ (i, j) for i, j in path ]
+                assert dtw.isValidPath(path)
+                assert_allclose(getPathCost(path, xs, ys, costFn), minCost)
+
+    def test_float32(self, numPairs=20):
+        for _ in range(numPairs):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            xs = randSeq(dim=dim, minLength=1).astype(np.float32)
+            ys = randSeq(dim=dim, minLength=1).astype(np.float32)
+            xs64 = xs.astype(np.float64)
+            ys64 = ys.astype(np.float64)
+            costFn = random.choice([mt.sqCepDist, mtf.eucCepDist,
+                                    mtf.logSpecDbDist])
+            bandWidth = randint(0, 5) if randBool() else None
+
+            # (float32 costs change the minimum cost only slightly)
+            minCostGood, _ = dtw.dtw(xs64, ys64, costFn, bandWidth=bandWidth)
+            minCost, path = dtw.dtw(xs, ys, costFn, bandWidth=bandWidth,
+                                    costDtype=np.float32)
+            assert_allclose(minCost, minCostGood, rtol=1e-5, atol=1e-5)
+            assert dtw.isValidPath(path)
+
+            # (cumulative costs are accumulated identically in double
+            #   precision whatever the dtype of the cost matrix)
+            costMat = dtw.getCostMatrix(xs, ys, costFn, dtype=np.float32)
+            assert costMat.dtype == np.float32
+            assert np.all(
+                dtw_fast.getCumCostMatrix(costMat) ==
+                dtw_fast.getCumCostMatrix(costMat.astype(np.float64))
+            )
+            assert np.all(
+                dtw_fast.getCumCostMatrix(costMat) ==
+                dtw.getCumCostMatrix(costMat)
+            )
+
+            # (the batch kernel computes costs in double precision, so float32
+            #   inputs give exactly the same result as float64 inputs)
+            minCosts, paths = dtw.dtwBatch([(xs, ys)], costFn)
+            minCosts64, paths64 = dtw.dtwBatch([(xs64, ys64)], costFn)
+            assert np.all(minCosts == minCosts64)
+            assert np.all(paths[0] == paths64[0])
+
+    def test_getCumCostMatrixWavefront(self, numMats=50):
+        for _ in range(numMats):
+            costMat = randn(randint(1, 100), randint(1, 100)) ** 2
+            if randBool():
+                costMat = costMat.astype(np.float32)
+            cumMatGood = dtw_fast.getCumCostMatrix(costMat)
+            for numThreads in [1, 2, 3]:
+                cumMat = dtw_fast.getCumCostMatrixWavefront(
+                    costMat, numThreads, tileSize=randint(1, 20)
+                )
+                assert np.all(cumMat == cumMatGood)
+
+    def test_dtw_threads(self, numPairs=10):
+        for _ in range(numPairs):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            xs = randn(random.choice([randint(1, 10), randint(1, 600)]), dim)
+            ys = randn(random.choice([randint(1, 10), randint(1, 600)]), dim)
+            costFn = random.choice([mt.sqCepDist, mtf.eucCepDist,
+                                    mtf.logSpecDbDist])
+
+            minCostGood, _ = dtw.dtw(xs, ys, costFn)
+            minCost1, path1 = dtw.dtw(xs, ys, costFn, threads=1)
+            assert_allclose(minCost1, minCostGood)
+            assert dtw.isValidPath(path1)
+            for threads in [2, 3]:
+                minCost, path = dtw.dtw(xs, ys, costFn, threads=threads)
+                assert minCost == minCost1
+                assert path == path1
+
+    def test_getEnvelope(self, numSeqs=100):
+        for _ in range(numSeqs):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            xSize = randint(1, 60)
+            ys = randSeq(dim=dim, minLength=1)
+            bandWidth = randint(0, 10) if randBool() else None
+            itakuraSlope = 1.0 + randint(0, 3) if randBool() else None
+            window = dtw.getConstraintWindow(xSize, len(ys), bandWidth,
+                                             itakuraSlope)
+            lowers, uppers = dtw.getEnvelope(ys, window)
+            assert np.shape(lowers) == (xSize, dim)
+            assert np.shape(uppers) == (xSize, dim)
+            for i, (jStart, jEnd) in enumerate(zip(*window)):
+                assert np.all(lowers[i] == np.min(ys[jStart:jEnd], axis=0))
+                assert np.all(uppers[i] == np.max(ys[jStart:jEnd], axis=0))
+
+    def test_getLowerBound(self, numPairs=100):
+        for _ in range(numPairs):
+            dim = randint(0, 3) if randBool() else randint(0, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            ys = randSeq(dim=dim, minLength=1)
+            costFn = random.choice([eucCost, mt.sqCepDist, mtf.eucCepDist,
+                                    mtf.logSpecDbDist])
+            bandWidth = randint(0, 5) if randBool() else None
+            itakuraSlope = 1.0 + randint(0, 3) if randBool() else None
+            window = dtw.getConstraintWindow(len(xs), len(ys), bandWidth,
+                                             itakuraSlope)
+
+            minCost, _ = dtw.dtwWindowed(xs, ys, costFn, window)
+            lowerBound = dtw.getLowerBound(xs, ys, costFn, window)
+            assert lowerBound <= minCost * (1.0 + 1e-9) + 1e-9
+
+            # (early abandoning does not change the result unless abandoned)
+            rowLowerBounds = dtw.getLbKeoghRows(xs, ys, costFn, window)
+            colLowerBounds = dtw.getLbKeoghRows(
+                ys, xs, costFn, dtw.getTransposedWindow(window, len(ys))
+            )
+            for maxCost in [float('inf'), minCost]:
+                assert dtw.dtwBounded(xs, ys, costFn, maxCost, window,
+                                      rowLowerBounds,
+                                      colLowerBounds) == minCost
+            assert dtw.dtwBounded(xs, ys, costFn, minCost * 0.5 - 1e-3,
+                                  window, rowLowerBounds,
+                                  colLowerBounds) in [minCost, float('inf')]
+
+            # (transposing twice gives back the original window)
+            iStarts, iEnds = dtw.getTransposedWindow(window, len(ys))
+            jStarts, jEnds = dtw.getTransposedWindow((iStarts, iEnds),
+                                                     len(xs))
+            assert np.all(jStarts == window[0])
+            assert np.all(jEnds == window[1])
+
+    def test_dtwSearch(self, numSearches=20):
+        for _ in range(numSearches):
+            dim = randint(1, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            candidates = [ randSeq(dim=dim, minLength=1)
+                           for _ in range(randint(0, 30)) ]
+            # (include a candidate similar to xs)
+            if candidates and randBool():
+                candidates[randint(len(candidates))] = (
+                    xs + randn(*np.shape(xs)) * 0.1
+                )
+            costFn = random.choice([eucCost, mt.sqCepDist, mtf.eucCepDist,
+                                    mtf.logSpecDbDist])
+            bandWidth = randint(0, 5) if randBool() else None
+            k = randint(1, 5)
+
+            minCostsGood = [
+                dtw.dtw(xs, ys, costFn, bandWidth=bandWidth)[0]
+                for ys in candidates
+            ]
+            stats = dict()
+            results = dtw.dtwSearch(xs, candidates, costFn, k=k,
+                                    bandWidth=bandWidth, stats=stats)
+            assert len(results) == min(k, len(candidates))
+            assert (stats['pruned'] + stats['abandoned'] +
+                    stats['completed'] == len(candidates))
+            costs = [ minCost for _, minCost in results ]
+            assert costs == sorted(costs)
+            assert_allclose(costs, sorted(minCostsGood)[:k])
+            for index, minCost in results:
+                assert_allclose(minCost, minCostsGood[index])
+
+    def test_OnlineDtw(self, numPairs=100):
+        for _ in range(numPairs):
+            dim = randint(1, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            ys = randSeq(dim=dim, minLength=1)
+            costFn = random.choice([eucCost, mt.sqCepDist, mtf.eucCepDist,
+                                    mtf.logSpecDbDist])
+            windowSize = randint(1, 20) if randBool() else None
+            historySize = randint(1, 10) if randBool() else 1000
+            minCostGood, pathGood = dtw.dtw(xs, ys, costFn)
+
+            onlineDtw = dtw.OnlineDtw(ys, costFn, windowSize=windowSize,
+                                      historySize=historySize)
+            onlineDtwPopped = dtw.OnlineDtw(ys, costFn, windowSize=windowSize,
+                                            historySize=historySize)
+            pathPopped = []
+            for i, x in enumerate(xs):
+                onlineDtwPopped.addFrame(x)
+                if randBool():
+                    pathPopped.extend(onlineDtwPopped.popFixedPath())
+                    assert len(onlineDtwPopped.pathFixed) <= 1
+                onlineDtw.addFrame(x)
+                assert onlineDtw.numFrames == i + 1
+                cost, j = onlineDtw.getCost()
+                assert_allclose(onlineDtw.getMeanCost(), cost / (j + 1))
+                path = onlineDtw.getPath()
+                assert dtw.isValidPath(path)
+                if historySize == 1000:
+                    assert path[-1] == (i, j)
+                else:
+                    assert path[-1][0] == i and path[-1][1] >= j
+                if windowSize is None and historySize == 1000:
+                    minCost, pathPrefix = dtw.dtw(xs[:(i + 1)], ys[:(j + 1)],
+                                                  costFn)
+                    assert_allclose(cost, minCost)
+                    assert path == pathPrefix
+
+            finalCost = onlineDtw.getFinalCost()
+            if windowSize is None:
+                assert_allclose(finalCost, minCostGood)
+            if finalCost < float('inf'):
+                assert finalCost >= minCostGood * (1.0 - 1e-10)
+                path = onlineDtw.getPath(final=True)
+                assert dtw.isValidPath(path)
+                assert (pathPopped + onlineDtwPopped.getPath(final=True) ==
+                        path)
+                assert path[-1] == (len(xs) - 1, len(ys) - 1)
+                if historySize == 1000:
+                    assert_allclose(getPathCost(path, xs, ys, costFn),
+                                    finalCost)
+                    if windowSize is None:
+                        assert path == pathGood
+
     def test_projectPathAll(self, numPaths=100):
         for _ in range(numPaths):
             path = []
@@ -215,5 +732,85 @@ class TestDtw(unittest.TestCase):
                     if cost == minCost
                 ]
 
+    def test_projectPathArray(self, numPaths=100):
+        for _ in range(numPaths):
+            childrenDict, startNode = getDtwDag(randint(1, 10), randint(1, 10))
+            path = getRandomDagPath(childrenDict, startNode)
+            # (include ties)
+            pathCosts = (randint(0, 3, size=len(path)) if randBool()
+                         else randn(len(path)))
+            pathArray = np.array(path)
+
+            yIndexSeq = dtw.projectPathMinIndexArray(pathArray)
+            assert yIndexSeq.tolist() == dtw.projectPathMinIndex(path)
+            yIndexSeq = dtw.projectPathBestCostArray(pathArray, pathCosts)
+            assert yIndexSeq.tolist() == dtw.projectPathBestCost(path,
+                                                                 pathCosts)
+
+            xCosts = dtw.projectPathCostArray(pathArray, pathCosts)
+            xCostsGood = np.zeros((path[-1][0] + 1,))
+            for (i, _), cost in zip(path, pathCosts):
+                xCostsGood[i] += cost
+            assert_allclose(xCosts, xCostsGood)
+
+    def test_dtw_returnArray(self, numPairs=100):
+        for _ in range(numPairs):
+            dim = randint(1, 10)
+            xs = randSeq(dim=dim, minLength=1)
+            ys = randSeq(dim=dim, minLength=1)
+            costFn = random.choice([eucCost, mt.sqCepDist, mtf.logSpecDbDist])
+            bandWidth = randint(0, 5) if randBool() else None
+
+            minCostGood, pathGood = dtw.dtw(xs, ys, costFn,
+                                            bandWidth=bandWidth)
+            minCost, pathArray, pathCosts = dtw.dtw(xs, ys, costFn,
+                                                    bandWidth=bandWidth,
+                                                    returnArray=True)
+            assert minCost == minCostGood
+            assert pathArray.tolist() == [ list(point) for point in pathGood ]
+            assert_allclose(pathCosts,
+                            [ costFn(xs[i], ys[j]) for i, j in pathGood ])
+            assert_allclose(np.sum(pathCosts), minCost)
+
+    def test_CompactPath(self, numPaths=100):
+        for _ in range(numPaths):
+            xSize, ySize = randint(1, 10), randint(1, 10)
+            if randBool():
+                childrenDict, startNode = getDtwDag(xSize, ySize)
+                path = getRandomDagPath(childrenDict, startNode)
+            else:
+                xs = randn(xSize, 2)
+                ys = xs[np.sort(randint(xSize, size=ySize))]
+                _, path = dtw.dtw(xs, ys, sqCost)
+
+            compactPath = dtw.CompactPath.fromPath(path)
+            assert len(compactPath) == len(path)
+            assert compactPath.toList() == path
+            assert compactPath.toArray().tolist() == [ list(point)
+                                                      for point in path ]
+            assert compactPath.getEnd() == path[-1]
+            assert compactPath.isComplete(xSize, ySize)
+            assert not compactPath.isComplete(xSize + 1, ySize)
+            assert len(compactPath.runLengths) <= len(path) - 1
+            assert compactPath.swap().toList() == dtw.swapPath(path)
+            assert compactPath.swap().swap() == compactPath
+            assert compactPath == dtw.CompactPath.fromPath(np.array(path))
+
+            assert (compactPath.projectMinIndex().tolist() ==
+                    dtw.projectPathMinIndex(path))
+            pathCosts = randn(len(path))
+            assert (compactPath.projectBestCost(pathCosts).tolist() ==
+                    dtw.projectPathBestCost(path, pathCosts))
+
+            pathFile = io.BytesIO()
+            compactPath.save(pathFile)
+            pathFile.seek(0)
+            assert dtw.CompactPath.load(pathFile) == compactPath
+
+        for invalidPath in [[], [(0, 1)], [(0, 0), (1, 2)], [(0, 0), (0, 0)],
+                            [(0, 0), (1, 1), (0, 2)]]:
+            self.assertRaises(ValueError, dtw.CompactPath.fromPath,
+                              invalidPath)
+
 if __name__ == '__main__':
     unittest.main()
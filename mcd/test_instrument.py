@@ -0,0 +1,82 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import unittest
+import json
+from numpy.random import randn, randint
+
+from mcd import instrument
+from mcd import dtw
+import mcd.metrics_fast as mtf
+
+def countFrames(xs):
+    with instrument.stage('countFrames'):
+        instrument.count('frames', len(xs))
+    return len(xs)
+
+class TestInstrument(unittest.TestCase):
+    def tearDown(self):
+        instrument.disable()
+
+    def test_disabled(self):
+        instrument.disable()
+        with instrument.stage('stage'):
+            instrument.count('frames', 10)
+            instrument.peak('matrixBytes', 100)
+        assert instrument.getProfile() is None
+        assert instrument.Profiled(countFrames)([1, 2]) == (2, None)
+
+    def test_measurements(self):
+        profile = instrument.enable()
+        measurements = []
+        def hook(kind, name, value):
+            measurements.append((kind, name, value))
+        instrument.addHook(hook)
+        try:
+            for _ in range(3):
+                with instrument.stage('stage'):
+                    instrument.count('frames', 10)
+            instrument.peak('matrixBytes', 100)
+            instrument.peak('matrixBytes', 50)
+        finally:
+            instrument.removeHook(hook)
+
+        assert profile.calls == dict(stage=3)
+        assert profile.times['stage'] >= 0.0
+        assert profile.counts == dict(frames=30)
+        assert profile.peaks == dict(matrixBytes=100)
+        assert [ kind for kind, _, _ in measurements ] == (
+            ['count', 'time'] * 3 + ['peak', 'peak']
+        )
+        profileDict = json.loads(json.dumps(profile.toDict()))
+        assert profileDict['counts'] == dict(frames=30)
+        assert 'stage' in profile.getReport()
+
+    def test_Profiled(self, numCalls=10):
+        profile = instrument.enable()
+        framesGood = 0
+        for _ in range(numCalls):
+            xs = randn(randint(10), 3)
+            result, profileDict = instrument.Profiled(countFrames)(xs)
+            assert result == len(xs)
+            assert profileDict['counts'] == dict(frames=len(xs))
+            assert profile.counts.get('frames', 0) == framesGood
+            instrument.merge(profileDict)
+            framesGood += len(xs)
+        assert profile.counts == dict(frames=framesGood)
+        assert profile.calls == dict(countFrames=numCalls)
+
+    def test_dtw_stages(self):
+        profile = instrument.enable()
+        xs = randn(randint(1, 50), 5)
+        ys = randn(randint(1, 50), 5)
+        dtw.dtw(xs, ys, mtf.logSpecDbDist)
+        assert sorted(profile.calls.keys()) == ['bestPath', 'costMatrix',
+                                                'cumCostMatrix']
+        assert profile.counts['matrixCells'] == len(xs) * len(ys)
+        assert profile.peaks['matrixBytes'] >= (len(xs) + 1) * (len(ys) + 1)
+
+if __name__ == '__main__':
+    unittest.main()
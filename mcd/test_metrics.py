@@ -5,6 +5,7 @@
 # See `License` for details of license and warranty.
 
 import unittest
+import argparse
 import math
 import numpy as np
 import random
@@ -66,5 +67,188 @@ class TestMetrics(unittest.TestCase):
                 self.assertRaises(ValueError, mt.logSpecDbDist, x, y)
             self.assertRaises(AssertionError, mtf.logSpecDbDist, x, y)
 
+    def test_matrix_versions(self, numPoints=100):
+        for _ in range(numPoints):
+            size = random.choice([0, 1, randint(0, 10), randint(0, 100)])
+            xs = randn(randint(1, 10), size)
+            ys = randn(randint(1, 10), size)
+            # (include some identical and some nearly identical vectors)
+            if randBool():
+                ys[0] = xs[0]
+            if randBool() and size > 0:
+                ys[-1] = xs[-1] * 1e4 + 1e-6
+                xs[-1] = xs[-1] * 1e4
+
+            for costFn, matrixCostFn in [
+                (mt.sqCepDist, mt.sqCepDistMatrix),
+                (mt.eucCepDist, mt.eucCepDistMatrix),
+                (mt.logSpecDbDist, mt.logSpecDbDistMatrix),
+            ]:
+                costMatGood = np.array([
+                    [ costFn(x, y) for y in ys ] for x in xs
+                ])
+                costMat = matrixCostFn(xs, ys)
+                assert_allclose(costMat, costMatGood, rtol=1e-9)
+
+            assert mt.sqCepDistMatrix(xs, xs)[0, 0] == 0.0
+
+            ys = randn(len(ys), size + 1)
+            self.assertRaises(ValueError, mt.sqCepDistMatrix, xs, ys)
+
+    def test_float32(self, numPoints=20):
+        for _ in range(numPoints):
+            size = random.choice([0, 1, randint(0, 10), randint(0, 100)])
+            xs = randn(random.choice([1, randint(1, 10), randint(1, 600)]),
+                       size).astype(np.float32)
+            ys = randn(randint(1, 10), size).astype(np.float32)
+
+            for costFn, costFnFast, matrixCostFn in [
+                (mt.sqCepDist, mtf.sqCepDist, mt.sqCepDistMatrix),
+                (mt.eucCepDist, mtf.eucCepDist, mt.eucCepDistMatrix),
+                (mt.logSpecDbDist, mtf.logSpecDbDist, mt.logSpecDbDistMatrix),
+            ]:
+                # (accumulation is in double precision)
+                costMatGood = np.array([
+                    [ costFn(x, y) for y in ys.astype(np.float64) ]
+                    for x in xs.astype(np.float64)
+                ])
+                costMatFast = np.array([
+                    [ costFnFast(x, y) for y in ys ] for x in xs
+                ])
+                assert_allclose(costMatFast, costMatGood, rtol=1e-12)
+
+                costMat = matrixCostFn(xs, ys, dtype=np.float32)
+                assert costMat.dtype == np.float32
+                assert_allclose(costMat, costMatGood, rtol=1e-6)
+
+            self.assertRaises(ValueError, mtf.sqCepDist,
+                              xs[0], ys[0].astype(np.float64))
+
+    def test_aligned_versions(self, numPoints=100):
+        for _ in range(numPoints):
+            size = random.choice([0, 1, randint(0, 10), randint(0, 100)])
+            length = randint(0, 10)
+            xs = randn(length, size)
+            ys = randn(length, size)
+
+            for costFn, alignedCostFn in [
+                (mt.sqCepDist, mt.sqCepDistAligned),
+                (mt.eucCepDist, mt.eucCepDistAligned),
+                (mt.logSpecDbDist, mt.logSpecDbDistAligned),
+            ]:
+                costsGood = np.array([ costFn(x, y) for x, y in zip(xs, ys) ])
+                costs = alignedCostFn(xs, ys)
+                assert_allclose(costs, costsGood)
+
+            ys = randn(length + 1, size)
+            self.assertRaises(ValueError, mt.sqCepDistAligned, xs, ys)
+
+    def test_getMaskedCost(self, numPoints=100):
+        for _ in range(numPoints):
+            size = random.choice([0, 1, randint(0, 10), randint(0, 100)])
+            length = randint(0, 10)
+            xs = randn(length, size)
+            ys = randn(length, size)
+            mask = [ randBool() for _ in range(length) ]
+
+            costs = mt.logSpecDbDistAligned(xs, ys)
+            cost, frames = mt.getMaskedCost(costs)
+            assert_allclose(cost, sum([
+                mt.logSpecDbDist(x, y) for x, y in zip(xs, ys)
+            ]))
+            assert frames == length
+
+            cost, frames = mt.getMaskedCost(costs, mask=mask)
+            assert_allclose(cost, sum([
+                mt.logSpecDbDist(x, y)
+                for x, y, include in zip(xs, ys, mask)
+                if include
+            ]))
+            assert frames == sum(mask)
+
+    def test_Metric(self, numPoints=100):
+        baseFns = dict(
+            sqCepDist=mt.sqCepDist,
+            eucCepDist=mt.eucCepDist,
+            logSpecDbDist=mt.logSpecDbDist,
+        )
+        for _ in range(numPoints):
+            size = random.choice([1, randint(1, 10), randint(1, 100)])
+            coeffStart = randint(0, size)
+            coeffEnd = (randint(coeffStart + 1, size + 1) if randBool()
+                        else None)
+            numCoeffs = (size if coeffEnd is None else coeffEnd) - coeffStart
+            weights = np.abs(randn(numCoeffs)) if randBool() else None
+            name = random.choice(mt.getMetricNames())
+            metric = mt.getMetric(name, coeffRange=(coeffStart, coeffEnd),
+                                  weights=weights)
+            assert name in metric.__name__
+            xs = randn(randint(1, 5), size)
+            ys = randn(randint(1, 5), size)
+
+            # check against a direct computation of the weighted distance
+            for x in xs:
+                for y in ys:
+                    diff = (x - y)[coeffStart:coeffEnd]
+                    if weights is not None:
+                        diff = diff * np.sqrt(weights)
+                    assert_allclose(metric(x, y),
+                                    baseFns[name](diff, np.zeros_like(diff)))
+
+            # check vectorized versions agree with pointwise version
+            assert_allclose(metric.matrix(xs, ys), np.array([
+                [ metric(x, y) for y in ys ] for x in xs
+            ]))
+            assert_allclose(metric.aligned(xs, xs[::-1]), np.array([
+                metric(x, y) for x, y in zip(xs, xs[::-1])
+            ]))
+
+            # check the unparameterized metric is its base distance
+            metric = mt.getMetric(name)
+            assert metric.__name__ == name
+            assert metric.transform(xs) is xs
+            assert_allclose(metric.matrix(xs, ys), np.array([
+                [ baseFns[name](x, y) for y in ys ] for x in xs
+            ]))
+
+        # check errors are raised where appropriate
+        self.assertRaises(ValueError, mt.getMetric, 'unknownDist')
+        self.assertRaises(ValueError, mt.getMetric, 'sqCepDist',
+                          coeffRange=(2, 2))
+        self.assertRaises(ValueError, mt.getMetric, 'sqCepDist',
+                          coeffRange=(1, 3), weights=[1.0])
+        self.assertRaises(ValueError, mt.getMetric, 'sqCepDist',
+                          weights=[1.0, -1.0])
+        metric = mt.getMetric('sqCepDist', weights=[1.0, 2.0])
+        self.assertRaises(ValueError, metric.matrix, randn(2, 3), randn(2, 3))
+        metric = mt.getMetric('sqCepDist', coeffRange=(3, None))
+        self.assertRaises(ValueError, metric.matrix, randn(2, 3), randn(2, 3))
+
+    def test_parseCoeffRange(self):
+        assert mt.parseCoeffRange('1:') == (1, None)
+        assert mt.parseCoeffRange('0:25') == (0, 25)
+        assert mt.parseCoeffRange(':5') == (0, 5)
+        self.assertRaises(ValueError, mt.parseCoeffRange, '1')
+        self.assertRaises(ValueError, mt.parseCoeffRange, 'a:b')
+
+    def test_metricFromArgs(self):
+        parser = argparse.ArgumentParser()
+        mt.addMetricArgs(parser)
+
+        metric = mt.metricFromArgs(parser.parse_args([]), 40)
+        assert metric.__name__ == 'logSpecDbDist[1:]'
+        metric = mt.metricFromArgs(parser.parse_args([
+            '--metric', 'sqCepDist', '--coeffs', '0:2', '--weights', '1,0.5'
+        ]), 40)
+        assert metric.__name__ == mt.getMetric(
+            'sqCepDist', coeffRange=(0, 2), weights=[1.0, 0.5]
+        ).__name__
+
+        for args in [['--coeffs', '1'], ['--weights', '1,a'],
+                     ['--coeffs', '0:2', '--weights', '1'],
+                     ['--coeffs', '0:50']]:
+            self.assertRaises(ValueError, mt.metricFromArgs,
+                              parser.parse_args(args), 40)
+
 if __name__ == '__main__':
     unittest.main()
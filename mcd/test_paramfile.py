@@ -0,0 +1,109 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from numpy.random import randn, randint
+
+import htk_io.vecseq as vsio
+
+from mcd import paramfile
+from mcd import cache
+
+class TestParamFile(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix='mcd.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_VecSeqMapIo(self, numFiles=20):
+        for fileIndex in range(numFiles):
+            vecSize = randint(1, 50)
+            frames = randint(0, 200) if fileIndex > 0 else 0
+            vecSeqFile = os.path.join(self.tempDir, 'utt%s.mgc' % fileIndex)
+            vsio.VecSeqIo(vecSize).writeFile(vecSeqFile,
+                                             randn(frames, vecSize))
+
+            vecSeqGood = vsio.VecSeqIo(vecSize).readFile(vecSeqFile)
+            vecSeq = paramfile.VecSeqMapIo(vecSize).readFile(vecSeqFile)
+            assert type(vecSeq) == np.ndarray
+            assert vecSeq.dtype == np.float32
+            assert not vecSeq.flags.writeable
+            assert np.shape(vecSeq) == (frames, vecSize)
+            assert np.all(vecSeq == vecSeqGood)
+            assert cache.hashArray(vecSeq) == cache.hashFile(vecSeqFile)
+
+            if frames > 0 and vecSize > 1:
+                assert np.may_share_memory(vecSeq[:, 1:], vecSeq)
+
+            if (frames * vecSize) % (vecSize + 1) != 0:
+                self.assertRaises(ValueError,
+                                  paramfile.VecSeqMapIo(vecSize + 1).readFile,
+                                  vecSeqFile)
+
+    def test_VecSeqCache(self, numPuts=100):
+        vecSeqCache = paramfile.VecSeqCache(maxBytes=1000)
+        contents = dict()
+        for _ in range(numPuts):
+            key = randint(0, 10)
+            vecSeq = randn(randint(0, 20), 2)
+            vecSeqCache.put(key, vecSeq)
+            contents[key] = vecSeq
+
+            # (the most recently used entry is kept unless it is too large)
+            assert vecSeqCache.numBytes <= 1000
+            if vecSeq.nbytes <= 1000:
+                assert vecSeqCache.get(key) is vecSeq
+            else:
+                assert vecSeqCache.get(key) is None
+            for keyCached, vecSeqCached in vecSeqCache.entries.items():
+                assert vecSeqCached is contents[keyCached]
+            assert vecSeqCache.numBytes == sum([
+                vecSeqCached.nbytes
+                for vecSeqCached in vecSeqCache.entries.values()
+            ])
+
+        # check least recently used entries are evicted first
+        vecSeqCache = paramfile.VecSeqCache(maxBytes=300)
+        for key in range(3):
+            vecSeqCache.put(key, np.zeros((10,)))
+        vecSeqCache.get(0)
+        vecSeqCache.put(3, np.zeros((10,)))
+        assert sorted(vecSeqCache.entries.keys()) == [0, 2, 3]
+        stats = vecSeqCache.getStats()
+        assert stats['entries'] == 3 and stats['bytes'] == 240
+        assert stats['hits'] == 1
+
+    def test_CachedDirReader(self):
+        vecSeqIo = paramfile.VecSeqMapIo(3)
+        vecSeqFile = os.path.join(self.tempDir, 'utt.mgc')
+        vecSeqIo.writeFile(vecSeqFile, randn(10, 3))
+        vecSeqGood = vecSeqIo.readFile(vecSeqFile)
+        getVecSeq = paramfile.CachedDirReader(vecSeqIo, self.tempDir, 'mgc')
+
+        assert paramfile.getCache() is None
+        assert np.all(getVecSeq('utt') == vecSeqGood)
+
+        vecSeqCache = paramfile.enableCache(1 << 20)
+        try:
+            vecSeq = getVecSeq('utt')
+            assert np.all(vecSeq == vecSeqGood)
+            assert not vecSeq.flags.writeable
+            assert getVecSeq('utt') is vecSeq
+            assert vecSeqCache.getStats()['hits'] == 1
+
+            # (a file which has changed is read again)
+            vecSeqIo.writeFile(vecSeqFile, randn(11, 3))
+            vecSeq = getVecSeq('utt')
+            assert np.all(vecSeq == vecSeqIo.readFile(vecSeqFile))
+        finally:
+            paramfile.disableCache()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import unittest
+import os
+import shutil
+import tempfile
+from numpy.random import randn, randint
+
+from mcd import shard
+
+def getPartialResultsList(uttIds, costs, numShards,
+                          settings=dict(metric='logSpecDbDist[1:]')):
+    partialResultsList = []
+    for shardNumber in range(1, numShards + 1):
+        corpusShard = shard.Shard(shardNumber, numShards)
+        partialResults = shard.PartialResults('tool', corpusShard, settings)
+        for uttId in corpusShard.select(iter(uttIds)):
+            partialResults.add(uttId, costs[uttId], len(uttId), 0.0)
+        partialResultsList.append(partialResults)
+    return partialResultsList
+
+class TestShard(unittest.TestCase):
+    def test_parseShard(self):
+        assert shard.parseShard('1/1') == (1, 1)
+        assert shard.parseShard('3/8') == (3, 8)
+        for shardStr in ['0/3', '4/3', '1', '1/a', '1/2/3']:
+            self.assertRaises(ValueError, shard.parseShard, shardStr)
+
+    def test_Shard(self, numCorpora=10):
+        for _ in range(numCorpora):
+            uttIds = [ 'utt%s' % randint(1000) for _ in range(randint(50)) ]
+            numShards = randint(1, 5)
+            positionsAll = []
+            for shardNumber in range(1, numShards + 1):
+                corpusShard = shard.Shard(shardNumber, numShards)
+                uttIdsShard = list(corpusShard.select(iter(uttIds)))
+                assert corpusShard.corpusSize == len(uttIds)
+                assert [ uttIds[position]
+                         for position in corpusShard.positions ] == uttIdsShard
+                assert all([
+                    shard.getShardNumber(uttId, numShards) == shardNumber
+                    for uttId in uttIdsShard
+                ])
+                positionsAll.extend(corpusShard.positions)
+            assert sorted(positionsAll) == range(len(uttIds))
+
+    def test_mergePartialResults(self, numCorpora=10):
+        tempDir = tempfile.mkdtemp(prefix='mcd.')
+        try:
+            for _ in range(numCorpora):
+                uttIds = [ 'utt%s' % index for index in range(randint(1, 50)) ]
+                costs = dict([ (uttId, abs(randn()) * 10.0 ** randint(-3, 4))
+                               for uttId in uttIds ])
+                numShards = randint(1, 5)
+
+                costTotGood = 0.0
+                for uttId in uttIds:
+                    costTotGood += costs[uttId]
+                framesTotGood = sum([ len(uttId) for uttId in uttIds ])
+
+                partialResultsFile = os.path.join(tempDir, 'partial.json')
+                partialResultsList = []
+                for partialResults in getPartialResultsList(uttIds, costs,
+                                                            numShards):
+                    partialResults.write(partialResultsFile)
+                    partialResultsList.append(
+                        shard.readPartialResults(partialResultsFile)
+                    )
+                partialResultsList.reverse()
+
+                # (totals are exactly those of a single run)
+                uttResults, costTot, framesTot = shard.mergePartialResults(
+                    partialResultsList
+                )
+                assert [ uttResult['uttId']
+                         for uttResult in uttResults ] == uttIds
+                assert costTot == costTotGood
+                assert framesTot == framesTotGood
+
+                self.assertRaises(ValueError, shard.mergePartialResults,
+                                  partialResultsList + partialResultsList[:1])
+                if numShards > 1:
+                    nonEmpty = [ partialResults
+                                 for partialResults in partialResultsList
+                                 if partialResults['utts'] ]
+                    self.assertRaises(ValueError, shard.mergePartialResults,
+                                      [ partialResults
+                                        for partialResults
+                                        in partialResultsList
+                                        if partialResults is not nonEmpty[0] ])
+
+                    # (results computed with different settings)
+                    otherResults = getPartialResultsList(
+                        uttIds, costs, numShards,
+                        settings=dict(metric='sqCepDist[1:]')
+                    )[0]
+                    otherResults.write(partialResultsFile)
+                    self.assertRaises(
+                        ValueError, shard.mergePartialResults,
+                        [shard.readPartialResults(partialResultsFile)] +
+                        partialResultsList[:-1]
+                    )
+
+                    # (results for a different corpus)
+                    costs['uttExtra'] = 1.0
+                    otherResults = getPartialResultsList(
+                        uttIds + ['uttExtra'], costs, numShards
+                    )[0]
+                    otherResults.write(partialResultsFile)
+                    self.assertRaises(
+                        ValueError, shard.mergePartialResults,
+                        [shard.readPartialResults(partialResultsFile)] +
+                        partialResultsList[:-1]
+                    )
+
+            self.assertRaises(ValueError, shard.mergePartialResults, [])
+        finally:
+            shutil.rmtree(tempDir)
+
+if __name__ == '__main__':
+    unittest.main()
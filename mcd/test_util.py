@@ -0,0 +1,74 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from numpy.random import randn, randint
+
+from mcd import util
+
+def randAlignment():
+    alignment = []
+    startTime = 0
+    for _ in range(randint(0, 10)):
+        endTime = startTime + randint(0, 5)
+        alignment.append((startTime, endTime, randint(0, 2) == 0))
+        startTime = endTime
+    return alignment
+
+class TestUtil(unittest.TestCase):
+    def test_expandAlignmentArray(self, numAlignments=100):
+        for _ in range(numAlignments):
+            alignment = randAlignment()
+            labelsGood = list(util.expandAlignment(alignment))
+            labels = util.expandAlignmentArray(alignment)
+            assert isinstance(labels, np.ndarray)
+            assert list(labels) == labelsGood
+
+        self.assertRaises(AssertionError, util.expandAlignmentArray,
+                          [(1, 2, True)])
+        self.assertRaises(AssertionError, util.expandAlignmentArray,
+                          [(0, 2, True), (3, 4, False)])
+        self.assertRaises(AssertionError, util.expandAlignmentArray,
+                          [(0, 2, True), (2, 1, False)])
+
+    def test_sumBySegment(self, numAlignments=100):
+        for _ in range(numAlignments):
+            alignment = randAlignment()
+            frames = alignment[-1][1] if alignment else 0
+            values = randn(frames)
+            sums = util.sumBySegment(values, alignment)
+            assert np.shape(sums) == (len(alignment),)
+            for (startTime, endTime, _), segmentSum in zip(alignment, sums):
+                assert np.allclose(segmentSum,
+                                   np.sum(values[startTime:endTime]))
+
+            self.assertRaises(ValueError, util.sumBySegment,
+                              randn(frames + 1), alignment)
+
+    def test_openAtomic(self):
+        tempDir = tempfile.mkdtemp(prefix='mcd.')
+        try:
+            outFile = os.path.join(tempDir, 'out.txt')
+            with util.openAtomic(outFile, 'w') as f:
+                f.write('apple')
+            assert open(outFile).read() == 'apple'
+
+            # (an interrupted write leaves the previous contents in place)
+            def writeInterrupted():
+                with util.openAtomic(outFile, 'w') as f:
+                    f.write('pear')
+                    raise RuntimeError('interrupted')
+            self.assertRaises(RuntimeError, writeInterrupted)
+            assert open(outFile).read() == 'apple'
+            assert os.listdir(tempDir) == ['out.txt']
+        finally:
+            shutil.rmtree(tempDir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from numpy.random import randn, randint
+
+from mcd import warping
+
+class TestWarping(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix='mcd.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_WarpingStore(self, numUtts=20):
+        warpingDir = os.path.join(self.tempDir, 'warping')
+        warpingStore = warping.WarpingStore(warpingDir)
+        warpings = dict()
+        for uttIndex in range(numUtts):
+            uttId = 'utt%s' % uttIndex
+            synthFrames = randint(1, 100)
+            synthIndexSeq = np.sort(randint(synthFrames,
+                                            size=randint(0, 100)))
+            warpingStore.put(uttId, synthIndexSeq, synthFrames)
+            warpings[uttId] = synthIndexSeq, synthFrames
+
+        for uttId, (synthIndexSeqGood, synthFramesGood) in warpings.items():
+            synthIndexSeq, synthFrames = warpingStore.get(uttId)
+            assert synthIndexSeq.tolist() == synthIndexSeqGood.tolist()
+            assert synthFrames == synthFramesGood
+
+            vecSeq = randn(synthFrames, randint(1, 5))
+            vecSeqWarped = warping.applyWarping(synthIndexSeq, synthFrames,
+                                                vecSeq)
+            assert np.all(vecSeqWarped == vecSeq[synthIndexSeqGood])
+            self.assertRaises(ValueError, warping.applyWarping,
+                              synthIndexSeq, synthFrames, vecSeq[1:])
+
+        assert not [ fileName for fileName in os.listdir(warpingDir)
+                     if fileName.endswith('.tmp') ]
+        self.assertRaises(IOError, warpingStore.get, 'uttMissing')
+
+if __name__ == '__main__':
+    unittest.main()
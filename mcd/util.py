@@ -4,6 +4,9 @@
 # This file is part of mcd.
 # See `License` for details of license and warranty.
 
+import os
+import tempfile
+import contextlib
 import numpy as np
 
 def assert_allclose(actual, desired, rtol=1e-7, atol=1e-14,
@@ -31,3 +34,78 @@ def expandAlignment(alignment):
         for i in range(endTime - startTime):
             yield label
         endTimePrev = endTime
+
+def expandAlignmentArray(alignment):
+    """Expands an alignment to an array with one label per frame.
+
+    This is an array-producing version of expandAlignment, and alignment
+    should be a sequence of (start time, end time, label) triples with times
+    in frames.
+    For example, if the labels are booleans then the result is a boolean mask
+    with one element per frame.
+    """
+    startTimes = np.array([ startTime for startTime, _, _ in alignment ],
+                          dtype=int)
+    endTimes = np.array([ endTime for _, endTime, _ in alignment ],
+                        dtype=int)
+    labels = np.array([ label for _, _, label in alignment ])
+    if len(alignment) > 0:
+        assert startTimes[0] == 0
+        assert np.all(startTimes[1:] == endTimes[:-1])
+    durations = endTimes - startTimes
+    assert np.all(durations >= 0)
+    return np.repeat(labels, durations)
+
+def sumBySegment(values, alignment):
+    """Sums per-frame values over each segment of an alignment.
+
+    values should have one element per frame, and alignment should be a
+    sequence of (start time, end time, label) triples with times in frames
+    covering all the frames, as for expandAlignmentArray.
+    Returns an array with the sum of values for each segment (zero for empty
+    segments), computed in a single pass using np.add.reduceat.
+    """
+    values = np.asarray(values)
+    startTimes = np.array([ startTime for startTime, _, _ in alignment ],
+                          dtype=int)
+    endTimes = np.array([ endTime for _, endTime, _ in alignment ],
+                        dtype=int)
+    if len(alignment) > 0:
+        assert startTimes[0] == 0
+        assert np.all(startTimes[1:] == endTimes[:-1])
+    alignmentFrames = endTimes[-1] if len(alignment) > 0 else 0
+    if alignmentFrames != len(values):
+        raise ValueError('alignment has %s frames but there are %s values' %
+                         (alignmentFrames, len(values)))
+    durations = endTimes - startTimes
+    assert np.all(durations >= 0)
+
+    sums = np.zeros((len(alignment),), dtype=np.result_type(values, 0.0))
+    # (empty segments are omitted since reduceat does not sum over them)
+    isNonEmpty = durations > 0
+    if np.any(isNonEmpty):
+        sums[isNonEmpty] = np.add.reduceat(values, startTimes[isNonEmpty])
+    return sums
+
+@contextlib.contextmanager
+def openAtomic(outFile, mode='wb'):
+    """Returns a context manager for atomically writing a file.
+
+    The file object provided writes to a temporary file in the same directory
+    as outFile, which is renamed to outFile only if the block completes
+    without raising an exception, so an interrupted write never leaves a
+    partially written file behind.
+    For example:
+
+        with util.openAtomic(outFile) as f:
+            np.savez(f, xs=xs)
+    """
+    outDir = os.path.dirname(os.path.abspath(outFile))
+    fd, tempFile = tempfile.mkstemp(dir=outDir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.rename(tempFile, outFile)
+    except:
+        os.remove(tempFile)
+        raise
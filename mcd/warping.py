@@ -0,0 +1,72 @@
+"""Storage of time warpings computed by dtw_synth."""
+
+# Copyright 2014, 2015, 2016, 2017 Matt Shannon
+
+# This file is part of mcd.
+# See `License` for details of license and warranty.
+
+import os
+import errno
+import numpy as np
+
+from mcd import util
+
+class WarpingStore(object):
+    """Stores the time warping for each utterance in a directory.
+
+    The warping for an utterance is the sequence of synthetic frame indices
+    used for each natural frame, as computed by dtw.projectPathBestCost (or
+    dtw.projectPathMinIndex), together with the number of synthetic frames
+    it was computed for.
+    Each warping is stored as a small .npz file named after the utterance id,
+    with the frame indices stored as int32.
+    Warpings are written atomically, so an interrupted run never leaves a
+    partially written warping behind.
+    """
+    suffix = '.npz'
+
+    def __init__(self, warpingDir):
+        self.warpingDir = warpingDir
+
+    def getWarpingFile(self, uttId):
+        return os.path.join(self.warpingDir, uttId + self.suffix)
+
+    def put(self, uttId, synthIndexSeq, synthFrames):
+        """Stores the warping for uttId."""
+        synthIndexSeq = np.asarray(synthIndexSeq)
+        assert np.ndim(synthIndexSeq) == 1
+        assert np.all((synthIndexSeq >= 0) & (synthIndexSeq < synthFrames))
+        try:
+            os.makedirs(self.warpingDir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        with util.openAtomic(self.getWarpingFile(uttId)) as f:
+            np.savez(f, synthIndexSeq=synthIndexSeq.astype(np.int32),
+                     synthFrames=synthFrames)
+
+    def get(self, uttId):
+        """Returns the stored warping for uttId.
+
+        Returns the sequence of synthetic frame indices (an int array with one
+        element per natural frame) and the number of synthetic frames.
+        Raises IOError if there is no stored warping for uttId.
+        """
+        with open(self.getWarpingFile(uttId), 'rb') as f:
+            npzFile = np.load(f)
+            synthIndexSeq = npzFile['synthIndexSeq'].astype(np.intp)
+            synthFrames = int(npzFile['synthFrames'])
+        return synthIndexSeq, synthFrames
+
+def applyWarping(synthIndexSeq, synthFrames, vecSeq, uttId='', ext=''):
+    """Applies a stored warping to a synthetic vector sequence.
+
+    Raises ValueError if vecSeq does not have the number of frames the warping
+    was computed for.
+    """
+    if len(vecSeq) != synthFrames:
+        raise ValueError('%s.%s has %s frames but the warping was computed'
+                         ' for %s frames' %
+                         (uttId, ext, len(vecSeq), synthFrames))
+    return vecSeq[synthIndexSeq]
@@ -14,8 +14,17 @@ from setuptools.command.sdist import sdist as _sdist
 
 cython_locs = [
     ('mcd', 'metrics_fast'),
+    ('mcd', 'dtw_fast'),
 ]
 
+# modules which use OpenMP for parallelism (see getCumCostMatrixWavefront)
+openmp_locs = [
+    ('mcd', 'dtw_fast'),
+]
+
+def get_extra_args(loc):
+    return ['-fopenmp'] if loc in openmp_locs else []
+
 with open('README.rst') as readme_file:
     long_description = readme_file.read()
 
@@ -41,7 +50,9 @@ if dev_mode:
     cmdclass = {'build_ext': build_ext, 'sdist': sdist}
     ext_modules = [
         Extension('.'.join(loc), [os.path.join(*loc)+'.pyx'],
-                  extra_compile_args=['-Wno-unused-but-set-variable', '-O3'],
+                  extra_compile_args=(['-Wno-unused-but-set-variable', '-O3'] +
+                                      get_extra_args(loc)),
+                  extra_link_args=get_extra_args(loc),
                   include_dirs=[np.get_include()])
         for loc in cython_locs
     ]
@@ -49,7 +60,9 @@ else:
     cmdclass = {}
     ext_modules = [
         Extension('.'.join(loc), [os.path.join(*loc)+'.c'],
-                  extra_compile_args=['-Wno-unused-but-set-variable', '-O3'],
+                  extra_compile_args=(['-Wno-unused-but-set-variable', '-O3'] +
+                                      get_extra_args(loc)),
+                  extra_link_args=get_extra_args(loc),
                   include_dirs=[np.get_include()])
         for loc in cython_locs
     ]
@@ -68,6 +81,10 @@ setup(
         os.path.join('bin', 'dtw_synth'),
         os.path.join('bin', 'get_mcd_dtw'),
         os.path.join('bin', 'get_mcd_plain'),
+        os.path.join('bin', 'mcd_client'),
+        os.path.join('bin', 'mcd_daemon'),
+        os.path.join('bin', 'merge_results'),
+        os.path.join('bin', 'warp_synth'),
     ],
     long_description=long_description,
     cmdclass=cmdclass,